@@ -1,13 +1,50 @@
 """
 aes_cipher.py
 
-Provides a simple AES-CTR encryption/decryption wrapper using PyCryptodome.
+AES encryption for the ParkScout client/server connections, using
+PyCryptodome (and the `cryptography` package for AES-GCM when it is
+installed: it is an order of magnitude faster on small messages).
 
 Classes:
-    Cipher: Encapsulates AES encryption and decryption in CTR mode.
+    Cipher: Encapsulates AES encryption and decryption in CTR mode
+        with a fixed nonce (legacy wire format).
+    SessionCipher: AES-CTR with a fresh random nonce per message,
+        in-place/zero-copy and chunked operation; the base of
+        GcmSessionCipher (the framed protocol, see protocol.py, only
+        negotiates GCM).
+    GcmSessionCipher: AES-GCM with per-direction session keys and
+        counter nonces; authenticates every frame.
+
+Functions:
+    derive_session_keys: HKDF of the shared key, both hello randoms and
+        the hello transcript.
 """
 
+import os
+
 from Cryptodome.Cipher import AES
+from Cryptodome.Hash import SHA256
+from Cryptodome.Protocol.KDF import HKDF
+from Cryptodome.Random import get_random_bytes
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers import Cipher as _CryptoCipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # optional: pycryptodome's GCM is used instead
+    AESGCM = None
+
+# -------------------------------------------------------------------
+# Shared secret (server, web app, cameras and test client)
+# -------------------------------------------------------------------
+AES_KEY   = os.getenv("PARKSCOUT_AES_KEY", "ThisIsASecretKey").encode("utf-8")
+AES_NONCE = b'ThisIsASecretN'  # Fixed nonce of the legacy wire format only
+
+# Per-message nonce length on the wire. CTR: the remaining 8 bytes of the
+# counter block count blocks within one message. GCM: a message counter,
+# zero-padded to the 12-byte GCM nonce.
+NONCE_SIZE = 8
+TAG_SIZE   = 16
 
 class Cipher:
     """
@@ -62,3 +99,299 @@ class Cipher:
         # Decrypt to raw bytes, then decode to UTF-8 text
         decrypted_bytes = cipher.decrypt(ciphertext_bytes)
         return decrypted_bytes.decode("utf-8")
+
+
+class _StreamAdapter:
+    """
+    Common chunked interface over a PyCryptodome cipher object:
+    update_into(src, dst) for each piece, then finalize() returning the
+    tag when encrypting, or finalize(tag) verifying it when decrypting.
+    """
+
+    def __init__(self, cipher, encrypt, tag_size):
+        self._cipher = cipher
+        self._op = cipher.encrypt if encrypt else cipher.decrypt
+        self._tag_size = tag_size
+
+    def update_into(self, src, dst):
+        self._op(src, output=dst)
+
+    def finalize(self, tag=None):
+        if not self._tag_size:
+            return b""
+        if tag is None:
+            return self._cipher.digest()
+        self._cipher.verify(tag)  # ValueError on mismatch
+
+class _CryptographyStream:
+    """Same interface over a `cryptography` GCM encryptor/decryptor context."""
+
+    def __init__(self, context):
+        self._context = context
+
+    def update_into(self, src, dst):
+        dst[:] = self._context.update(src)
+
+    def finalize(self, tag=None):
+        if tag is None:
+            self._context.finalize()
+            return self._context.tag
+        try:
+            self._context.finalize_with_tag(bytes(tag))
+        except InvalidTag:
+            raise ValueError("MAC check failed") from None
+
+class SessionCipher:
+    """
+    AES-CTR cipher that never reuses a keystream.
+
+    Every message is encrypted under a fresh random nonce which travels
+    in the frame header next to the ciphertext, so two messages never
+    share keystream the way the fixed-nonce Cipher does. Besides the
+    bytes-in/bytes-out helpers, the *_into methods write into a caller
+    supplied buffer (which may be the input itself), and encryptor() /
+    decryptor() return stream objects so large payloads can be processed
+    chunk by chunk as they are read from or written to the socket.
+
+    CTR provides confidentiality only; see GcmSessionCipher.
+
+    Attributes:
+        key (bytes): Symmetric key for AES operations (16, 24 or 32 bytes).
+        nonce_size (int): Length of the per-message nonce.
+        tag_size (int): Authentication tag length (0: none).
+    """
+
+    name = "ctr"
+    nonce_size = NONCE_SIZE
+    tag_size = 0
+
+    def __init__(self, key: bytes):
+        """
+        Args:
+            key (bytes): The AES key. Length must be valid for AES (16, 24, or 32 bytes).
+        """
+        self.key = key
+
+    def new_nonce(self) -> bytes:
+        """Return a fresh random nonce for the next message."""
+        return get_random_bytes(self.nonce_size)
+
+    def _new(self, nonce):
+        return AES.new(self.key, AES.MODE_CTR, nonce=nonce)
+
+    def encryptor(self, nonce: bytes, aad=b""):
+        """
+        Return a stream encryptor for one message.
+
+        Successive update_into(chunk, out) calls continue the same
+        keystream, so a message can be encrypted in pieces of any size;
+        finalize() returns the (empty) tag.
+        """
+        return _StreamAdapter(self._new(nonce), True, 0)
+
+    def decryptor(self, nonce: bytes, aad=b""):
+        """Return a stream decryptor for one message (see encryptor())."""
+        return _StreamAdapter(self._new(nonce), False, 0)
+
+    def encrypt(self, plaintext: bytes) -> tuple:
+        """
+        Encrypt one message under a fresh nonce.
+
+        Args:
+            plaintext (bytes-like): Raw data to encrypt.
+
+        Returns:
+            tuple: (nonce, ciphertext bytes).
+        """
+        nonce = self.new_nonce()
+        return nonce, self._new(nonce).encrypt(plaintext)
+
+    def decrypt(self, nonce: bytes, ciphertext: bytes) -> bytes:
+        """
+        Decrypt one message.
+
+        Args:
+            nonce (bytes): Nonce sent with the message.
+            ciphertext (bytes-like): Encrypted data.
+
+        Returns:
+            bytes: The plaintext (not decoded; json.loads accepts bytes).
+        """
+        return self._new(nonce).decrypt(ciphertext)
+
+    def encrypt_into(self, nonce: bytes, src, dst, aad=b"") -> None:
+        """
+        Encrypt `src` into the writable buffer `dst` without allocating.
+
+        Args:
+            nonce (bytes): Nonce of this message.
+            src (bytes-like): Plaintext.
+            dst (memoryview or bytearray): Output of len(src) + tag_size
+                bytes; may be `src` itself for in-place encryption.
+            aad (bytes): Associated data (authenticated modes only).
+        """
+        self._new(nonce).encrypt(src, output=dst)
+
+    def decrypt_into(self, nonce: bytes, src, dst, aad=b"") -> None:
+        """
+        Decrypt `src` into the writable buffer `dst` without allocating.
+
+        Args:
+            nonce (bytes): Nonce sent with the message.
+            src (bytes-like): Ciphertext followed by the tag (if any).
+            dst (memoryview or bytearray): Output of len(src) - tag_size
+                bytes; may be `src` itself for in-place decryption.
+            aad (bytes): Associated data (authenticated modes only).
+
+        Raises:
+            ValueError: If the message fails authentication.
+        """
+        self._new(nonce).decrypt(src, output=dst)
+
+class GcmSessionCipher(SessionCipher):
+    """
+    AES-GCM cipher bound to one connection.
+
+    Each direction has its own key (see derive_session_keys()) and
+    numbers its messages 0, 1, 2, ...; the counter is the nonce, so no
+    nonce repeats under a key and the receiver rejects replayed,
+    dropped or reordered frames. Every frame carries a 16-byte tag over
+    the ciphertext and the associated data (the frame header).
+
+    Attributes:
+        backend (str): 'cryptography' or 'pycryptodome'.
+    """
+
+    name = "gcm"
+    tag_size = TAG_SIZE
+
+    def __init__(self, send_key: bytes, recv_key: bytes):
+        """
+        Args:
+            send_key (bytes): Key for messages this side sends.
+            recv_key (bytes): Key for messages this side receives.
+        """
+        super().__init__(send_key)
+        self.recv_key = recv_key
+        self._sent = 0
+        self._received = 0
+        self._seal = self._open = None
+        self._into = False
+        self.backend = "pycryptodome"
+        if AESGCM is not None:
+            self.backend = "cryptography"
+            self._seal = AESGCM(send_key)
+            self._open = AESGCM(recv_key)
+            # encrypt_into/decrypt_into appeared in cryptography 45
+            self._into = hasattr(self._seal, "encrypt_into")
+
+    def new_nonce(self) -> bytes:
+        """Return the counter of the next message sent."""
+        nonce = self._sent.to_bytes(self.nonce_size, "big")
+        self._sent += 1
+        return nonce
+
+    def _accept(self, nonce):
+        """Check that `nonce` is the next expected counter and consume it."""
+        if nonce != self._received.to_bytes(self.nonce_size, "big"):
+            raise ValueError("Unexpected message counter (replayed or reordered frame)")
+        self._received += 1
+        return b"\x00\x00\x00\x00" + bytes(nonce)
+
+    def encryptor(self, nonce: bytes, aad=b""):
+        iv = b"\x00\x00\x00\x00" + bytes(nonce)
+        if self._seal is not None:
+            context = _CryptoCipher(algorithms.AES(self.key), modes.GCM(iv)).encryptor()
+            context.authenticate_additional_data(bytes(aad))
+            return _CryptographyStream(context)
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=iv, mac_len=self.tag_size)
+        cipher.update(aad)
+        return _StreamAdapter(cipher, True, self.tag_size)
+
+    def decryptor(self, nonce: bytes, aad=b""):
+        iv = self._accept(nonce)
+        if self._open is not None:
+            context = _CryptoCipher(algorithms.AES(self.recv_key), modes.GCM(iv)).decryptor()
+            context.authenticate_additional_data(bytes(aad))
+            return _CryptographyStream(context)
+        cipher = AES.new(self.recv_key, AES.MODE_GCM, nonce=iv, mac_len=self.tag_size)
+        cipher.update(aad)
+        return _StreamAdapter(cipher, False, self.tag_size)
+
+    def encrypt(self, plaintext: bytes, aad=b"") -> tuple:
+        """
+        Encrypt one message under the next counter.
+
+        Returns:
+            tuple: (nonce, ciphertext followed by the tag).
+        """
+        nonce = self.new_nonce()
+        out = bytearray(len(plaintext) + self.tag_size)
+        self.encrypt_into(nonce, plaintext, out, aad)
+        return nonce, bytes(out)
+
+    def decrypt(self, nonce: bytes, ciphertext: bytes, aad=b"") -> bytes:
+        """
+        Decrypt and verify one message.
+
+        Raises:
+            ValueError: On a wrong counter or a failed authentication.
+        """
+        out = bytearray(len(ciphertext) - self.tag_size)
+        self.decrypt_into(nonce, ciphertext, out, aad)
+        return bytes(out)
+
+    def encrypt_into(self, nonce: bytes, src, dst, aad=b"") -> None:
+        iv = b"\x00\x00\x00\x00" + bytes(nonce)
+        if self._seal is not None:
+            if self._into:
+                self._seal.encrypt_into(iv, src, aad, dst)
+            else:
+                dst[:] = self._seal.encrypt(iv, bytes(src), bytes(aad))
+            return
+        size = len(src)
+        dst = memoryview(dst)  # slicing a bytearray would copy it
+        cipher = AES.new(self.key, AES.MODE_GCM, nonce=iv, mac_len=self.tag_size)
+        cipher.update(aad)
+        cipher.encrypt(src, output=dst[:size])
+        dst[size:] = cipher.digest()
+
+    def decrypt_into(self, nonce: bytes, src, dst, aad=b"") -> None:
+        iv = self._accept(nonce)
+        if self._open is not None:
+            try:
+                if self._into:
+                    self._open.decrypt_into(iv, src, aad, dst)
+                else:
+                    dst[:] = self._open.decrypt(iv, bytes(src), bytes(aad))
+            except InvalidTag:
+                raise ValueError("MAC check failed") from None
+            return
+        size = len(src) - self.tag_size
+        cipher = AES.new(self.recv_key, AES.MODE_GCM, nonce=iv, mac_len=self.tag_size)
+        cipher.update(aad)
+        cipher.decrypt(src[:size], output=dst)
+        cipher.verify(src[size:])
+
+def derive_session_keys(key: bytes, client_random: bytes, server_random: bytes,
+                        transcript: bytes = b"") -> tuple:
+    """
+    Derive the two directional session keys of a connection.
+
+    HKDF-SHA256 over the shared key, salted with the random values both
+    sides sent in their hello, so every connection gets fresh keys even
+    though the long-term key is static.
+
+    Args:
+        key (bytes): Shared AES key.
+        client_random (bytes): Random bytes from the client hello.
+        server_random (bytes): Random bytes from the server hello.
+        transcript (bytes): Hash of both hello messages; binds the keys
+            to what was negotiated, so a tampered hello yields keys the
+            other side does not have.
+
+    Returns:
+        tuple: (client_to_server_key, server_to_client_key).
+    """
+    return tuple(HKDF(key, len(key), client_random + server_random, SHA256,
+                      num_keys=2, context=b"parkscout session keys" + transcript))
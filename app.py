@@ -11,11 +11,11 @@ Provides:
   - Live camera feed and status endpoints for integration with camera_predict.py
 
 Note:
-  This is the main Flask application that interacts with a backend ParkingServer
-  over an AES-encrypted TCP socket, and serves HTML templates and JSON APIs.
+  This is the main Flask application that interacts with the backend ParkingServers
+  over AES-encrypted TCP sockets, and serves HTML templates and JSON APIs. Spots are
+  grouped in zones; zones.json maps each zone to its server (see zone_router.py).
 """
 
-import socket
 import json
 import os
 from functools import wraps
@@ -28,22 +28,7 @@ from flask import (
     Flask, render_template, request, redirect, url_for,
     session, flash
 )
-from aes_cipher import Cipher
-
-# -------------------------------------------------------------------
-# Module-level socket for reuse across requests
-# -------------------------------------------------------------------
-client_sock = None
-
-def init_client_socket():
-    """
-    Initialize or reuse a single TCP socket to the ParkingServer.
-    Ensures only one connection is open per application instance.
-    """
-    global client_sock
-    if client_sock is None:
-        client_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_sock.connect((SERVER_HOST, SERVER_PORT))
+from zone_router import DEFAULT_ZONE, ZoneRouter
 
 # -------------------------------------------------------------------
 # Hardcoded admin credentials (username: password)
@@ -60,69 +45,58 @@ ADMIN_CREDENTIALS = {
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "supersecretkey")
 
-# -------------------------------------------------------------------
-# AES Encryption Setup (must match server settings)
-# -------------------------------------------------------------------
-AES_KEY   = b'ThisIsASecretKey'
-AES_NONCE = b'ThisIsASecretN'
-cipher    = Cipher(AES_KEY, AES_NONCE)
-
 # -------------------------------------------------------------------
 # ParkingServer connection settings
 # -------------------------------------------------------------------
 SERVER_HOST = "127.0.0.1"
 SERVER_PORT = 65432
 
+# Zone -> server routing; without zones.json everything goes to the server above.
+# Connections are pooled per server, so concurrent Flask requests don't serialize.
+router = ZoneRouter.from_config(host=SERVER_HOST, port=SERVER_PORT)
+
 # =================== Utility Functions ===================
 
 def send_request(action, data=None):
     """
-    Send an AES-encrypted JSON request to the ParkingServer and return its response.
+    Send an encrypted request to the account server and return its response.
 
     Args:
-        action (str): Name of the backend action (e.g., 'login', 'get_parking_spots').
+        action (str): Name of the backend action (e.g., 'login', 'register').
         data (dict, optional): Additional payload data for the action.
 
     Returns:
-        dict: Parsed JSON response from the server, or an error dict on failure.
+        dict: Parsed response from the server, or an error dict on failure.
     """
-    global client_sock
-    if data is None:
-        data = {}
+    return router.account_request(action, data)
 
-    try:
-        init_client_socket()
-        # Build and encrypt request payload
-        payload = json.dumps({"action": action, **data}).encode("utf-8")
-        encrypted = cipher.aes_encrypt(payload)
-        client_sock.sendall(encrypted)
-
-        # Receive and decrypt response
-        # New: receive 4-byte length prefix
-        raw_len = client_sock.recv(4)
-        if len(raw_len) < 4:
-            raise ValueError("Incomplete length prefix")
-        msg_len = int.from_bytes(raw_len, byteorder='big')
-
-        # Receive full encrypted message
-        encrypted_resp = b""
-        while len(encrypted_resp) < msg_len:
-            chunk = client_sock.recv(min(4096, msg_len - len(encrypted_resp)))
-            if not chunk:
-                break
-            encrypted_resp += chunk
-
-        decrypted = cipher.aes_decrypt(encrypted_resp)
-        return json.loads(decrypted)
-
-    except Exception as e:
-        # On any socket error, reset connection for next time
-        try:
-            client_sock.close()
-        except:
-            pass
-        client_sock = None
-        return {"status": "error", "message": str(e)}
+def zone_request(zone, action, data=None):
+    """
+    Send an encrypted request to the server holding `zone`.
+
+    Args:
+        zone (str): Zone of the spot the action is about.
+        action (str): Name of the backend action (e.g., 'reserve_spot').
+        data (dict, optional): Additional payload data for the action.
+
+    Returns:
+        dict: Parsed response from the server, or an error dict on failure.
+    """
+    return router.request(zone, action, data)
+
+def spot_zone():
+    """
+    Zone of the spot a request is about (?zone=). Spot IDs are only
+    unique within one server, so the zone is required once more than one
+    zone is configured; with a single zone it defaults to that zone.
+
+    Returns:
+        str or None: The zone, or None if it is missing but required.
+    """
+    zone = request.args.get('zone')
+    if zone:
+        return zone
+    return router.zones[0] if len(router.zones) == 1 else None
 
 def login_required(f):
     """
@@ -219,9 +193,9 @@ def logout():
 def home():
     """
     Display the user home page with a list of parking spots.
-    Fetches current spot statuses from the backend.
+    Fetches current spot statuses from the servers of all zones.
     """
-    response = send_request('get_parking_spots')
+    response = router.list_spots()
     spots = response.get('spots', []) if response.get('status') == 'success' else []
     return render_template('home.html', spots=spots)
 
@@ -230,11 +204,17 @@ def home():
 def reserve(spot_id):
     """
     Reserve a parking spot for the logged-in user.
-    Sends reserve_spot request to backend and flashes success/failure.
+    Sends reserve_spot to the server of the spot's zone (?zone=, see
+    spot_zone()) and flashes success/failure.
     """
-    response = send_request('reserve_spot', {
+    zone = spot_zone()
+    if zone is None:
+        flash("Missing zone of the spot.", "danger")
+        return redirect(url_for('home'))
+    response = zone_request(zone, 'reserve_spot', {
         "user_id": session['user_id'],
-        "spot_id": spot_id
+        "spot_id": spot_id,
+        "zone": zone
     })
     if response.get('status') == 'success':
         # Record reservation time for UI feedback
@@ -249,12 +229,14 @@ def reserve(spot_id):
 def history():
     """
     Show the parking history for the logged-in user.
-    Retrieves history entries from the backend.
+    Reservations are recorded by the server of each zone, so the entries
+    are gathered from all servers.
     """
-    response = send_request('get_parking_history', {
+    response = router.gather('get_parking_history', {
         "user_id": session['user_id']
-    })
+    }, key='history')
     records = response.get('history', []) if response.get('status') == 'success' else []
+    records.sort(key=lambda r: (r.get('parking_date') or '', r.get('parking_time') or ''))
     return render_template('history.html', records=records)
 
 # --------- Admin Views ---------
@@ -265,18 +247,19 @@ def history():
 def admin_dashboard():
     """
     Admin dashboard displaying all parking spots.
-    Allows adding or removing spots.
+    Allows adding (to a chosen zone) or removing spots.
     """
-    response = send_request('get_parking_spots')
+    response = router.list_spots()
     spots = response.get('spots', []) if response.get('status') == 'success' else []
-    return render_template('admin_dashboard.html', spots=spots)
+    return render_template('admin_dashboard.html', spots=spots, zones=router.zones)
 
 @app.route('/add_spot', methods=['POST'])
 @login_required
 @admin_required
 def add_spot():
-    """Add a new parking spot via the backend."""
-    response = send_request('add_parking_spot')
+    """Add a new parking spot to the zone chosen in the form."""
+    zone = request.form.get('zone') or DEFAULT_ZONE
+    response = zone_request(zone, 'add_parking_spot', {"zone": zone})
     if response.get('status') == 'success':
         flash("Parking spot added.", "success")
     else:
@@ -287,8 +270,12 @@ def add_spot():
 @login_required
 @admin_required
 def remove_spot(spot_id):
-    """Remove a parking spot via the backend."""
-    response = send_request('remove_parking_spot', {"spot_id": spot_id})
+    """Remove a parking spot from the server of its zone (?zone=, see spot_zone())."""
+    zone = spot_zone()
+    if zone is None:
+        flash("Missing zone of the spot.", "danger")
+        return redirect(url_for('admin_dashboard'))
+    response = zone_request(zone, 'remove_parking_spot', {"spot_id": spot_id, "zone": zone})
     if response.get('status') == 'success':
         flash(f"Spot {spot_id} removed.", "success")
     else:
@@ -301,11 +288,17 @@ def remove_spot(spot_id):
 @login_required
 def status(spot_id):
     """
-    Return the latest status JSON for a given spot_id.
-    Reads from the static/status_<spot_id>.json file written by camera_predict.py.
+    Return the latest status JSON for a given spot_id in its zone (?zone=,
+    see spot_zone()). Reads from the static/status_<zone>_<spot_id>.json
+    file written by camera_predict.py.
     """
+    zone = spot_zone()
+    if zone is None:
+        return {"status": "unknown", "message": "Missing zone"}, 400
+    if '/' in zone or '\\' in zone:
+        return {"status": "unknown", "message": "Invalid zone"}, 400
     try:
-        with open(f'static/status_{spot_id}.json', 'r') as f:
+        with open(f'static/status_{zone}_{spot_id}.json', 'r') as f:
             return json.load(f)
     except FileNotFoundError:
         return {"status": "unknown"}
@@ -314,25 +307,56 @@ def status(spot_id):
 @login_required
 def camera():
     """
-    Render the camera view page with dynamic list of spot IDs.
+    Render the camera view page with dynamic list of spots (ID and zone:
+    IDs repeat across zones).
     """
-    response = send_request('get_parking_spots')
-    spot_ids = [spot['id'] for spot in response.get('spots', [])] if response.get('status') == 'success' else []
-    return render_template('camera.html', spot_ids=spot_ids)
+    response = router.list_spots()
+    spots = [{"id": spot['id'], "zone": spot.get('zone') or DEFAULT_ZONE}
+             for spot in response.get('spots', [])] if response.get('status') == 'success' else []
+    return render_template('camera.html', spots=spots)
 
 @app.route('/api/parking_spots')
 @login_required
 def api_parking_spots():
     """
     JSON API endpoint returning all parking spot statuses.
-    Useful for AJAX calls from the front-end.
+    Useful for AJAX calls from the front-end. ?zone= (repeatable) limits
+    the list to some zones.
+    """
+    zones = request.args.getlist('zone') or None
+    return router.list_spots(zones)
+
+@app.route('/api/available_near/<zone>')
+@login_required
+def api_available_near(zone):
+    """
+    JSON API endpoint returning the available spots of all zones, nearest
+    to `zone` first (servers are queried in parallel). ?limit= caps the
+    number of spots.
+    """
+    return router.available_near(zone, limit=request.args.get('limit', type=int))
+
+@app.route('/api/camera_stats')
+@login_required
+@admin_required
+def api_camera_stats():
+    """
+    JSON API endpoint returning the pipeline timing statistics reported
+    by each camera host (FPS, dropped frames, per-stage latencies).
     """
-    return send_request('get_parking_spots')
+    response = router.gather('get_camera_stats', key='cameras')
+    # Saturated hosts first, as each server orders its own list
+    response.get('cameras', []).sort(key=lambda c: (not c.get('saturated'), c.get('spot_id')))
+    return response
 
 @app.route('/camera_image/<int:spot_id>')
 @login_required
 def camera_image(spot_id):
-    response = send_request('get_camera_image', {"spot_id": spot_id})
+    """Camera snapshot of a spot, from the server of its zone (?zone=, see spot_zone())."""
+    zone = spot_zone()
+    if zone is None:
+        return "Missing zone", 400
+    response = zone_request(zone, 'get_camera_image', {"spot_id": spot_id, "zone": zone})
     if response.get("status") == "success":
         image_b64 = response["image"]
         image_bytes = base64.b64decode(image_b64)
@@ -0,0 +1,195 @@
+"""
+benchmark_cipher.py
+
+Per-message cost of the wire encryption modes.
+
+For typical message sizes (a camera status update, a spot list, a
+camera image) each mode encrypts and decrypts the same payload many
+times and reports microseconds per message:
+
+    legacy            Cipher: fixed-nonce AES-CTR, decrypt returns str
+    ctr               SessionCipher: random nonce per message
+    gcm/cryptography  GcmSessionCipher with the `cryptography` backend
+    gcm/pycryptodome  GcmSessionCipher with the PyCryptodome fallback
+
+A second pass sends the same messages through protocol.Channel over a
+local socket pair, i.e. framing, one sendall() and the receive path.
+
+The GCM overhead over the CTR mode on the status message is checked
+against a budget (default 5 microseconds) for the backend the protocol
+actually uses; the script exits with status 1 when it is exceeded.
+
+Usage:
+    python benchmarks/benchmark_cipher.py [--iterations N] [--budget US]
+                                          [--output FILE]
+
+Outputs:
+    - benchmarks/results/cipher_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import aes_cipher                                                  # noqa: E402
+from aes_cipher import (AES_KEY, AES_NONCE, Cipher, GcmSessionCipher,  # noqa: E402
+                        SessionCipher, derive_session_keys)
+from protocol import Channel                                       # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# name -> payload; sizes of the messages the system actually exchanges
+MESSAGES = {
+    "status update": json.dumps({
+        "action": "update_spot_status", "spot_id": 12, "status": "occupied",
+        "confidence": 0.934}).encode("utf-8"),
+    "spot list (200)": json.dumps({
+        "status": "success",
+        "spots": [{"id": i, "status": "available", "confidence": 0.9} for i in range(200)],
+    }).encode("utf-8"),
+    "camera image": os.urandom(64 * 1024),
+}
+
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def gcm_pair(backend):
+    """Sender and receiver GcmSessionCipher using the given backend."""
+    c2s, s2c = derive_session_keys(AES_KEY, b"c" * 16, b"s" * 16)
+    saved = aes_cipher.AESGCM
+    if backend == "pycryptodome":
+        aes_cipher.AESGCM = None
+    try:
+        return GcmSessionCipher(c2s, s2c), GcmSessionCipher(s2c, c2s)
+    finally:
+        aes_cipher.AESGCM = saved
+
+def modes():
+    """name -> (sender, receiver) for every mode available here."""
+    result = {"legacy": None, "ctr": (SessionCipher(AES_KEY), SessionCipher(AES_KEY))}
+    if aes_cipher.AESGCM is not None:
+        result["gcm/cryptography"] = gcm_pair("cryptography")
+    result["gcm/pycryptodome"] = gcm_pair("pycryptodome")
+    return result
+
+def time_crypto(mode, pair, payload, iterations):
+    """Microseconds per encrypt + decrypt of one message."""
+    if pair is None:
+        legacy = Cipher(AES_KEY, AES_NONCE)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            ciphertext = legacy.aes_encrypt(payload)
+            try:
+                legacy.aes_decrypt(ciphertext)
+            except UnicodeDecodeError:
+                # Binary payload: the str decode fails after decryption
+                pass
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    sender, receiver = pair
+    size = len(payload)
+    sealed = bytearray(size + sender.tag_size)
+    opened = bytearray(size)
+    aad = b"\x00" * 12
+    start = time.perf_counter()
+    for _ in range(iterations):
+        nonce = sender.new_nonce()
+        sender.encrypt_into(nonce, payload, sealed, aad)
+        receiver.decrypt_into(nonce, sealed, opened, aad)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def time_channel(pair, payload, iterations):
+    """Microseconds per message sent and received through a Channel pair."""
+    a, b = socket.socketpair()
+    sender, receiver = Channel(a, pair[0]), Channel(b, pair[1])
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            sender.send(payload)
+            receiver.recv()
+        return (time.perf_counter() - start) / iterations * 1e6
+    finally:
+        sender.close()
+        receiver.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-message encryption overhead")
+    parser.add_argument("--iterations", type=int, default=20000,
+                        help="Messages per measurement (divided by 20 for images)")
+    parser.add_argument("--budget", type=float, default=5.0,
+                        help="Allowed GCM overhead over CTR on a status message (microseconds)")
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        "benchmark": "cipher",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "measurements": [],
+    }
+
+    available = modes()
+    print(f"{'message':<18} {'bytes':>7}  {'mode':<18} {'crypto us':>10} {'channel us':>11}")
+    timings = {}
+    for message, payload in MESSAGES.items():
+        iterations = args.iterations if len(payload) < 16384 else max(1, args.iterations // 20)
+        for mode, pair in available.items():
+            if mode.startswith("gcm"):
+                # Fresh counters for every measurement
+                pair = gcm_pair(mode.split("/")[1])
+            crypto_us = time_crypto(mode, pair, payload, iterations)
+            channel_us = None
+            if pair is not None:
+                if mode.startswith("gcm"):
+                    pair = gcm_pair(mode.split("/")[1])
+                channel_us = time_channel(pair, payload, iterations)
+            timings[(message, mode)] = crypto_us
+            print(f"{message:<18} {len(payload):>7}  {mode:<18} {crypto_us:>10.2f} "
+                  f"{'-' if channel_us is None else f'{channel_us:.2f}':>11}")
+            results["measurements"].append({
+                "message": message, "bytes": len(payload), "mode": mode,
+                "crypto_us": round(crypto_us, 3),
+                "channel_us": None if channel_us is None else round(channel_us, 3),
+            })
+
+    # The mode the protocol negotiates by default
+    backend = gcm_pair("cryptography")[0].backend
+    overhead = timings[("status update", f"gcm/{backend}")] - timings[("status update", "ctr")]
+    ok = overhead <= args.budget
+    results["gcm_backend"] = backend
+    results["gcm_overhead_us"] = round(overhead, 3)
+    results["budget_us"] = args.budget
+    results["ok"] = ok
+    print(f"{'✅' if ok else '❌'} GCM ({backend}) overhead over CTR on a status message: "
+          f"{overhead:+.2f} us (budget {args.budget:.1f} us)")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"cipher_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
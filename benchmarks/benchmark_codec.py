@@ -0,0 +1,135 @@
+"""
+benchmark_codec.py
+
+Encode/decode cost and size of the message codecs (serializers.py).
+
+Typical messages of the system (a camera status update, spot lists of
+several sizes, a parking history, a camera image response) are encoded
+and decoded repeatedly with every serializer, with and without zlib
+compression, and the microseconds per message and the payload size
+are reported. 'msgpack/python' is the pure-Python fallback used when
+the msgpack package is not installed.
+
+Usage:
+    python benchmarks/benchmark_codec.py [--iterations N] [--output FILE]
+
+Outputs:
+    - benchmarks/results/codec_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import serializers                                    # noqa: E402
+from serializers import Codec, MsgpackSerializer      # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def spot_list(count):
+    return {"status": "success", "spots": [
+        {"id": i, "status": ("available", "occupied", "reserved")[i % 3],
+         "confidence": round(0.5 + (i % 50) / 100, 3)} for i in range(1, count + 1)]}
+
+# name -> message
+MESSAGES = {
+    "status update": {"action": "update_spot_status", "spot_id": 12,
+                      "status": "occupied", "confidence": 0.934},
+    "spot list (10)": spot_list(10),
+    "spot list (1000)": spot_list(1000),
+    "history (500)": {"status": "success", "history": [
+        {"date": "2025-03-14", "time": f"{i % 24:02d}:{i % 60:02d}:00", "spot_id": i % 40}
+        for i in range(500)]},
+    "camera image": {"status": "success",
+                     "image": base64.b64encode(os.urandom(48 * 1024)).decode("ascii")},
+}
+
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def codecs():
+    """name -> Codec for every combination available here."""
+    result = {}
+    for compression in (None, "zlib"):
+        suffix = "+zlib" if compression else ""
+        result["json" + suffix] = Codec("json", compression)
+        if serializers.msgpack is not None:
+            result["msgpack" + suffix] = Codec("msgpack", compression)
+        fallback = Codec("msgpack", compression)
+        fallback.serializer = MsgpackSerializer(native=False)
+        result["msgpack/python" + suffix] = fallback
+    return result
+
+def measure(codec, message, iterations):
+    """Return (encode us, decode us, payload bytes) per message."""
+    payload = codec.encode(message)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(message)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(payload)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+    if codec.decode(payload) != message:
+        raise AssertionError("Round trip changed the message")
+    return encode_us, decode_us, len(payload)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure message codec speed and size")
+    parser.add_argument("--iterations", type=int, default=2000,
+                        help="Repetitions for small messages (scaled down for large ones)")
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        "benchmark": "codec",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "msgpack_native": serializers.msgpack is not None,
+        "measurements": [],
+    }
+
+    available = codecs()
+    print(f"{'message':<18} {'codec':<20} {'encode us':>10} {'decode us':>10} {'bytes':>8}")
+    for name, message in MESSAGES.items():
+        size = len(json.dumps(message))
+        iterations = max(5, args.iterations * 200 // max(200, size // 10))
+        for codec_name, codec in available.items():
+            encode_us, decode_us, size = measure(codec, message, iterations)
+            print(f"{name:<18} {codec_name:<20} {encode_us:>10.1f} {decode_us:>10.1f} {size:>8}")
+            results["measurements"].append({
+                "message": name, "codec": codec_name, "encode_us": round(encode_us, 2),
+                "decode_us": round(decode_us, 2), "bytes": size,
+            })
+        print()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"codec_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+benchmark_db.py
+
+Per-row cost and memory of the server's hot read paths.
+
+Seeds a temporary SQLite database (default 10k spots and 1M history
+rows spread over 1k users) and compares, for get_parking_spots and
+get_parking_history, the ORM approach the server used before (load
+ParkingSpot/ParkingHistory instances, then build dicts) with the
+current Core select() of column tuples (ParkingServer._list_spots and
+_get_history). History is additionally measured before the
+parking_history.user_id index exists, which is what older databases
+without it paid on every request.
+
+Time is the median of --repeat runs; memory is the tracemalloc peak of
+one extra run (tracemalloc slows Python down, so it is measured apart).
+
+Usage:
+    python benchmarks/benchmark_db.py [--spots N] [--history N] [--users N]
+                                      [--repeat N] [--output FILE]
+
+Outputs:
+    - benchmarks/results/db_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert, text                                  # noqa: E402
+from server import ParkingHistory, ParkingServer, ParkingSpot, User  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SEED_BATCH = 50000
+
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+# -------------------------------------------------------------------
+# Previous implementations (ORM instances), kept for comparison
+# -------------------------------------------------------------------
+
+def orm_list_spots(server, session):
+    spots = session.query(ParkingSpot).all()
+    confidence = server.spot_confidence
+    return {"status": "success",
+            "spots": [{"id": s.id, "status": s.status, "zone": s.zone,
+                       "confidence": confidence.get(s.id)}
+                      for s in spots]}
+
+def orm_get_history(server, session, user_id):
+    entries = session.query(ParkingHistory).filter_by(user_id=user_id).all()
+    return {"status": "success",
+            "history": [{"parking_date": e.parking_date, "parking_time": e.parking_time,
+                         "spot_id": e.spot_id, "action": "Reserved"} for e in entries]}
+
+# -------------------------------------------------------------------
+# Measurement
+# -------------------------------------------------------------------
+
+def seed(server, spots, history, users):
+    """Fill the database; parking_history gets no user_id index yet."""
+    with server.SessionLocal() as session:
+        session.execute(insert(ParkingSpot), [{"status": "available"}] * spots)
+        session.execute(insert(User), [
+            {"username": f"bench{i}", "password": "x", "is_admin": 0} for i in range(users)])
+        for start in range(0, history, SEED_BATCH):
+            session.execute(insert(ParkingHistory), [
+                {"user_id": i % users + 1, "parking_date": "2025-03-14",
+                 "parking_time": f"{i % 24:02d}:{i % 60:02d}:00", "spot_id": i % spots + 1}
+                for i in range(start, min(history, start + SEED_BATCH))])
+        session.commit()
+
+def measure(server, fn, repeat):
+    """
+    Run fn(session) `repeat` times with a fresh session each time.
+
+    Returns:
+        tuple: (median seconds, tracemalloc peak bytes, rows returned).
+    """
+    times = []
+    rows = 0
+    for _ in range(repeat):
+        with server.SessionLocal() as session:
+            start = time.perf_counter()
+            result = fn(session)
+            times.append(time.perf_counter() - start)
+        rows = len(result.get("spots") or result.get("history") or [])
+    with server.SessionLocal() as session:
+        tracemalloc.start()
+        fn(session)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    times.sort()
+    return times[len(times) // 2], peak, rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-row cost of the read paths")
+    parser.add_argument("--spots", type=int, default=10000)
+    parser.add_argument("--history", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "db",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spots": args.spots, "history": args.history, "users": args.users,
+        "measurements": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="parkscout-db-") as tmp:
+        server = ParkingServer(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        # Start like a database created before the user_id index existed;
+        # init_database() adds it again after the "no index" measurement
+        server.init_database()
+        with server.engine.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS ix_parking_history_user_id"))
+
+        print(f"🌱 Seeding {args.spots} spots, {args.history} history rows, {args.users} users...")
+        start = time.perf_counter()
+        seed(server, args.spots, args.history, args.users)
+        print(f"   done in {time.perf_counter() - start:.1f}s")
+
+        user_id = args.users // 2 or 1
+        cases = [
+            ("get_parking_history", "orm, no index",
+             lambda s: orm_get_history(server, s, user_id)),
+        ]
+        for name, variant, fn in cases:
+            results["measurements"].append((name, variant, measure(server, fn, args.repeat)))
+
+        server.init_database()  # adds the user_id index
+        cases = [
+            ("get_parking_spots", "orm", lambda s: orm_list_spots(server, s)),
+            ("get_parking_spots", "core columns", lambda s: server._list_spots({}, s)),
+            ("get_parking_history", "orm", lambda s: orm_get_history(server, s, user_id)),
+            ("get_parking_history", "core columns",
+             lambda s: server._get_history({"user_id": user_id}, s)),
+        ]
+        for name, variant, fn in cases:
+            results["measurements"].append((name, variant, measure(server, fn, args.repeat)))
+        server.engine.dispose()
+
+    print(f"\n{'action':<22} {'variant':<15} {'rows':>7} {'total ms':>9} "
+          f"{'us/row':>8} {'peak KiB':>9} {'B/row':>7}")
+    measurements = []
+    for name, variant, (seconds, peak, rows) in results["measurements"]:
+        per_row = seconds / rows * 1e6 if rows else 0.0
+        print(f"{name:<22} {variant:<15} {rows:>7} {seconds * 1000:>9.2f} "
+              f"{per_row:>8.2f} {peak / 1024:>9.0f} {peak // max(rows, 1):>7}")
+        measurements.append({"action": name, "variant": variant, "rows": rows,
+                             "median_ms": round(seconds * 1000, 3),
+                             "us_per_row": round(per_row, 3), "peak_bytes": peak})
+    results["measurements"] = measurements
+
+    output = args.output or os.path.join(RESULTS_DIR, f"db_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
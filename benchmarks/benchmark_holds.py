@@ -0,0 +1,171 @@
+"""
+benchmark_holds.py
+
+Cost of reservation expiry (spot_events.HoldScheduler).
+
+1. Scheduling: microseconds per schedule() with n holds already pending,
+   for growing n. The heap makes this O(log n), so the cost should stay
+   nearly flat.
+2. Release: a ParkingServer on a temporary SQLite database with --spots
+   spots gets --holds reservations (through handle_request, like real
+   clients) with a short TTL. The script reports how late after their
+   deadline the holds were released, in how many batches, and how long
+   the periodic table scan that the scheduler replaces would take per
+   tick on the same table.
+
+Usage:
+    python benchmarks/benchmark_holds.py [--spots N] [--holds N] [--ttl S]
+                                         [--output FILE]
+
+Outputs:
+    - benchmarks/results/holds_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert, select                 # noqa: E402
+from server import ParkingServer, ParkingSpot, User    # noqa: E402
+from spot_events import HoldScheduler                 # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def measure_schedule(sizes, batch=10000):
+    """Microseconds per schedule() after `size` holds are already pending."""
+    results = []
+    for size in sizes:
+        scheduler = HoldScheduler(release=lambda ids: None)
+        far = time.time() + 3600
+        for i in range(size):
+            scheduler.schedule(i, far + i)
+        start = time.perf_counter()
+        for i in range(batch):
+            scheduler.schedule(size + i, far + (i * 7919) % size if size else far)
+        us = (time.perf_counter() - start) / batch * 1e6
+        print(f"   {size:>9} pending: {us:6.2f} us/schedule")
+        results.append({"pending": size, "us_per_schedule": round(us, 3)})
+    return results
+
+def measure_release(spots, holds, ttl):
+    """Reserve `holds` spots with a `ttl` second hold and time their release."""
+    with tempfile.TemporaryDirectory(prefix="parkscout-holds-") as tmp:
+        server = ParkingServer(db_url=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                               reservation_ttl=ttl)
+        server.init_database()
+        with server.SessionLocal() as session:
+            session.execute(insert(ParkingSpot), [{"status": "available"}] * spots)
+            session.execute(insert(User), [{"username": "bench", "password": "x", "is_admin": 0}])
+            session.commit()
+
+        batches = []
+        release = server._release_holds
+        def counting_release(spot_ids):
+            batches.append(len(spot_ids))
+            release(spot_ids)
+        server.holds.release = counting_release
+        server.holds.start()
+
+        seq = server.changes.seq
+        start = time.perf_counter()
+        deadlines = {}
+        for spot_id in range(1, holds + 1):
+            response = server.handle_request(
+                {"action": "reserve_spot", "user_id": 1, "spot_id": spot_id})
+            deadlines[spot_id] = response["reserved_until"]
+        reserve_s = time.perf_counter() - start
+
+        # Follow the change feed until every hold has been released
+        lateness = []
+        remaining = set(deadlines)
+        give_up = time.time() + ttl + 60
+        while remaining and time.time() < give_up:
+            seq, changes, _ = server.changes.since(seq, timeout=1.0)
+            now = time.time()
+            for change in changes:
+                if change["status"] == "available" and change["spot_id"] in deadlines:
+                    remaining.discard(change["spot_id"])
+                    lateness.append(now - deadlines[change["spot_id"]])
+        server.holds.stop()
+
+        # What a periodic scan would cost per tick on the same table
+        scan = select(ParkingSpot.id).where(ParkingSpot.status == "reserved",
+                                            ParkingSpot.reserved_until <= time.time())
+        with server.SessionLocal() as session:
+            start = time.perf_counter()
+            for _ in range(20):
+                session.execute(scan).all()
+            scan_ms = (time.perf_counter() - start) / 20 * 1000
+        server.engine.dispose()
+
+    lateness.sort()
+    return {
+        "spots": spots, "holds": holds, "ttl_s": ttl,
+        "reserve_us": round(reserve_s / holds * 1e6, 1),
+        "released": len(lateness), "missed": len(remaining),
+        "batches": len(batches), "largest_batch": max(batches, default=0),
+        "lateness_p50_ms": round(lateness[len(lateness) // 2] * 1000, 2) if lateness else None,
+        "lateness_max_ms": round(lateness[-1] * 1000, 2) if lateness else None,
+        "scan_ms_per_tick": round(scan_ms, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure reservation expiry cost")
+    parser.add_argument("--spots", type=int, default=10000)
+    parser.add_argument("--holds", type=int, default=1000)
+    parser.add_argument("--ttl", type=float, default=5.0)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "holds",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+    print("⏱️ HoldScheduler.schedule()")
+    results["schedule"] = measure_schedule([0, 1000, 10000, 100000, 1000000])
+
+    print(f"⏱️ Releasing {args.holds} holds ({args.ttl}s TTL) on {args.spots} spots")
+    release = measure_release(args.spots, args.holds, args.ttl)
+    results["release"] = release
+    print(f"   reserve: {release['reserve_us']} us/request")
+    print(f"   released {release['released']} (missed {release['missed']}) in "
+          f"{release['batches']} batches (largest {release['largest_batch']})")
+    print(f"   lateness after deadline: p50 {release['lateness_p50_ms']} ms, "
+          f"max {release['lateness_max_ms']} ms")
+    print(f"   periodic scan instead: {release['scan_ms_per_tick']} ms per tick")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"holds_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+benchmark_replicas.py
+
+Read throughput with read replicas, and how far replicas lag behind.
+
+For every replica count in --replicas, a primary `server.py` process is
+started on a temporary SQLite database with --spots spots, plus that
+many `server.py --replica-of` processes on the same database. --clients
+load processes (each with --threads threads and its own
+zone_router.ZoneRouter) then run for --duration seconds. Reads
+(get_parking_spots, get_parking_history) go to the replicas in turn, or
+to the primary when there are none; a --write-share of the operations
+are camera status updates, which always go to the primary.
+
+Replication lag is measured separately: a status change is written on
+the primary while a client long-polls get_spot_changes on each replica,
+and the time until every replica reported it is recorded (--lag-samples
+times).
+
+Read capacity grows with replicas only while there are free cores for
+the extra processes.
+
+Usage:
+    python benchmarks/benchmark_replicas.py [--replicas 0,1,3] [--spots 1000]
+        [--clients 4] [--threads 8] [--duration 10] [--write-share 0.1]
+        [--output FILE]
+
+Outputs:
+    - benchmarks/results/replicas_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert                              # noqa: E402
+from benchmark_server import free_port, git_commit, parse_list  # noqa: E402
+from benchmark_zones import wait_ready                     # noqa: E402
+from pipeline_stats import percentile                      # noqa: E402
+from protocol import connect                               # noqa: E402
+from server import ParkingHistory, ParkingServer, ParkingSpot, User  # noqa: E402
+from zone_router import ZoneRouter                         # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+HOST = "127.0.0.1"
+
+
+# -------------------------------------------------------------------
+# Servers
+# -------------------------------------------------------------------
+
+def start_servers(tmp, replicas, spots):
+    """
+    Seed a database and start a primary plus `replicas` replica processes.
+
+    Returns:
+        tuple: (processes, primary port, replica ports).
+    """
+    db_url = f"sqlite:///{os.path.join(tmp, f'replicas{replicas}.db')}"
+    seeder = ParkingServer(db_url=db_url)
+    seeder.init_database()
+    with seeder.SessionLocal() as session:
+        session.execute(insert(ParkingSpot), [{"status": "available"}] * spots)
+        session.execute(insert(User), [{"username": "bench", "password": "x", "is_admin": 0}])
+        session.execute(insert(ParkingHistory), [
+            {"user_id": 1, "spot_id": i % spots + 1, "parking_date": "2024-01-01",
+             "parking_time": "08:00:00"} for i in range(20)])
+        session.commit()
+    seeder.engine.dispose()
+
+    def launch(port, *extra):
+        return subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py"), "--host", HOST,
+             "--port", str(port), "--db", db_url, "--max-workers", "64", *extra],
+            cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    primary = free_port()
+    processes = [launch(primary)]
+    wait_ready(HOST, primary)
+    replica_ports = [free_port() for _ in range(replicas)]
+    for port in replica_ports:
+        processes.append(launch(port, "--replica-of", f"{HOST}:{primary}"))
+    for port in replica_ports:
+        wait_synced(port)
+    return processes, primary, replica_ports
+
+def wait_synced(port, timeout=15.0):
+    """Wait until a replica answers get_parking_spots from its copy."""
+    wait_ready(HOST, port, timeout)
+    deadline = time.monotonic() + timeout
+    channel = connect(HOST, port)
+    try:
+        while time.monotonic() < deadline:
+            if channel.request({"action": "get_parking_spots"}).get("status") == "success":
+                return
+            time.sleep(0.05)
+    finally:
+        channel.close()
+    raise RuntimeError(f"Replica on port {port} did not sync")
+
+# -------------------------------------------------------------------
+# Load processes
+# -------------------------------------------------------------------
+
+def load_thread(router, spots, write_share, stop, seed, samples):
+    rng = random.Random(seed)
+    while not stop.is_set():
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < write_share:
+            kind = "write"
+            response = router.request("default", "update_spot_status", {
+                "spot_id": rng.randint(1, spots),
+                "status": rng.choice(("available", "occupied"))})
+        elif roll < (1 + write_share) / 2:
+            kind = "spots"
+            response = router.request("default", "get_parking_spots")
+        else:
+            kind = "history"
+            response = router.request("default", "get_parking_history", {"user_id": 1})
+        samples.append((kind, time.perf_counter() - start, response.get("status") == "success"))
+
+def load_process(primary, replica_ports, spots, write_share, threads, duration, seed, results):
+    """One client process: `threads` threads sharing a ZoneRouter."""
+    logging.getLogger().setLevel(logging.WARNING)
+    router = ZoneRouter({"default": (HOST, primary)},
+                        replicas={(HOST, primary): [(HOST, p) for p in replica_ports]})
+    stop = threading.Event()
+    samples = []
+    workers = [threading.Thread(target=load_thread, args=(
+        router, spots, write_share, stop, seed + i, samples)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+    router.close()
+    results.put(samples)
+
+# -------------------------------------------------------------------
+# Replication lag
+# -------------------------------------------------------------------
+
+def measure_lag(primary, replica_ports, samples):
+    """Seconds from a write on the primary until every replica reported it."""
+    if not replica_ports:
+        return []
+    writer = connect(HOST, primary)
+    followers = [connect(HOST, port, timeout=30) for port in replica_ports]
+    # Start from a known status so that every write below changes it
+    writer.request({"action": "update_spot_status", "spot_id": 1, "status": "available"})
+    lags = []
+    with ThreadPoolExecutor(max_workers=len(followers)) as pool:
+        for i in range(samples):
+            # A status no spot has: only the feed position comes back
+            positions = [f.request({"action": "get_parking_spots", "status": "none"})["seq"]
+                         for f in followers]
+            polls = [pool.submit(f.request, {"action": "get_spot_changes",
+                                             "since": seq, "timeout": 10})
+                     for f, seq in zip(followers, positions)]
+            start = time.perf_counter()
+            writer.request({"action": "update_spot_status", "spot_id": 1,
+                            "status": "occupied" if i % 2 == 0 else "available"})
+            for poll in polls:
+                poll.result()
+            lags.append(time.perf_counter() - start)
+    writer.close()
+    for f in followers:
+        f.close()
+    return sorted(lags)
+
+def run_scenario(args, replicas):
+    with tempfile.TemporaryDirectory(prefix="parkscout-replicas-") as tmp:
+        processes, primary, replica_ports = start_servers(tmp, replicas, args.spots)
+        try:
+            results = mp.Queue()
+            clients = [mp.Process(target=load_process, args=(
+                primary, replica_ports, args.spots, args.write_share, args.threads,
+                args.duration, args.seed + 1000 * i, results)) for i in range(args.clients)]
+            for p in clients:
+                p.start()
+            samples = []
+            for _ in clients:
+                samples.extend(results.get())
+            for p in clients:
+                p.join()
+            lags = measure_lag(primary, replica_ports, args.lag_samples)
+        finally:
+            for p in processes:
+                p.terminate()
+                p.wait()
+
+    reads = sorted(s for k, s, _ in samples if k != "write")
+    writes = sorted(s for k, s, _ in samples if k == "write")
+    return {
+        "replicas": replicas, "ops": len(samples),
+        "reads_per_s": round(len(reads) / args.duration, 1),
+        "writes_per_s": round(len(writes) / args.duration, 1),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "read_p50_ms": round(percentile(reads, 50) * 1000, 3) if reads else None,
+        "read_p99_ms": round(percentile(reads, 99) * 1000, 3) if reads else None,
+        "write_p50_ms": round(percentile(writes, 50) * 1000, 3) if writes else None,
+        "lag_p50_ms": round(percentile(lags, 50) * 1000, 3) if lags else None,
+        "lag_max_ms": round(lags[-1] * 1000, 3) if lags else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure read throughput with read replicas")
+    parser.add_argument("--replicas", default="0,1,3", help="Comma-separated replica counts")
+    parser.add_argument("--spots", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per load process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-share", type=float, default=0.1,
+                        help="Share of operations that are status updates")
+    parser.add_argument("--lag-samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "replicas",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scenarios": [],
+    }
+
+    print(f"{'replicas':>8} {'reads/s':>9} {'writes/s':>9} {'errors':>7} "
+          f"{'read p50/p99 ms':>16} {'lag p50/max ms':>15}")
+    for replicas in parse_list(args.replicas, int):
+        s = run_scenario(args, replicas)
+        results["scenarios"].append(s)
+        lag = f"{s['lag_p50_ms']:.2f}/{s['lag_max_ms']:.2f}" if s["lag_p50_ms"] is not None else "-"
+        print(f"{s['replicas']:>8} {s['reads_per_s']:>9.1f} {s['writes_per_s']:>9.1f} "
+              f"{s['errors']:>7} {s['read_p50_ms']:>7.2f}/{s['read_p99_ms']:<8.2f} {lag:>15}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"replicas_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+benchmark_reservations.py
+
+High-contention check of reserve_spot: no spot may ever be booked twice.
+
+A LocalServer (see benchmark_server.py) is seeded with a few spots.
+Every round, --clients viewer threads each open a connection, wait on a
+barrier and then all try to reserve every spot at once (in a shuffled
+order), so each spot gets --clients concurrent attempts. Meanwhile
+--cameras threads keep reporting 'available' for the spots with
+preserve_reserved, the way camera_predict does, which must not release
+a reservation either.
+
+After each round the script checks that every spot had exactly one
+successful reservation, is 'reserved' in the database and has exactly
+one parking_history row. The same rounds are then repeated against the
+previous read-check-write implementation of _reserve_spot for
+comparison (--no-naive skips it); double bookings there are reported
+but only the current implementation decides the exit status.
+
+Usage:
+    python benchmarks/benchmark_reservations.py [--spots N] [--clients N]
+        [--cameras N] [--rounds N] [--no-naive] [--output FILE]
+
+Outputs:
+    - benchmarks/results/reservations_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import delete, func, select, update      # noqa: E402
+from benchmark_server import LocalServer, git_commit      # noqa: E402
+from client import ParkingClient                          # noqa: E402
+from pipeline_stats import percentile                     # noqa: E402
+from server import ParkingHistory, ParkingSpot, User      # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# -------------------------------------------------------------------
+# Previous implementation (read, check, write), kept for comparison
+# -------------------------------------------------------------------
+
+def naive_reserve_spot(req, session):
+    user = session.get(User, req.get("user_id"))
+    spot = session.get(ParkingSpot, req.get("spot_id"))
+    if user and spot and spot.status == "available":
+        time.sleep(0)  # yield, as the network round trip of a real client would
+        spot.status = "reserved"
+        now = datetime.now()
+        session.add(ParkingHistory(
+            user_id=user.id, parking_date=now.strftime("%Y-%m-%d"),
+            parking_time=now.strftime("%H:%M:%S"), spot_id=spot.id))
+        session.commit()
+        return {"status": "success", "message": f"Spot {spot.id} reserved"}
+    return {"status": "error", "message": "Cannot reserve spot"}
+
+# -------------------------------------------------------------------
+# Measurement
+# -------------------------------------------------------------------
+
+def reset(local):
+    """Make every spot available again and clear the history."""
+    with local.server.SessionLocal() as session:
+        session.execute(update(ParkingSpot).values(status="available", reserved_until=None))
+        session.execute(delete(ParkingHistory))
+        session.commit()
+
+def viewer(client, user_id, spot_ids, barrier, wins, latencies, seed):
+    order = list(spot_ids)
+    random.Random(seed).shuffle(order)
+    barrier.wait()
+    for spot_id in order:
+        start = time.perf_counter()
+        try:
+            response = client.request("reserve_spot", {"user_id": user_id, "spot_id": spot_id})
+        except Exception:
+            response = {}
+        latencies.append(time.perf_counter() - start)
+        if response.get("status") == "success":
+            wins.append(spot_id)
+
+def camera(host, port, spot_ids, stop):
+    client = ParkingClient(host, port)
+    while not stop.is_set():
+        for spot_id in spot_ids:
+            client.request("update_spot_status", {"spot_id": spot_id, "status": "available",
+                                                   "preserve_reserved": True})
+    client.close()
+
+def run_round(local, spot_ids, clients, cameras, seed):
+    """
+    One round of concurrent reservations.
+
+    Returns:
+        tuple: (wins per spot, final status per spot, history rows per
+        spot, reserve latencies in seconds, wall time in seconds).
+    """
+    reset(local)
+    host, port = "127.0.0.1", local.port
+    connections = [ParkingClient(host, port) for _ in range(clients)]
+    barrier = threading.Barrier(clients + 1)
+    wins, latencies = [], []
+    threads = [threading.Thread(target=viewer, args=(
+        conn, local.user_ids[i % len(local.user_ids)], spot_ids, barrier, wins,
+        latencies, seed + i)) for i, conn in enumerate(connections)]
+    stop = threading.Event()
+    camera_threads = [threading.Thread(target=camera, args=(host, port, spot_ids, stop))
+                      for _ in range(cameras)]
+    for t in camera_threads + threads:
+        t.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    stop.set()
+    for t in camera_threads:
+        t.join()
+    for conn in connections:
+        conn.close()
+
+    with local.server.SessionLocal() as session:
+        statuses = dict(session.execute(select(ParkingSpot.id, ParkingSpot.status)).all())
+        history = dict(session.execute(
+            select(ParkingHistory.spot_id, func.count()).group_by(ParkingHistory.spot_id)).all())
+    return Counter(wins), statuses, history, latencies, wall
+
+def run_variant(args, name, naive):
+    local = LocalServer(args.spots, args.clients, max_workers=args.clients + args.cameras + 4)
+    if naive:
+        local.server._reserve_spot = naive_reserve_spot
+    spot_ids = list(range(1, args.spots + 1))
+    double_booked = lost = 0
+    latencies, wall = [], 0.0
+    try:
+        for r in range(args.rounds):
+            wins, statuses, history, round_latencies, round_wall = run_round(
+                local, spot_ids, args.clients, args.cameras, args.seed + r * args.clients)
+            latencies += round_latencies
+            wall += round_wall
+            for spot_id in spot_ids:
+                if wins[spot_id] > 1 or history.get(spot_id, 0) > 1:
+                    double_booked += 1
+                elif wins[spot_id] != 1 or statuses.get(spot_id) != "reserved" \
+                        or history.get(spot_id, 0) != 1:
+                    lost += 1
+    finally:
+        local.close()
+
+    latencies.sort()
+    attempts = len(latencies)
+    result = {
+        "variant": name, "attempts": attempts,
+        "spots_checked": args.spots * args.rounds,
+        "double_booked": double_booked, "inconsistent": lost,
+        "attempts_per_s": round(attempts / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+    }
+    print(f"{name:<8} {attempts:>9} {result['spots_checked']:>6} {double_booked:>7} "
+          f"{lost:>6} {result['attempts_per_s']:>10.1f} {result['p50_ms']:>8.2f} "
+          f"{result['p99_ms']:>8.2f}")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Check reservations under high contention")
+    parser.add_argument("--spots", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=200,
+                        help="Concurrent reservation attempts per spot")
+    parser.add_argument("--cameras", type=int, default=2,
+                        help="Threads reporting 'available' during the rounds")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-naive", action="store_true",
+                        help="Skip the previous read-check-write implementation")
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "reservations",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spots": args.spots, "clients": args.clients,
+        "cameras": args.cameras, "rounds": args.rounds,
+        "variants": [],
+    }
+
+    print(f"{'variant':<8} {'attempts':>9} {'spots':>6} {'double':>7} {'other':>6} "
+          f"{'attempts/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    current = run_variant(args, "cas", naive=False)
+    results["variants"].append(current)
+    if not args.no_naive:
+        results["variants"].append(run_variant(args, "naive", naive=True))
+
+    ok = current["double_booked"] == 0 and current["inconsistent"] == 0
+    results["ok"] = ok
+    print(f"{'✅' if ok else '❌'} {current['double_booked']} double bookings, "
+          f"{current['inconsistent']} inconsistent spots with the current implementation")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"reservations_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+benchmark_server.py
+
+Reproducible load generator for the ParkScout socket server.
+
+Simulates N cameras (each repeatedly sending update_spot_status for its
+own spot) and M viewers (mixing get_parking_spots reads with reserve_spot
+writes at a configurable read ratio) over persistent AES-encrypted
+connections, and reports throughput, p50/p99 latency and error rates per
+action. Results are written to a JSON file tagged with the current git
+commit so runs can be compared across commits.
+
+By default every scenario runs against a fresh in-process ParkingServer
+backed by a temporary SQLite database; use --host/--port to target an
+already running server instead.
+
+Usage:
+    python benchmarks/benchmark_server.py [--quick] [--duration SECONDS]
+        [--cameras 1,4] [--viewers 1,16] [--spots 10,1000,10000]
+        [--read-ratio 0.9,0.5] [--host HOST --port PORT] [--output FILE]
+
+Outputs:
+    - benchmarks/results/server_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert                              # noqa: E402
+from client import ParkingClient                           # noqa: E402
+from pipeline_stats import percentile                      # noqa: E402
+from server import ParkingServer, ParkingSpot, User        # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def free_port():
+    """Ask the OS for an unused TCP port on the loopback interface."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def parse_list(text, cast):
+    """Parse a comma-separated command-line list, e.g. '10,1000'."""
+    return [cast(item) for item in text.split(",") if item]
+
+class LocalServer:
+    """
+    A ParkingServer running in a background thread on a temporary
+    SQLite database, pre-seeded with spots and benchmark users.
+    """
+
+    def __init__(self, spots, users, max_workers):
+        self.tmpdir = tempfile.TemporaryDirectory(prefix="parkscout-bench-")
+        self.port = free_port()
+        self.server = ParkingServer(
+            host="127.0.0.1", port=self.port, max_workers=max_workers,
+            db_url=f"sqlite:///{os.path.join(self.tmpdir.name, 'bench.db')}")
+        self.server.init_database()
+
+        # Seed directly through SQLAlchemy: creating 10k spots over the
+        # socket would dominate the benchmark's runtime
+        with self.server.SessionLocal() as session:
+            session.execute(insert(ParkingSpot), [{"status": "available"}] * spots)
+            session.execute(insert(User), [
+                {"username": f"bench{i}", "password": "x", "is_admin": 0}
+                for i in range(users)])
+            session.commit()
+            self.user_ids = [u.id for u in session.query(User.id).all()]
+
+        self.thread = threading.Thread(target=self.server.start, daemon=True)
+        self.thread.start()
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.2).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError("Benchmark server did not start")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.engine.dispose()
+        self.tmpdir.cleanup()
+
+def prepare_remote(host, port, spots, users):
+    """
+    Make sure an external server has at least `spots` spots and `users`
+    benchmark accounts. Returns the list of benchmark user IDs.
+    """
+    client = ParkingClient(host, port)
+    try:
+        existing = len(client.request("get_parking_spots").get("spots", []))
+        for _ in range(max(0, spots - existing)):
+            client.request("add_parking_spot")
+        user_ids = []
+        for i in range(users):
+            creds = {"username": f"bench{i}", "password": "bench"}
+            client.request("register", creds)
+            user_ids.append(client.request("login", creds).get("user_id"))
+        return [uid for uid in user_ids if uid is not None]
+    finally:
+        client.close()
+
+
+# -------------------------------------------------------------------
+# Load generation
+# -------------------------------------------------------------------
+
+class Recorder:
+    """Per-worker latency and outcome counters, merged after the run."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.rejected = {}
+        self.errors = {}
+
+    def add(self, action, seconds, outcome):
+        self.latencies.setdefault(action, []).append(seconds)
+        if outcome == "rejected":
+            self.rejected[action] = self.rejected.get(action, 0) + 1
+        elif outcome == "error":
+            self.errors[action] = self.errors.get(action, 0) + 1
+
+def timed_request(client, recorder, action, data=None):
+    """Issue one request and record its latency and outcome."""
+    start = time.perf_counter()
+    try:
+        response = client.request(action, data)
+        outcome = "ok" if response.get("status") == "success" else "rejected"
+    except Exception:
+        outcome = "error"
+    recorder.add(action, time.perf_counter() - start, outcome)
+
+def camera_worker(host, port, spot_ids, stop, recorder, seed):
+    """Repeatedly report an occupancy status for this camera's spot."""
+    rng = random.Random(seed)
+    client = ParkingClient(host, port)
+    spot_id = spot_ids[seed % len(spot_ids)]
+    while not stop.is_set():
+        status = "available" if rng.random() < 0.5 else "occupied"
+        timed_request(client, recorder, "update_spot_status",
+                      {"spot_id": spot_id, "status": status})
+    client.close()
+
+def viewer_worker(host, port, spot_ids, user_ids, read_ratio, stop, recorder, seed):
+    """Poll the spot list and occasionally try to reserve a random spot."""
+    rng = random.Random(seed)
+    client = ParkingClient(host, port)
+    while not stop.is_set():
+        if rng.random() < read_ratio:
+            timed_request(client, recorder, "get_parking_spots")
+        else:
+            timed_request(client, recorder, "reserve_spot", {
+                "user_id": rng.choice(user_ids),
+                "spot_id": rng.choice(spot_ids)})
+    client.close()
+
+def run_scenario(args, cameras, viewers, spots, read_ratio):
+    """
+    Run one cameras x viewers x spots x read-ratio combination.
+
+    Returns:
+        dict: Scenario parameters plus per-action and total metrics.
+    """
+    local = None
+    if args.host:
+        host, port = args.host, args.port
+        user_ids = prepare_remote(host, port, spots, max(viewers, 1))
+    else:
+        local = LocalServer(spots, max(viewers, 1), max_workers=cameras + viewers + 4)
+        host, port, user_ids = "127.0.0.1", local.port, local.user_ids
+
+    try:
+        probe = ParkingClient(host, port)
+        spot_ids = [s["id"] for s in probe.request(
+            "get_parking_spots").get("spots", [])][:spots]
+        probe.close()
+        stop = threading.Event()
+        recorders, threads = [], []
+        for i in range(cameras):
+            rec = Recorder()
+            recorders.append(rec)
+            threads.append(threading.Thread(target=camera_worker, args=(
+                host, port, spot_ids, stop, rec, args.seed + i)))
+        for i in range(viewers):
+            rec = Recorder()
+            recorders.append(rec)
+            threads.append(threading.Thread(target=viewer_worker, args=(
+                host, port, spot_ids, user_ids, read_ratio, stop, rec,
+                args.seed + 1000 + i)))
+
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if local:
+            local.close()
+
+    actions = {}
+    total_ops = total_errors = 0
+    for action in sorted({a for r in recorders for a in r.latencies}):
+        samples = sorted(s for r in recorders for s in r.latencies.get(action, []))
+        errors = sum(r.errors.get(action, 0) for r in recorders)
+        rejected = sum(r.rejected.get(action, 0) for r in recorders)
+        actions[action] = {
+            "ops": len(samples),
+            "ops_per_s": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+            "rejected_rate": round(rejected / len(samples), 4) if samples else 0.0,
+        }
+        total_ops += len(samples)
+        total_errors += errors
+
+    return {
+        "cameras": cameras,
+        "viewers": viewers,
+        "spots": spots,
+        "read_ratio": read_ratio,
+        "duration_s": round(elapsed, 2),
+        "total_ops_per_s": round(total_ops / elapsed, 1),
+        "total_error_rate": round(total_errors / total_ops, 4) if total_ops else 0.0,
+        "actions": actions,
+    }
+
+
+# -------------------------------------------------------------------
+# Entry point
+# -------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="ParkingServer load benchmark")
+    parser.add_argument("--cameras", default="1,4", help="Comma-separated camera counts")
+    parser.add_argument("--viewers", default="1,16", help="Comma-separated viewer counts")
+    parser.add_argument("--spots", default="10,1000,10000", help="Comma-separated spot counts")
+    parser.add_argument("--read-ratio", default="0.9,0.5",
+                        help="Comma-separated fractions of viewer ops that are reads")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for workloads")
+    parser.add_argument("--quick", action="store_true",
+                        help="Single small scenario (smoke test)")
+    parser.add_argument("--host", help="Benchmark an already running server")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    # Per-connection server logging would distort the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.quick:
+        args.cameras, args.viewers, args.spots, args.read_ratio = "1", "2", "10", "0.9"
+        args.duration = min(args.duration, 2.0)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "server",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": f"{args.host}:{args.port}" if args.host else "in-process",
+        "seed": args.seed,
+        "scenarios": [],
+    }
+
+    print(f"{'cams':>4} {'view':>4} {'spots':>6} {'read':>5} "
+          f"{'ops/s':>9} {'err%':>6}  per-action p50/p99 ms")
+    for cameras in parse_list(args.cameras, int):
+        for viewers in parse_list(args.viewers, int):
+            for spots in parse_list(args.spots, int):
+                for ratio in parse_list(args.read_ratio, float):
+                    res = run_scenario(args, cameras, viewers, spots, ratio)
+                    results["scenarios"].append(res)
+                    detail = "  ".join(
+                        f"{a}={m['p50_ms']:.2f}/{m['p99_ms']:.2f}"
+                        for a, m in res["actions"].items())
+                    print(f"{cameras:>4} {viewers:>4} {spots:>6} {ratio:>5.2f} "
+                          f"{res['total_ops_per_s']:>9.1f} "
+                          f"{res['total_error_rate'] * 100:>6.2f}  {detail}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"server_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+benchmark_startup.py
+
+Startup-time guard for the command-line entry points.
+
+Each probe starts a fresh interpreter, imports an entry point the way
+its CLI would (and, where cheap, runs its argument parsing), then
+reports whether TensorFlow got imported and the peak RSS. Wall time is
+measured from the parent, so it includes interpreter startup. Every
+probe has a time budget and may forbid TensorFlow; the script exits
+with status 1 if any probe misses its budget or imports TensorFlow
+where it must not, so it can run as a regression check.
+
+Usage:
+    python benchmarks/benchmark_startup.py [--repeat N] [--only NAME,...]
+                                           [--scale FACTOR] [--output FILE]
+
+Outputs:
+    - benchmarks/results/startup_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Appended to every probe: report TensorFlow presence and peak RSS
+REPORT = """
+import json as _json, resource as _resource, sys as _sys
+_rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+print("@@STARTUP@@" + _json.dumps({
+    "tensorflow": "tensorflow" in _sys.modules,
+    "peak_rss_mb": round(_rss / (1024 * 1024 if _sys.platform == "darwin" else 1024), 1)}))
+"""
+
+# name -> (code run in the child, budget in seconds, TensorFlow allowed)
+PROBES = {
+    "python": (
+        "pass", 0.5, False),
+    "camera_predict --headless": (
+        "import camera_predict as m; m.parse_args(['1', '--headless'])", 1.5, False),
+    "camera_predict --replay --skip-inference": (
+        "import camera_predict as m; m.parse_args(['1', '--replay', 'x', '--skip-inference'])",
+        1.5, False),
+    "camera_supervisor": (
+        "import camera_supervisor", 1.5, False),
+    "predict_model --help": (
+        "import sys; sys.path.insert(0, 'ml_model'); import predict_model", 1.0, False),
+    "evaluate_model --help": (
+        "import sys; sys.path.insert(0, 'ml_model'); import evaluate_model", 1.0, False),
+    "scan_cameras": (
+        "import scan_cameras", 1.0, False),
+    "server": (
+        "import server", 2.0, False),
+}
+
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def run_probe(code):
+    """
+    Run one probe in a fresh interpreter from the project root.
+
+    Returns:
+        tuple: (wall seconds, report dict) or raises RuntimeError on failure.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code + "\n" + REPORT], cwd=ROOT,
+                          capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else
+                           f"exit code {proc.returncode}")
+    line = next(l for l in proc.stdout.splitlines() if l.startswith("@@STARTUP@@"))
+    return elapsed, json.loads(line[len("@@STARTUP@@"):])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry point startup time")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per probe (median is used)")
+    parser.add_argument("--only", help="Comma-separated probe names")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply all budgets (slow CI machines)")
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+
+    names = [n for n in PROBES if not args.only or n in args.only.split(",")]
+    commit = git_commit()
+    results = {
+        "benchmark": "startup",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "probes": [],
+    }
+
+    failures = 0
+    print(f"{'entry point':<44} {'median s':>9} {'min s':>7} {'budget':>7} "
+          f"{'RSS MB':>7}  TF   result")
+    for name in names:
+        code, budget, tf_allowed = PROBES[name]
+        budget *= args.scale
+        try:
+            runs = [run_probe(code) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{name:<44} ❌ failed: {e}")
+            results["probes"].append({"name": name, "error": str(e)})
+            failures += 1
+            continue
+
+        times = sorted(t for t, _ in runs)
+        median = times[len(times) // 2]
+        report = runs[-1][1]
+        problems = []
+        if median > budget:
+            problems.append("over budget")
+        if report["tensorflow"] and not tf_allowed:
+            problems.append("imports TensorFlow")
+        failures += bool(problems)
+
+        print(f"{name:<44} {median:>9.3f} {times[0]:>7.3f} {budget:>7.2f} "
+              f"{report['peak_rss_mb']:>7.1f}  {'yes' if report['tensorflow'] else 'no ':<4} "
+              f"{'❌ ' + ', '.join(problems) if problems else '✅'}")
+        results["probes"].append({
+            "name": name, "median_s": round(median, 4), "min_s": round(times[0], 4),
+            "budget_s": budget, "tensorflow": report["tensorflow"],
+            "peak_rss_mb": report["peak_rss_mb"], "ok": not problems,
+        })
+
+    output = args.output or os.path.join(RESULTS_DIR, f"startup_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+benchmark_workers.py
+
+Throughput of `server.py --workers N` (server_cluster.py) against one
+server process, and a check that the workers' change feeds agree with
+the database.
+
+For every worker count in --workers, a server is started on a temporary
+SQLite database with --spots spots (--workers 1 is the plain single
+process). --clients load processes, each with --threads connections of
+its own, then run for --duration seconds; every operation is either a
+get_parking_spots read (--read-share) or a camera status update.
+Reported are operations per second, the speedup over the first worker
+count and latency percentiles.
+
+Meanwhile a follower connection reads get_spot_changes from the start
+of the run; after the load it replays those changes on the spot list
+taken at the start and compares the result with the final spot list
+from several connections (spread over the workers). Any difference is
+reported as a feed mismatch and makes the script exit with status 1.
+
+Throughput can only scale with workers while there are free cores for
+them and for the load processes.
+
+Usage:
+    python benchmarks/benchmark_workers.py [--workers 1,2,4] [--spots 1000]
+        [--clients 4] [--threads 8] [--duration 10] [--read-share 0.7]
+        [--output FILE]
+
+Outputs:
+    - benchmarks/results/workers_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert                              # noqa: E402
+from benchmark_server import free_port, git_commit, parse_list  # noqa: E402
+from benchmark_zones import wait_ready                     # noqa: E402
+from pipeline_stats import percentile                      # noqa: E402
+from protocol import connect                               # noqa: E402
+from server import ParkingServer, ParkingSpot              # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+HOST = "127.0.0.1"
+# Connections comparing their final spot list with the replayed feed
+CHECK_CONNECTIONS = 8
+
+
+def start_server(tmp, workers, spots):
+    """Seed a database and start server.py with `workers` processes."""
+    db_url = f"sqlite:///{os.path.join(tmp, f'workers{workers}.db')}"
+    seeder = ParkingServer(db_url=db_url)
+    seeder.init_database()
+    with seeder.SessionLocal() as session:
+        session.execute(insert(ParkingSpot), [{"status": "available"}] * spots)
+        session.commit()
+    seeder.engine.dispose()
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "server.py"), "--host", HOST, "--port", str(port),
+         "--db", db_url, "--max-workers", "64", "--workers", str(workers)],
+        cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready(HOST, port)
+    # With several workers the port answers as soon as the first one listens
+    time.sleep(1.0 if workers > 1 else 0.0)
+    return process, port
+
+# -------------------------------------------------------------------
+# Load processes
+# -------------------------------------------------------------------
+
+def load_thread(port, spots, read_share, stop, seed, samples):
+    rng = random.Random(seed)
+    channel = connect(HOST, port)
+    while not stop.is_set():
+        start = time.perf_counter()
+        if rng.random() < read_share:
+            kind = "read"
+            response = channel.request({"action": "get_parking_spots"})
+        else:
+            kind = "update"
+            response = channel.request({"action": "update_spot_status",
+                                        "spot_id": rng.randint(1, spots),
+                                        "status": rng.choice(("available", "occupied"))})
+        samples.append((kind, time.perf_counter() - start, response.get("status") == "success"))
+    channel.close()
+
+def load_process(port, spots, read_share, threads, duration, seed, results):
+    """One client process with `threads` connections."""
+    logging.getLogger().setLevel(logging.WARNING)
+    stop = threading.Event()
+    samples = []
+    workers = [threading.Thread(target=load_thread, args=(
+        port, spots, read_share, stop, seed + i, samples)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+    results.put(samples)
+
+# -------------------------------------------------------------------
+# Feed check
+# -------------------------------------------------------------------
+
+class Follower(threading.Thread):
+    """Follows get_spot_changes from a spot list taken when it starts."""
+
+    def __init__(self, port):
+        super().__init__(daemon=True)
+        self.channel = connect(HOST, port, timeout=30)
+        first = self.channel.request({"action": "get_parking_spots"})
+        self.seq = first["seq"]
+        self.state = {spot["id"]: spot["status"] for spot in first["spots"]}
+        self.resets = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            response = self.channel.request({"action": "get_spot_changes",
+                                             "since": self.seq, "timeout": 1})
+            if response.get("reset"):
+                self.resets += 1
+                fresh = self.channel.request({"action": "get_parking_spots"})
+                self.seq = fresh["seq"]
+                self.state = {spot["id"]: spot["status"] for spot in fresh["spots"]}
+                continue
+            for change in response["changes"]:
+                self.state[change["spot_id"]] = change["status"]
+            self.seq = response["seq"]
+
+def check_feed(port, follower):
+    """Number of connections whose final spot list differs from the replayed feed."""
+    time.sleep(1.5)        # let the follower catch up
+    follower.stop.set()
+    follower.join()
+    follower.channel.close()
+    mismatches = 0
+    for _ in range(CHECK_CONNECTIONS):
+        channel = connect(HOST, port)
+        spots = channel.request({"action": "get_parking_spots"})["spots"]
+        channel.close()
+        if {spot["id"]: spot["status"] for spot in spots} != follower.state:
+            mismatches += 1
+    return mismatches
+
+def run_scenario(args, workers):
+    with tempfile.TemporaryDirectory(prefix="parkscout-workers-") as tmp:
+        process, port = start_server(tmp, workers, args.spots)
+        try:
+            follower = Follower(port)
+            follower.start()
+            results = mp.Queue()
+            clients = [mp.Process(target=load_process, args=(
+                port, args.spots, args.read_share, args.threads, args.duration,
+                args.seed + 1000 * i, results)) for i in range(args.clients)]
+            for p in clients:
+                p.start()
+            samples = []
+            for _ in clients:
+                samples.extend(results.get())
+            for p in clients:
+                p.join()
+            mismatches = check_feed(port, follower)
+        finally:
+            process.terminate()
+            process.wait()
+
+    result = {"workers": workers, "ops": len(samples),
+              "ops_per_s": round(len(samples) / args.duration, 1),
+              "errors": sum(1 for _, _, ok in samples if not ok),
+              "feed_mismatches": mismatches, "feed_resets": follower.resets, "actions": {}}
+    for kind in ("read", "update"):
+        latencies = sorted(s for k, s, _ in samples if k == kind)
+        result["actions"][kind] = {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure multi-process server throughput")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--spots", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="Connections per load process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--read-share", type=float, default=0.7,
+                        help="Share of get_parking_spots reads (the rest are updates)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "workers",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scenarios": [],
+    }
+
+    print(f"{'workers':>7} {'ops/s':>9} {'speedup':>8} {'errors':>7} {'feed':>5}  "
+          f"per-action p50/p99 ms")
+    baseline = None
+    for workers in parse_list(args.workers, int):
+        s = run_scenario(args, workers)
+        baseline = baseline or s["ops_per_s"]
+        s["speedup"] = round(s["ops_per_s"] / baseline, 2) if baseline else None
+        results["scenarios"].append(s)
+        actions = "  ".join(f"{k}={v['p50_ms']}/{v['p99_ms']}" for k, v in s["actions"].items())
+        print(f"{workers:>7} {s['ops_per_s']:>9.1f} {s['speedup']:>7.2f}x {s['errors']:>7} "
+              f"{'ok' if not s['feed_mismatches'] else 'BAD':>5}  {actions}")
+
+    ok = all(not s["feed_mismatches"] for s in results["scenarios"])
+    results["ok"] = ok
+    output = args.output or os.path.join(RESULTS_DIR, f"workers_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+    if not ok:
+        print("❌ A change feed disagreed with the database")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+benchmark_zones.py
+
+Throughput of zone sharding: the same zones served by one ParkingServer
+process versus spread over several (one process per shard).
+
+For every shard count in --shards, the --zones zones (each with
+--spots spots) are assigned round-robin to that many `server.py`
+processes on temporary SQLite databases, and a zone map like zones.json
+is built for zone_router.ZoneRouter. --clients load processes (so the
+load generator is not limited by one GIL either), each with --threads
+threads, then run for --duration seconds. Every operation picks a zone
+at random and, like the web app, either lists its spots, reports a
+camera status for one of its spots, or searches "available near" it
+(a parallel fan-out over all zones). Operations per second, latency
+percentiles and fan-out latency are reported per shard count.
+
+Capacity can only grow with shards while there are free cores: on a
+machine with fewer cores than server + client processes the numbers
+mostly show the routing overhead.
+
+Usage:
+    python benchmarks/benchmark_zones.py [--shards 1,4] [--zones 8]
+        [--spots 200] [--clients 4] [--threads 8] [--duration 10]
+        [--output FILE]
+
+Outputs:
+    - benchmarks/results/zones_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing as mp
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Allow importing the project modules when run as a script
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import insert                               # noqa: E402
+from benchmark_server import free_port, git_commit, parse_list  # noqa: E402
+from pipeline_stats import percentile                       # noqa: E402
+from server import ParkingServer, ParkingSpot               # noqa: E402
+from zone_router import ZoneRouter                          # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Share of operations; the rest are "available near" fan-outs
+LIST_SHARE   = 0.6
+UPDATE_SHARE = 0.3
+
+
+# -------------------------------------------------------------------
+# Shard servers
+# -------------------------------------------------------------------
+
+def start_shards(tmp, shards, zones, spots):
+    """
+    Seed one database per shard and start a server.py process on each.
+
+    Returns:
+        tuple: (processes, {zone: (host, port)}, {zone: [spot IDs]}).
+    """
+    processes, mapping, spot_ids = [], {}, {}
+    for shard in range(shards):
+        shard_zones = zones[shard::shards]
+        db_url = f"sqlite:///{os.path.join(tmp, f'shard{shard}_of{shards}.db')}"
+        seeder = ParkingServer(db_url=db_url)
+        seeder.init_database()
+        with seeder.SessionLocal() as session:
+            for i, zone in enumerate(shard_zones):
+                session.execute(insert(ParkingSpot), [{"status": "available", "zone": zone}] * spots)
+                spot_ids[zone] = list(range(i * spots + 1, (i + 1) * spots + 1))
+            session.commit()
+        seeder.engine.dispose()
+
+        port = free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py"), "--host", "127.0.0.1",
+             "--port", str(port), "--db", db_url, "--max-workers", "64"],
+            cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for zone in shard_zones:
+            mapping[zone] = ("127.0.0.1", port)
+    for host, port in set(mapping.values()):
+        wait_ready(host, port)
+    return processes, mapping, spot_ids
+
+def wait_ready(host, port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Shard server on port {port} did not start")
+
+# -------------------------------------------------------------------
+# Load processes
+# -------------------------------------------------------------------
+
+def load_thread(router, spot_ids, stop, seed, samples):
+    rng = random.Random(seed)
+    zones = list(spot_ids)
+    while not stop.is_set():
+        zone = rng.choice(zones)
+        roll = rng.random()
+        start = time.perf_counter()
+        if roll < LIST_SHARE:
+            kind = "list"
+            response = router.list_spots([zone])
+        elif roll < LIST_SHARE + UPDATE_SHARE:
+            kind = "update"
+            response = router.request(zone, "update_spot_status", {
+                "spot_id": rng.choice(spot_ids[zone]),
+                "status": rng.choice(("available", "occupied"))})
+        else:
+            kind = "near"
+            response = router.available_near(zone, limit=10)
+        ok = response.get("status") == "success" and not response.get("failed_zones")
+        samples.append((kind, time.perf_counter() - start, ok))
+
+def load_process(mapping, spot_ids, threads, duration, seed, results):
+    """One client process: `threads` threads sharing a ZoneRouter."""
+    logging.getLogger().setLevel(logging.WARNING)
+    router = ZoneRouter(mapping)
+    stop = threading.Event()
+    samples = []
+    workers = [threading.Thread(target=load_thread, args=(router, spot_ids, stop, seed + i, samples))
+               for i in range(threads)]
+    for t in workers:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in workers:
+        t.join()
+    router.close()
+    results.put(samples)
+
+def run_scenario(args, shards):
+    zones = [f"zone{i}" for i in range(args.zones)]
+    with tempfile.TemporaryDirectory(prefix="parkscout-zones-") as tmp:
+        processes, mapping, spot_ids = start_shards(tmp, shards, zones, args.spots)
+        try:
+            results = mp.Queue()
+            clients = [mp.Process(target=load_process, args=(
+                mapping, spot_ids, args.threads, args.duration, args.seed + 1000 * i, results))
+                for i in range(args.clients)]
+            for p in clients:
+                p.start()
+            samples = []
+            for _ in clients:
+                samples.extend(results.get())
+            for p in clients:
+                p.join()
+        finally:
+            for p in processes:
+                p.terminate()
+                p.wait()
+
+    result = {"shards": shards, "zones": args.zones, "ops": len(samples),
+              "ops_per_s": round(len(samples) / args.duration, 1),
+              "errors": sum(1 for _, _, ok in samples if not ok), "actions": {}}
+    for kind in ("list", "update", "near"):
+        latencies = sorted(s for k, s, _ in samples if k == kind)
+        result["actions"][kind] = {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput of zone sharding")
+    parser.add_argument("--shards", default="1,4", help="Comma-separated shard counts")
+    parser.add_argument("--zones", type=int, default=8)
+    parser.add_argument("--spots", type=int, default=200, help="Spots per zone")
+    parser.add_argument("--clients", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--threads", type=int, default=8, help="Threads per load process")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Results JSON path")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    commit = git_commit()
+    results = {
+        "benchmark": "zones",
+        "commit": commit,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scenarios": [],
+    }
+
+    print(f"{'shards':>6} {'zones':>6} {'ops/s':>9} {'errors':>7}  per-action p50/p99 ms")
+    for shards in parse_list(args.shards, int):
+        scenario = run_scenario(args, min(shards, args.zones))
+        results["scenarios"].append(scenario)
+        actions = "  ".join(f"{k}={v['p50_ms']:.2f}/{v['p99_ms']:.2f}"
+                            for k, v in scenario["actions"].items())
+        print(f"{scenario['shards']:>6} {scenario['zones']:>6} {scenario['ops_per_s']:>9.1f} "
+              f"{scenario['errors']:>7}  {actions}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"zones_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
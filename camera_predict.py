@@ -6,277 +6,771 @@ runs a TensorFlow model to classify a parking spot as empty or occupied,
 and updates the central ParkingServer via AES-encrypted socket messages.
 Also saves annotated frames and status JSON files for the Flask UI.
 
+The pipeline runs in three stages so a slow stage never delays another:
+a FrameGrabber thread keeps only the newest camera frame, the main loop
+preprocesses and classifies it at the target rate, and a StatusReporter
+thread performs the server round-trips and file writes for the latest
+result only.
+
 Usage:
-    python camera_predict.py [SPOT_ID] [CAMERA_INDEX] [--headless]
+    python camera_predict.py [SPOT_ID] [CAMERA] [--headless] [--fps N]
+                             [--substream URL] [--size WxH]
+                             [--server HOST:PORT] [--zone ZONE]
+    python camera_predict.py [SPOT_ID] --replay PATH [--fps N] [--no-crop]
+                             [--skip-inference]
 
 Args:
     SPOT_ID (int, optional): ID of the parking spot to monitor (default: 1).
-    CAMERA_INDEX (int, optional): OpenCV camera index (default: SPOT_ID - 1).
+    CAMERA (optional): OpenCV camera index, RTSP/HTTP URL or video file
+        (default: index SPOT_ID - 1).
     --headless: Run without camera; simulate 'available' every 5 seconds.
+    --fps: Classifications per second to aim for (default: 1.0).
+    --substream: Low-resolution stream of the same IP camera, preferred when reachable.
+    --size: Capture resolution to request from a local camera (e.g. 640x480).
+    --server: ParkingServer holding the spot's zone (default: 127.0.0.1:65432).
+    --zone: Zone of the spot (default: 'default'). Spot IDs repeat across
+        zones, so the files below are named by zone and spot.
+    --smoothing: 'ema' (default), 'vote' or 'none'. Scores are smoothed over
+        recent frames with hysteresis, and the status is only sent to the
+        server when it changes or every --keepalive seconds (default 60).
+    --replay: Feed a video file, image folder or glob through the full
+        pipeline instead of a camera (as fast as possible unless --fps is
+        given) and print throughput and end-to-end latency.
+    --no-crop: Replay images that are already cropped to the ROI.
+    --skip-inference: Replay without loading TensorFlow; every frame is
+        reported as 'available' (load-tests capture and the server only).
+
+TensorFlow is imported only when a model is actually needed, so
+--headless and --skip-inference runs start without paying for it.
+
+The ROI is defined for 640x480 frames and scaled to the actual stream size.
 
 Outputs:
-    - static/status_<SPOT_ID>.json      : Latest status JSON for web UI
-    - static/camera_feed_<SPOT_ID>.jpg  : Annotated latest camera frame
+    - static/status_<ZONE>_<SPOT_ID>.json      : Latest status JSON for web UI
+    - static/camera_feed_<ZONE>_<SPOT_ID>.jpg  : Annotated latest camera frame
 """
 
-import tensorflow as tf
-import numpy as np
+import argparse
 import cv2
+import glob
 import socket
 import json
-import sys
 import os
 import time
-from aes_cipher import Cipher
+import queue
+import threading
+from protocol import connect
+from frame_grabber import FrameGrabber, LatestSlot
+from pipeline_stats import PipelineStats
+from camera_source import open_source, parse_size, parse_source
+from preprocessing import DEFAULT_ROI, Preprocessor, scale_roi
+from scan_cameras import INVENTORY_PATH, load_inventory
+from smoothing import DEFAULT_MODE, KEEPALIVE, MODES as SMOOTHING_MODES, StatusSmoother
 
 # -------------------------------------------------------------------
 # Configuration and Globals
 # -------------------------------------------------------------------
 
-# Server connection settings (must match ParkingServer)
+# Server connection settings (must match ParkingServer; --server)
 SERVER_HOST = "127.0.0.1"
 SERVER_PORT = 65432
 
-# AES encryption parameters (must match server)
-AES_KEY = b'ThisIsASecretKey'
-AES_NONCE = b'ThisIsASecretN'
-cipher = Cipher(AES_KEY, AES_NONCE)
+# Zone of the monitored spot (--zone; server.DEFAULT_ZONE by default)
+ZONE = "default"
 
-# Command-line arguments
-SPOT_ID      = int(sys.argv[1]) if len(sys.argv) > 1 else 1
-CAMERA_INDEX = int(sys.argv[2]) if len(sys.argv) > 2 else SPOT_ID - 1
-HEADLESS     = "--headless" in sys.argv
+# Command-line arguments (filled in by parse_args() when run as a script)
+SPOT_ID       = 1
+CAMERA_SOURCE = 0
+HEADLESS      = False
 
 # TensorFlow model path
 MODEL_PATH = 'ml_model/parking_model.h5'
 
-# Region-of-Interest for cropping: (x, y, width, height)
-CROP_X, CROP_Y, CROP_W, CROP_H = 140, 250, 360, 180
+# Region-of-Interest for cropping: (x, y, width, height) on a 640x480 frame
+CROP_X, CROP_Y, CROP_W, CROP_H = DEFAULT_ROI
+
+# Default classification rate (overridable with --fps) and how often
+# pipeline timing statistics are printed and reported to the server
+TARGET_FPS            = 1.0
+STATS_REPORT_INTERVAL = 30.0
+
+# Seconds the loop waits for a fresh frame before warning about the camera
+FRAME_TIMEOUT = 2.0
+
+# Replay: decoded frames read ahead of inference, results queued for the server
+REPLAY_PREFETCH = 8
+REPLAY_QUEUE    = 32
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
 
-# Shared socket for communication with the server
-camera_sock = None
+# Camera inventory written by scan_cameras.py is trusted for this long (seconds)
+INVENTORY_MAX_AGE = 24 * 3600
+
+# Shared connection to the server (protocol.Channel). A Channel is not
+# thread-safe: the StatusReporter thread and the capture loop (stats)
+# both use it, so every request/response exchange holds the lock.
+camera_channel = None
+camera_channel_lock = threading.Lock()
 
 # -------------------------------------------------------------------
 # Initialization
 # -------------------------------------------------------------------
 
+def load_model(path=MODEL_PATH):
+    """
+    Import TensorFlow and load the classifier.
+
+    TensorFlow is imported here rather than at module level so that
+    processes which only capture and report (camera_supervisor.py
+    workers) never load it.
+    """
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
+
 def init_camera_socket():
     """
-    Initialize a persistent AES-encrypted socket connection to the ParkingServer.
-    Reuses the same socket for multiple requests.
+    Initialize a persistent encrypted connection to the ParkingServer.
+    Reuses the same connection for multiple requests.
+    """
+    global camera_channel
+    if camera_channel is None:
+        camera_channel = connect(SERVER_HOST, SERVER_PORT)
+
+def close_camera_socket():
+    """Close the shared server connection, if open."""
+    global camera_channel
+    if camera_channel is not None:
+        camera_channel.close()
+        camera_channel = None
+
+def open_camera(spec, substream=None, size=None):
+    """
+    Open the camera source. Local camera indices consult the cached
+    inventory from scan_cameras.py so startup neither re-probes nor
+    blocks on a device that is known to be missing.
+
+    Args:
+        spec (int or str): Camera index, stream URL or video file.
+        substream (str, optional): Low-resolution stream URL to prefer.
+        size (tuple, optional): (width, height) to request from a local camera.
+
+    Returns:
+        CameraSource or None: The source, or None if the inventory lists
+        the camera as unavailable or a video file does not exist.
     """
-    global camera_sock
-    if camera_sock is None:
-        camera_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        camera_sock.connect((SERVER_HOST, SERVER_PORT))
+    source = parse_source(spec)
+    api = cv2.CAP_ANY
+    if isinstance(source, int):
+        inventory = load_inventory(INVENTORY_PATH, max_age=INVENTORY_MAX_AGE)
+        entry = inventory.get(source) if inventory else None
+        if entry is not None and not entry["available"]:
+            print(f"ℹ️ Camera {source} is listed as unavailable in '{INVENTORY_PATH}' "
+                  f"({entry.get('error')}); run scan_cameras.py to rescan.")
+            return None
+        if entry is not None:
+            # Reopen with the backend that worked during the scan
+            api = entry["api"]
+    # Files are looped so a recorded clip behaves like a live camera
+    try:
+        return open_source(source, substream=substream, size=size, api=api, loop=True)
+    except FileNotFoundError as e:
+        print(e)
+        return None
 
 # -------------------------------------------------------------------
 # Helper Functions
 # -------------------------------------------------------------------
 
-def get_current_status(spot_id):
-    """
-    Query the server for the current status of all spots,
-    then return the status string for the given spot_id.
+def parse_server(text):
+    """Parse 'HOST:PORT' (or just 'PORT') into (host, port)."""
+    host, _, port = text.strip().rpartition(":")
+    try:
+        return host or SERVER_HOST, int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid server address: {text}")
 
-    Args:
-        spot_id (int): ID of the parking spot to query.
+def status_path(spot_id):
+    """Status JSON of a spot for the web UI (app.py /status)."""
+    return f'static/status_{ZONE}_{spot_id}.json'
 
-    Returns:
-        str or None: 'available', 'occupied', 'reserved', or None on error.
+def feed_path(spot_id):
+    """Latest annotated frame of a spot (server.py get_camera_image)."""
+    return f'static/camera_feed_{ZONE}_{spot_id}.jpg'
+
+def _server_request(message):
     """
-    global camera_sock
-    try:
-        init_camera_socket()
-        request = {"action": "get_parking_spots"}
-        payload = json.dumps(request).encode("utf-8")
-        camera_sock.sendall(cipher.aes_encrypt(payload))
-
-        # Read 4-byte length prefix
-        raw_len = camera_sock.recv(4)
-        if len(raw_len) < 4:
-            raise ValueError("Incomplete length prefix")
-        msg_len = int.from_bytes(raw_len, byteorder='big')
-
-        # Now receive the full encrypted response
-        encrypted_resp = b""
-        while len(encrypted_resp) < msg_len:
-            chunk = camera_sock.recv(min(4096, msg_len - len(encrypted_resp)))
-            if not chunk:
-                break
-            encrypted_resp += chunk
+    Send one encrypted request over the shared camera connection and
+    return the decrypted JSON response.
 
-        # Decrypt
-        decrypted_resp = cipher.aes_decrypt(encrypted_resp)
+    Args:
+        message (dict): Request payload including the 'action' key.
 
-        data = json.loads(decrypted_resp)
+    Returns:
+        dict: Parsed server response.
 
-        for spot in data.get("spots", []):
-            if spot["id"] == spot_id:
-                return spot["status"]
-    except Exception:
-        # Reset socket on any failure to force reconnection next call
+    Raises:
+        Exception: On any socket, framing or decryption error. The shared
+            connection is reset so the next call reconnects.
+    """
+    with camera_channel_lock:
         try:
-            camera_sock.close()
-        except:
-            pass
-        camera_sock = None
-    return None
-
-def send_status_to_server(spot_id, status):
+            init_camera_socket()
+            return camera_channel.request(message)
+        except Exception:
+            # Reset the connection on any failure to force reconnection next call
+            close_camera_socket()
+            raise
+
+def send_status_to_server(spot_id, status, quiet=False, confidence=None, preserve_reserved=False):
     """
     Send an update to the server with this spot's new status.
 
     Args:
         spot_id (int): ID of the parking spot being updated.
         status (str): New status ('available', 'occupied', 'reserved').
+        quiet (bool): Only print failures (used by replay runs).
+        confidence (float, optional): Smoothed confidence of the status.
+        preserve_reserved (bool): Let the server keep a reservation when
+            the camera reports 'available' (checked atomically server-side).
+
+    Returns:
+        str or None: Status stored on the server after the update, or
+        None if the server could not be reached.
     """
-    global camera_sock
+    message = {
+        "action":  "update_spot_status",
+        "spot_id": spot_id,
+        "status":  status
+    }
+    if confidence is not None:
+        message["confidence"] = confidence
+    if preserve_reserved:
+        message["preserve_reserved"] = True
     try:
-        init_camera_socket()
-        message = {
-            "action":  "update_spot_status",
-            "spot_id": spot_id,
-            "status":  status
-        }
-        payload = json.dumps(message).encode("utf-8")
-        camera_sock.sendall(cipher.aes_encrypt(payload))
-
-        # Read 4-byte length prefix
-        raw_len = camera_sock.recv(4)
-        if len(raw_len) < 4:
-            raise ValueError("Incomplete length prefix")
-        msg_len = int.from_bytes(raw_len, byteorder='big')
-
-        # Now receive the full encrypted response
-        encrypted_resp = b""
-        while len(encrypted_resp) < msg_len:
-            chunk = camera_sock.recv(min(4096, msg_len - len(encrypted_resp)))
-            if not chunk:
-                break
-            encrypted_resp += chunk
+        response = _server_request(message)
+        if not quiet:
+            print(f"🔁 Server response: {response}")
+        return response.get("spot_status", status) if response.get("status") == "success" else None
+    except Exception as e:
+        print(f"⚠️ Failed to contact server: {e}")
+        return None
 
-        # Decrypt
-        decrypted_resp = cipher.aes_decrypt(encrypted_resp)
+def report_stats_to_server(spot_id, snapshot):
+    """
+    Publish this camera host's pipeline statistics to the server so that
+    saturated camera hosts can be spotted centrally.
 
-        response = json.loads(decrypted_resp)
-        print(f"🔁 Server response: {response}")
+    Args:
+        spot_id (int): ID of the parking spot this pipeline monitors.
+        snapshot (dict): Result of PipelineStats.snapshot().
+    """
+    try:
+        _server_request({
+            "action":  "report_camera_stats",
+            "spot_id": spot_id,
+            "host":    socket.gethostname(),
+            "camera":  CAMERA_SOURCE,
+            "stats":   snapshot
+        })
     except Exception as e:
-        print(f"⚠️ Failed to contact server: {e}")
-        # Reset socket to reconnect on next attempt
-        try:
-            camera_sock.close()
-        except:
-            pass
-        camera_sock = None
+        print(f"⚠️ Failed to report stats: {e}")
 
-def save_status_locally(spot_id, status):
+def save_status_locally(spot_id, status, confidence=None):
     """
     Persist the latest status to a JSON file under 'static/' for the web UI.
 
     Args:
         spot_id (int): Parking spot ID.
         status (str): Current status.
+        confidence (float, optional): Smoothed confidence of the status.
     """
     os.makedirs('static', exist_ok=True)
-    status_data = {"spot_id": spot_id, "status": status}
-    with open(f'static/status_{spot_id}.json', 'w') as f:
+    status_data = {"spot_id": spot_id, "status": status, "confidence": confidence}
+    with open(status_path(spot_id), 'w') as f:
         json.dump(status_data, f)
 
+def resolve_status(predicted, current):
+    """
+    Combine the model prediction with the server's current status:
+    'reserved' is preserved unless a car is detected.
+
+    Args:
+        predicted (str): 'available' or 'occupied' from the model.
+        current (str or None): Status currently stored on the server.
+
+    Returns:
+        str: Status to publish.
+    """
+    if current == "reserved":
+        return "reserved" if predicted == "available" else "occupied"
+    return predicted
+
+def annotate_frame(frame, status, roi=None, confidence=None):
+    """
+    Draw the status label above the ROI and a coloured box around it.
+
+    Args:
+        frame (np.ndarray): BGR frame, modified in place.
+        status (str): 'available', 'occupied' or 'reserved'.
+        roi (tuple, optional): (x, y, width, height); defaults to the CROP_* box.
+        confidence (float, optional): Appended to the label as a percentage.
+    """
+    x, y, w, h = roi or (CROP_X, CROP_Y, CROP_W, CROP_H)
+    # Choose label text and box color
+    if status == "reserved":
+        label = "🅿️ RESERVED";  color = (160, 32, 240)
+    elif status == "occupied":
+        label = "🚗 OCCUPIED";   color = (0, 0, 255)
+    else:
+        label = "🅿️ EMPTY";      color = (0, 255, 0)
+    if confidence is not None:
+        label += f" {confidence:.0%}"
+
+    cv2.putText(frame, label,
+                (x, y - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1, color, 2)
+    cv2.rectangle(frame,
+                  (x, y),
+                  (x + w, y + h),
+                  color, 2)
+
 # -------------------------------------------------------------------
-# Main Loop
+# Reporting Stage
 # -------------------------------------------------------------------
 
-def main():
+class StatusReporter:
     """
-    Load the model, open the camera (unless headless), and enter the
-    continuous loop to predict status, annotate frames, and update server/UI.
+    Background stage that publishes classification results.
+
+    The server round-trips and the JPEG write run here instead of in the
+    inference loop. Only the newest result is kept: if the server is
+    slower than the camera loop, intermediate results are skipped rather
+    than queued, so the published status is never behind reality.
+    Replay runs use lossless mode instead, where every result is
+    published and submit() blocks once REPLAY_QUEUE results are pending.
+
+    Results submitted with publish=False (unchanged smoothed status) only
+    refresh the camera feed image; a pending publish is never lost when
+    a newer result replaces it.
+
+    When submit() is given the frame's capture time, the time until the
+    server acknowledged the update is recorded as the 'end_to_end' stage.
+
+    Attributes:
+        spot_id (int): Parking spot this reporter publishes for.
+        current_status (str or None): Last status stored on the server,
+            used by the inference loop to label the live preview.
+        skipped (int): Results replaced before they could be published.
+        published (int): Results sent to the server.
     """
-    # Load the trained TensorFlow model
-    model = tf.keras.models.load_model(MODEL_PATH)
-
-    # Initialize OpenCV video capture if not headless
-    cap = None
-    if not HEADLESS:
-        cap = cv2.VideoCapture(CAMERA_INDEX)
-        if not cap.isOpened():
-            print(f"❌ Camera {CAMERA_INDEX} not found. Marking Spot {SPOT_ID} as occupied.")
-            send_status_to_server(SPOT_ID, "occupied")
-            save_status_locally(SPOT_ID, "occupied")
+
+    def __init__(self, spot_id, stats=None, lossless=False):
+        """
+        Args:
+            spot_id (int): Parking spot ID.
+            stats (PipelineStats, optional): Receives server/imwrite timings.
+            lossless (bool): Publish every result instead of only the newest.
+        """
+        self.spot_id = spot_id
+        self.stats = stats or PipelineStats()
+        self.lossless = lossless
+        self.current_status = None
+        self.skipped = 0
+        self.published = 0
+        self._slot = LatestSlot()
+        self._queue = queue.Queue(maxsize=REPLAY_QUEUE) if lossless else None
+        self._thread = threading.Thread(target=self._run, name="status-reporter", daemon=True)
+
+    def start(self):
+        """Start the reporting thread and return self for chaining."""
+        self._thread.start()
+        return self
+
+    def submit(self, frame, predicted, captured_at=None, confidence=None, publish=True):
+        """
+        Hand over an annotated frame and the (smoothed) prediction.
+
+        The frame must not be modified by the caller afterwards.
+
+        Args:
+            frame (np.ndarray): Annotated BGR frame.
+            predicted (str): 'available' or 'occupied'.
+            captured_at (float, optional): time.monotonic() of the capture.
+            confidence (float, optional): Confidence reported with the status.
+            publish (bool): Send the status to the server; False only
+                refreshes the camera feed image.
+        """
+        item = (frame, predicted, captured_at, confidence, publish)
+        if self._queue is not None:
+            self._queue.put(item)
+        elif self._slot.put(item, merge=_keep_publish):
+            self.skipped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get() if self._queue is not None else self._slot.get()
+            if item is None:
+                break
+            frame, predicted, captured_at, confidence, publish = item
+
+            with self.stats.stage("imwrite"):
+                os.makedirs('static', exist_ok=True)
+                cv2.imwrite(feed_path(self.spot_id), frame)
+            if not publish:
+                continue
+
+            # The server keeps a reservation unless a car is detected, in the
+            # same conditional UPDATE, and answers with the stored status
+            with self.stats.stage("server_write"):
+                stored = send_status_to_server(self.spot_id, predicted, quiet=self.lossless,
+                                               confidence=confidence, preserve_reserved=True)
+            status = stored or predicted
+            self.current_status = stored
+            save_status_locally(self.spot_id, status, confidence)
+            self.published += 1
+            if captured_at is not None:
+                self.stats.record("end_to_end", time.monotonic() - captured_at)
+
+    def stop(self, timeout=5.0):
+        """
+        Stop the thread after the result in flight (lossless: after all
+        queued results) has been published.
+
+        Args:
+            timeout (float or None): Seconds to wait; None waits until done.
+        """
+        if self._queue is not None:
+            self._queue.put(None)
+        else:
+            self._slot.close()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+def _keep_publish(old, new):
+    """LatestSlot merge: a replaced result that had to be published passes that on."""
+    if old[4] and not new[4]:
+        return new[:4] + (True,)
+    return new
+
+# -------------------------------------------------------------------
+# Replay Mode
+# -------------------------------------------------------------------
+
+def list_replay_images(path):
+    """
+    Resolve a replay path that refers to still images.
+
+    Args:
+        path (str): Image file, directory (searched recursively) or glob pattern.
+
+    Returns:
+        list[str] or None: Sorted image paths, or None if `path` is a video file.
+    """
+    if os.path.isdir(path):
+        files = [os.path.join(root, name)
+                 for root, _, names in os.walk(path) for name in names]
+    elif glob.has_magic(path):
+        files = glob.glob(path, recursive=True)
+    elif path.lower().endswith(IMAGE_EXTENSIONS):
+        files = [path]
+    else:
+        return None
+    return sorted(f for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+
+def iter_replay_frames(path):
+    """
+    Yield (name, frame) for every frame of a recording.
+
+    Frames are decoded by a background thread up to REPLAY_PREFETCH frames
+    ahead, so decoding overlaps with inference.
+
+    Args:
+        path (str): Video file, image directory or glob pattern.
+    """
+    images = list_replay_images(path)
+    if images is None and not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Replay source not found: {path}")
+    if images == []:
+        raise FileNotFoundError(f"❌ No images found for replay in: {path}")
+
+    frames = queue.Queue(maxsize=REPLAY_PREFETCH)
+    done = object()
+
+    def decode():
+        try:
+            if images is not None:
+                for name in images:
+                    frame = cv2.imread(name)
+                    if frame is None:
+                        print(f"⚠️ Skipping unreadable image {name}")
+                        continue
+                    frames.put((name, frame))
+            else:
+                video = open_source(path, realtime=False)
+                index = 0
+                while True:
+                    ret, frame = video.read()
+                    if not ret:
+                        break
+                    frames.put((f"{path}#{index}", frame))
+                    index += 1
+                video.release()
+        finally:
+            frames.put(done)
+
+    threading.Thread(target=decode, name="replay-decoder", daemon=True).start()
+    while True:
+        item = frames.get()
+        if item is done:
             return
+        yield item
+
+def run_replay(model, path, fps=None, crop=True, smoothing=DEFAULT_MODE):
+    """
+    Feed a recording through the real crop -> infer -> report pipeline
+    and print throughput and latency.
 
-    print(f"▶️ Starting camera_predict for Spot {SPOT_ID} "
-          f"(Camera {CAMERA_INDEX}, Headless={HEADLESS})")
+    Every frame is classified and every result is published to the server
+    (the reporter runs in lossless mode), so the run exercises the model
+    and the ParkingServer exactly like a camera would, only faster.
 
+    Args:
+        model: Loaded Keras model, or None to skip inference and report
+            every frame as 'available'.
+        path (str): Video file, image directory or glob pattern.
+        fps (float, optional): Fixed frame rate; None replays as fast as possible.
+        crop (bool): Crop the ROI first; disable for pre-cropped images
+            such as cropped_dataset/.
+        smoothing (str): StatusSmoother mode applied to the scores.
+
+    Returns:
+        dict: Final PipelineStats snapshot plus 'elapsed_s' and 'published'.
+    """
+    preprocessor = Preprocessor(roi=(CROP_X, CROP_Y, CROP_W, CROP_H) if crop else None)
+    stats = PipelineStats(target_fps=fps, report_interval=STATS_REPORT_INTERVAL)
+    reporter = StatusReporter(SPOT_ID, stats, lossless=True).start()
+    smoother = StatusSmoother(smoothing)
+
+    print(f"⏩ Replaying '{path}' for Spot {SPOT_ID} "
+          f"at {f'{fps} fps' if fps else 'full speed'} (crop={crop})")
+    start = time.monotonic()
+    next_tick = start
+    frame_size = None
+    try:
+        for name, frame in iter_replay_frames(path):
+            # Latency is measured from the moment the frame is available
+            captured_at = time.monotonic()
+            if crop and frame.shape[1::-1] != frame_size:
+                frame_size = frame.shape[1::-1]
+                preprocessor.roi = scale_roi((CROP_X, CROP_Y, CROP_W, CROP_H), frame_size)
+
+            with stats.stage("preprocess"):
+                input_img = preprocessor.prepare_one(frame)
+            if model is None:
+                score = 0.0
+            else:
+                with stats.stage("inference"):
+                    score = model.predict_on_batch(input_img)[0][0]
+            predicted, confidence, _ = smoother.update(score)
+
+            annotate_frame(frame, resolve_status(predicted, reporter.current_status),
+                           preprocessor.roi or (0, 0, frame.shape[1], frame.shape[0]),
+                           confidence)
+            # Every frame is published: replay is a load test for the server
+            reporter.submit(frame, predicted, captured_at, confidence)
+            stats.frame_done()
+
+            if stats.report_due():
+                print(f"📊 Replay | {stats.format_compact()}")
+
+            if fps:
+                next_tick += 1.0 / fps
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    finally:
+        # Wait until every queued result reached the server
+        reporter.stop(timeout=None)
+
+    elapsed = time.monotonic() - start
+    snapshot = stats.snapshot()
+    frames = snapshot["frames"]
+    e2e = snapshot["stages"].get("end_to_end", {})
+    print(f"✅ Replay finished: {frames} frames in {elapsed:.2f}s "
+          f"({frames / elapsed if elapsed > 0 else 0.0:.1f} fps overall), "
+          f"{reporter.published} results published, {smoother.changes} status changes")
+    if e2e:
+        print(f"⏱️ End-to-end latency p50 {e2e['p50_ms']:.1f}ms | p90 {e2e['p90_ms']:.1f}ms "
+              f"| p99 {e2e['p99_ms']:.1f}ms | max {e2e['max_ms']:.1f}ms")
+    print(f"📊 Replay | {stats.format_compact(snapshot)}")
+    report_stats_to_server(SPOT_ID, snapshot)
+    return dict(snapshot, elapsed_s=round(elapsed, 3), published=reporter.published)
+
+# -------------------------------------------------------------------
+# Main Loop
+# -------------------------------------------------------------------
+
+def parse_args(argv=None):
+    """Parse the command line (see module docstring)."""
+    parser = argparse.ArgumentParser(description="Classify a parking spot from a camera feed")
+    parser.add_argument('spot_id', nargs='?', type=int, default=1)
+    parser.add_argument('camera', nargs='?',
+                        help="Camera index, RTSP/HTTP URL or video file (default: SPOT_ID - 1)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Run without camera and report 'available' every 5 seconds")
+    parser.add_argument('--fps', type=float,
+                        help=f"Classifications per second (default: {TARGET_FPS}; "
+                             "replay: as fast as possible)")
+    parser.add_argument('--substream', help="Low-resolution stream URL of the same camera")
+    parser.add_argument('--size', type=parse_size,
+                        help="Capture resolution WIDTHxHEIGHT for local cameras")
+    parser.add_argument('--server', type=parse_server, default=(SERVER_HOST, SERVER_PORT),
+                        metavar='HOST:PORT', help="Server of the spot's zone")
+    parser.add_argument('--zone', default=ZONE, help="Zone of the spot (default: default)")
+    parser.add_argument('--smoothing', choices=SMOOTHING_MODES, default=DEFAULT_MODE,
+                        help="Temporal smoothing of the scores (default: ema)")
+    parser.add_argument('--keepalive', type=float, default=KEEPALIVE,
+                        help=f"Seconds between publishes of an unchanged status "
+                             f"(default: {KEEPALIVE:.0f})")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="Replay a video file, image folder or glob through the pipeline")
+    parser.add_argument('--no-crop', action='store_true',
+                        help="Replay: images are already cropped to the ROI")
+    parser.add_argument('--skip-inference', action='store_true',
+                        help="Replay without the model (no TensorFlow import)")
+    args = parser.parse_args(argv)
+    if args.camera is None:
+        args.camera = args.spot_id - 1
+    args.camera = parse_source(str(args.camera))
+    if args.fps is not None and args.fps <= 0:
+        parser.error("--fps must be positive")
+    if args.skip_inference and not args.replay:
+        parser.error("--skip-inference is only supported with --replay")
+    if args.fps is None and not args.replay:
+        args.fps = TARGET_FPS
+    return args
+
+def run_headless():
+    """Simulate an 'available' spot every 5 seconds without camera or model."""
+    while True:
+        simulated = "available"
+        send_status_to_server(SPOT_ID, simulated)
+        save_status_locally(SPOT_ID, simulated)
+        print(f"✅ Headless: Spot {SPOT_ID} -> {simulated}")
+        time.sleep(5)
+
+def main(argv=None):
+    """
+    Load the model, open the camera (unless headless), and run the
+    capture / inference / reporting pipeline at the target rate.
+    """
+    global SPOT_ID, CAMERA_SOURCE, HEADLESS, TARGET_FPS, SERVER_HOST, SERVER_PORT, ZONE
+    args = parse_args(argv)
+    SPOT_ID, CAMERA_SOURCE, HEADLESS, TARGET_FPS = (
+        args.spot_id, args.camera, args.headless, args.fps)
+    (SERVER_HOST, SERVER_PORT), ZONE = args.server, args.zone
+
+    print(f"▶️ Starting camera_predict for Spot {SPOT_ID} in zone {ZONE} "
+          f"(Camera {CAMERA_SOURCE}, Headless={HEADLESS}, Target={TARGET_FPS or 'max'} fps)")
+    if HEADLESS:
+        run_headless()
+        return
+
+    if args.replay:
+        model = None if args.skip_inference else load_model()
+        run_replay(model, args.replay, args.fps, crop=not args.no_crop,
+                   smoothing=args.smoothing)
+        return
+
+    # Load the trained TensorFlow model
+    model = load_model()
+
+    # Initialize OpenCV video capture
+    cap = open_camera(CAMERA_SOURCE, args.substream, args.size)
+    if cap is None or (not cap.isOpened() and not cap.is_network):
+        print(f"❌ Camera {CAMERA_SOURCE} not found. Marking Spot {SPOT_ID} as occupied.")
+        send_status_to_server(SPOT_ID, "occupied")
+        save_status_locally(SPOT_ID, "occupied")
+        return
+    # Network cameras that are down at startup are retried by the grabber
+    print(f"📷 Camera source: {cap.describe()}")
+
+    # Reusable float32 input buffer for the model (no per-frame allocations)
+    preprocessor = Preprocessor(roi=(CROP_X, CROP_Y, CROP_W, CROP_H))
+    frame_size = None
+    stats = PipelineStats(target_fps=TARGET_FPS,
+                          report_interval=STATS_REPORT_INTERVAL)
+
+    # Capture and reporting run in their own threads; this loop only classifies
+    grabber = FrameGrabber(cap, stats, name=f"grabber-{SPOT_ID}").start()
+    reporter = StatusReporter(SPOT_ID, stats).start()
+    smoother = StatusSmoother(args.smoothing, keepalive=args.keepalive)
+
+    period = 1.0 / TARGET_FPS
+    next_tick = time.monotonic()
     try:
         while True:
-            if HEADLESS:
-                # Simulate available status in headless mode every 5 seconds
-                simulated = "available"
-                send_status_to_server(SPOT_ID, simulated)
-                save_status_locally(SPOT_ID, simulated)
-                print(f"✅ Headless: Spot {SPOT_ID} -> {simulated}")
-                time.sleep(5)
+            # Newest frame only; older ones were dropped by the grabber
+            frame, captured_at = grabber.read(timeout=FRAME_TIMEOUT)
+            if frame is None:
+                print(f"⚠️ No frame from camera {CAMERA_SOURCE} for Spot {SPOT_ID} "
+                      f"in {FRAME_TIMEOUT:.0f}s ({grabber.failures} failed reads). Waiting...")
                 continue
 
-            # Capture a frame
-            ret, frame = cap.read()
-            if not ret:
-                print(f"⚠️ Failed to grab frame for Spot {SPOT_ID}. Retrying...")
-                time.sleep(1)
-                continue
+            # Follow the stream resolution (sub-stream, reconnect to another stream)
+            if frame.shape[1::-1] != frame_size:
+                frame_size = frame.shape[1::-1]
+                preprocessor.roi = scale_roi((CROP_X, CROP_Y, CROP_W, CROP_H), frame_size)
+                print(f"📐 Frames are {frame_size[0]}x{frame_size[1]}, ROI {preprocessor.roi}")
 
             # Crop ROI and preprocess for model
-            roi = frame[CROP_Y:CROP_Y + CROP_H, CROP_X:CROP_X + CROP_W]
-            resized = cv2.resize(roi, (360, 102)) / 255.0
-            input_img = np.expand_dims(resized, axis=0)
+            with stats.stage("preprocess"):
+                input_img = preprocessor.prepare_one(frame)
 
             # Predict occupancy (model outputs a single sigmoid score)
-            score = model.predict(input_img, verbose=0)[0][0]
-            predicted = "available" if score < 0.5 else "occupied"
-
-            # Preserve 'reserved' state unless a car is detected
-            current = get_current_status(SPOT_ID)
-            if current == "reserved":
-                status = "reserved" if predicted == "available" else "occupied"
-            else:
-                status = predicted
-
-            # Choose label text and box color
-            if status == "reserved":
-                label = "🅿️ RESERVED";  color = (160, 32, 240)
-            elif status == "occupied":
-                label = "🚗 OCCUPIED";   color = (0, 0, 255)
-            else:
-                label = "🅿️ EMPTY";      color = (0, 255, 0)
-
-            # Annotate frame: label above ROI and colored rectangle
-            cv2.putText(frame, label,
-                        (CROP_X, CROP_Y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1, color, 2)
-            cv2.rectangle(frame,
-                          (CROP_X, CROP_Y),
-                          (CROP_X + CROP_W, CROP_Y + CROP_H),
-                          color, 2)
-
-            # Ensure UI folder and save annotated frame + update server/UI
-            os.makedirs('static', exist_ok=True)
-            cv2.imwrite(f'static/camera_feed_{SPOT_ID}.jpg', frame)
-
-            send_status_to_server(SPOT_ID, status)
-            save_status_locally(SPOT_ID, status)
-
-            # Display live window; press 'q' to quit
+            with stats.stage("inference"):
+                score = model.predict_on_batch(input_img)[0][0]
+
+            # Smooth over recent frames; publish only changes and keepalives
+            predicted, confidence, changed = smoother.update(score)
+            publish = smoother.should_publish(changed)
+            if changed:
+                print(f"🔄 Spot {SPOT_ID} -> {predicted} (confidence {confidence:.2f})")
+
+            # Label the preview with the last known server status; the
+            # reporter re-checks it before publishing
+            annotate_frame(frame, resolve_status(predicted, reporter.current_status),
+                           preprocessor.roi, confidence)
+            reporter.submit(frame, predicted, captured_at, confidence, publish)
+
+            # Age of the frame when its result was handed to the reporter
+            stats.record("frame_age", time.monotonic() - captured_at)
+            stats.frame_done()
+
+            # Periodically print and publish a compact timing report
+            if stats.report_due():
+                snapshot = stats.snapshot()
+                print(f"📊 Spot {SPOT_ID} | {stats.format_compact(snapshot)} "
+                      f"| published {reporter.published} | unpublished {reporter.skipped}")
+                report_stats_to_server(SPOT_ID, snapshot)
+
+            # Display live window; wait out the rest of the period, press 'q' to quit
             cv2.imshow(f"Spot {SPOT_ID}", frame)
-            if cv2.waitKey(1000) & 0xFF == ord('q'):
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Running behind: restart the schedule instead of bursting
+                next_tick = time.monotonic()
+                delay = 0
+            if cv2.waitKey(max(1, int(delay * 1000))) & 0xFF == ord('q'):
                 print("🛑 Quitting camera loop.")
                 break
 
     finally:
         # Clean up resources
-        if cap:
-            cap.release()
+        grabber.stop()
+        reporter.stop()
+        cap.release()
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
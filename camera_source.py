@@ -0,0 +1,298 @@
+"""
+camera_source.py
+
+Uniform frame source for local cameras, IP cameras and video files.
+
+A source is described by a single string as given on the command line:
+    "0", "1", ...                   : Local camera index
+    "rtsp://...", "http(s)://..."   : Network stream (RTSP, MJPEG over HTTP, HLS)
+    "path/to/video.mp4"             : Video file, for local testing and replay
+
+CameraSource wraps cv2.VideoCapture with the settings a long-running
+classifier wants: a one-frame driver buffer so reads return current
+frames, hardware-accelerated decoding where the backend supports it,
+open/read timeouts, an optional low-resolution sub-stream (most IP
+cameras publish one next to the main stream) or a requested capture
+size for local cameras, and automatic reconnection with exponential
+backoff when a stream drops.
+
+A network stream is decoded at the resolution the camera encodes it
+with: OpenCV cannot ask an RTSP/HTTP source for fewer pixels, and the
+H.264/H.265 decoders have no reduced-resolution mode. The sub-stream is
+the way to avoid decoding a 4K main stream for a small ROI.
+
+Classes:
+    CameraSource: cv2.VideoCapture-compatible reader (read/isOpened/release).
+
+Functions:
+    open_source: Open a CameraSource, failing early for missing files.
+"""
+
+import os
+import time
+
+import cv2
+
+# URL schemes handled as network streams
+NETWORK_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+# Frames buffered by the driver; 1 keeps reads close to real time
+BUFFER_SIZE = 1
+
+# Open and read timeouts for network streams (milliseconds)
+OPEN_TIMEOUT_MS = 5000
+READ_TIMEOUT_MS = 5000
+
+# Reconnect delays (seconds): doubled after every failed attempt up to the maximum
+RECONNECT_INITIAL = 0.5
+RECONNECT_MAX     = 30.0
+
+def parse_source(spec):
+    """
+    Turn a command-line source string into what cv2.VideoCapture expects.
+
+    Args:
+        spec (str or int): Camera index, URL or file path.
+
+    Returns:
+        int or str: Integer index for digit-only strings, the string otherwise.
+    """
+    if isinstance(spec, int):
+        return spec
+    spec = spec.strip()
+    return int(spec) if spec.isdigit() else spec
+
+def is_network_source(source):
+    """Return True for RTSP/HTTP/... URLs."""
+    return isinstance(source, str) and source.lower().startswith(NETWORK_SCHEMES)
+
+def parse_size(text):
+    """Parse 'WIDTHxHEIGHT' (e.g. '640x480') into a (width, height) tuple."""
+    width, _, height = text.lower().partition('x')
+    return int(width), int(height)
+
+class CameraSource:
+    """
+    Frame source with bounded buffering and reconnect-with-backoff.
+
+    Drop-in replacement for cv2.VideoCapture in the capture loops:
+    read() returns (ret, frame), and a lost network stream is reopened
+    transparently, with growing delays between attempts so a camera
+    that is down is not hammered.
+
+    Attributes:
+        source (int or str): Parsed main source.
+        substream (str or None): Lower-resolution stream URL tried first.
+        size (tuple or None): Requested (width, height) for local cameras.
+        is_network (bool): True for URL sources.
+        is_file (bool): True for video files.
+        realtime (bool): Pace video files at their native frame rate.
+        loop (bool): Restart video files when they end.
+        ended (bool): A (non-looping) file has been read completely.
+        reconnects (int): Successful reopenings after a lost stream.
+    """
+
+    def __init__(self, source, substream=None, size=None, api=cv2.CAP_ANY,
+                 hw_accel=True, realtime=True, loop=False):
+        """
+        Open the source.
+
+        Args:
+            source (int or str): Camera index, URL or video file (see parse_source()).
+            substream (str, optional): Sub-stream URL of the same camera, used
+                in preference to `source` when it can be opened.
+            size (tuple, optional): (width, height) to request from local cameras
+                (network streams keep their encoded size, see the module docstring).
+            api (int): cv2.CAP_* backend for local cameras (e.g. from the inventory).
+            hw_accel (bool): Ask the backend for hardware-accelerated decoding.
+            realtime (bool): Deliver file frames no faster than their frame rate.
+            loop (bool): Rewind files at the end instead of reporting failure.
+        """
+        self.source = parse_source(source)
+        self.substream = substream
+        self.size = size
+        self.api = api
+        self.hw_accel = hw_accel
+        self.is_network = is_network_source(self.source)
+        self.is_file = isinstance(self.source, str) and not self.is_network
+        self.realtime = realtime
+        self.loop = loop
+        self.ended = False
+        self.reconnects = 0
+
+        self._size_warned = False
+        self._cap = None
+        self._active = None
+        self._backoff = RECONNECT_INITIAL
+        self._frame_interval = 0.0
+        self._next_frame = 0.0
+        self.open()
+
+    # ---------------------------------------------------------------
+    # Opening
+    # ---------------------------------------------------------------
+
+    def _open_params(self):
+        """Capture properties passed at open time (OpenCV >= 4.5.2)."""
+        params = []
+        if self.hw_accel and hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        if self.is_network and hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            params += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT_MS,
+                       cv2.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT_MS]
+        return params
+
+    def _create(self, target):
+        if isinstance(target, int):
+            cap = cv2.VideoCapture(target, self.api)
+        else:
+            # FFmpeg handles RTSP/HTTP streams and files and honours the open params
+            params = self._open_params()
+            try:
+                cap = cv2.VideoCapture(target, cv2.CAP_FFMPEG, params)
+            except (cv2.error, TypeError):
+                cap = cv2.VideoCapture(target)
+            if not cap.isOpened():
+                cap = cv2.VideoCapture(target)
+        if not cap.isOpened():
+            cap.release()
+            return None
+
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, BUFFER_SIZE)
+        if isinstance(target, int) and self.size:
+            # Ask the camera itself for fewer pixels instead of resizing afterwards
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.size[0])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.size[1])
+        return cap
+
+    def open(self):
+        """
+        (Re)open the sub-stream if configured, else the main source.
+
+        Returns:
+            bool: True if a stream is open.
+        """
+        self.release()
+        for target in (self.substream, self.source):
+            if target is None:
+                continue
+            self._cap = self._create(target)
+            if self._cap is not None:
+                self._active = target
+                fps = self._cap.get(cv2.CAP_PROP_FPS)
+                self._frame_interval = 1.0 / fps if self.is_file and fps > 0 else 0.0
+                self._next_frame = time.monotonic()
+                if self.is_network and target == self.source:
+                    self._warn_full_size()
+                return True
+        return False
+
+    def _warn_full_size(self):
+        """Tell once that a network main stream is decoded at full size."""
+        if self._size_warned:
+            return
+        self._size_warned = True
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        reason = "its sub-stream is unreachable" if self.substream else "no sub-stream is configured"
+        print(f"ℹ️ {self.source} is decoded at its full {width}x{height} ({reason}): a "
+              f"network stream cannot be asked for a smaller size, only its "
+              f"sub-stream (--substream) decodes fewer pixels.")
+
+    def isOpened(self):
+        """Mirror cv2.VideoCapture.isOpened()."""
+        return self._cap is not None and self._cap.isOpened()
+
+    def describe(self):
+        """Return a short human-readable description of the active stream."""
+        if not self.isOpened():
+            return f"{self.source} (disconnected)"
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        try:
+            backend = self._cap.getBackendName()
+        except cv2.error:
+            backend = "UNKNOWN"
+        stream = "substream" if self._active == self.substream else "main"
+        return f"{self._active} [{stream}, {width}x{height}, {backend}]"
+
+    # ---------------------------------------------------------------
+    # Reading
+    # ---------------------------------------------------------------
+
+    def _reconnect(self):
+        """Wait out the current backoff delay and try to reopen once."""
+        time.sleep(self._backoff)
+        if self.open():
+            self.reconnects += 1
+            self._backoff = RECONNECT_INITIAL
+            print(f"🔌 Reconnected to {self.describe()}")
+            return True
+        self._backoff = min(self._backoff * 2, RECONNECT_MAX)
+        print(f"⚠️ Camera {self.source} unreachable, next attempt in {self._backoff:.1f}s")
+        return False
+
+    def read(self):
+        """
+        Read the next frame.
+
+        Network streams and local cameras are reopened with backoff when
+        they fail; files are rewound when looping or flagged as ended.
+
+        Returns:
+            tuple: (ret, frame) like cv2.VideoCapture.read().
+        """
+        if self.ended:
+            return False, None
+        if not self.isOpened() and not self._reconnect():
+            return False, None
+
+        if self._frame_interval and self.realtime:
+            delay = self._next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame = max(self._next_frame + self._frame_interval, time.monotonic())
+
+        ret, frame = self._cap.read()
+        if ret:
+            return ret, frame
+
+        if self.is_file:
+            if self.loop and self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                return self._cap.read()
+            self.ended = True
+            return False, None
+
+        # Stream dropped: release now, reconnect on the next read
+        print(f"⚠️ Lost camera {self.source}; reconnecting...")
+        self.release()
+        return False, None
+
+    def release(self):
+        """Release the underlying capture."""
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+    def get(self, prop):
+        """Mirror cv2.VideoCapture.get(); 0.0 while disconnected."""
+        return self._cap.get(prop) if self._cap is not None else 0.0
+
+def open_source(spec, **kwargs):
+    """
+    Open a CameraSource, checking that files exist first.
+
+    Args:
+        spec (str or int): Source string (see parse_source()).
+        **kwargs: Passed to CameraSource.
+
+    Returns:
+        CameraSource
+
+    Raises:
+        FileNotFoundError: If a file source does not exist.
+    """
+    source = parse_source(spec)
+    if isinstance(source, str) and not is_network_source(source) and not os.path.exists(source):
+        raise FileNotFoundError(f"❌ Video file not found: {source}")
+    return CameraSource(source, **kwargs)
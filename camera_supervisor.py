@@ -0,0 +1,545 @@
+"""
+camera_supervisor.py
+
+Runs the prediction pipeline for every camera of a lot from one entry
+point, instead of one camera_predict.py process per spot.
+
+Process layout:
+    - Supervisor (this process): reads the camera list, starts the other
+      processes, restarts them with exponential backoff when they exit
+      (or, for workers, stop sending heartbeats), and writes a health
+      file. While the inference process is restarting, workers drop
+      their frames instead of queueing them for a model that is not
+      loaded yet.
+    - Inference process: the only process that imports TensorFlow and
+      holds the model. Crops from all cameras arrive on one queue and
+      are classified in batches.
+    - One camera worker per spot: capture (FrameGrabber), cropping and
+      resizing to the model input, and reporting (StatusReporter) as in
+      camera_predict.py. Workers never import TensorFlow, so each extra
+      camera costs an OpenCV process rather than another copy of the
+      framework and the model weights.
+
+Camera list, in order of preference:
+    1. --config FILE (default cameras.json), e.g.
+       {"cameras": [{"spot_id": 1, "camera": 0},
+                    {"spot_id": 2, "camera": "rtsp://10.0.0.5/stream1",
+                     "substream": "rtsp://10.0.0.5/stream2", "fps": 2}]}
+    2. --from-server, or no config file: one worker per spot of the zone
+       returned by get_parking_spots, using camera index spot_id - 1.
+
+All cameras of one supervisor belong to one zone (--zone) and report to
+its server (--server HOST:PORT), as camera_predict.py does.
+
+Usage:
+    python camera_supervisor.py [--config cameras.json] [--from-server]
+                                [--server HOST:PORT] [--zone ZONE]
+                                [--max-batch N] [--status FILE]
+
+Outputs:
+    - static/supervisor_status.json : Per-worker health (state, FPS,
+                                      last status, restarts, heartbeat age)
+    - Everything camera_predict.py writes, for each spot
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import camera_predict as cp
+from camera_source import parse_size, parse_source
+from frame_grabber import FrameGrabber
+from pipeline_stats import PipelineStats
+from preprocessing import Preprocessor, crop, scale_roi, to_model_rgb
+from smoothing import DEFAULT_MODE, KEEPALIVE, StatusSmoother
+
+# -------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------
+
+CONFIG_PATH = "cameras.json"
+STATUS_PATH = "static/supervisor_status.json"
+
+# Largest batch the inference process runs at once
+MAX_BATCH = 16
+
+# Seconds a worker waits for its inference result before giving up on the frame
+INFERENCE_TIMEOUT = 5.0
+
+# Seconds between worker heartbeats and between health file updates
+HEALTH_INTERVAL = 5.0
+
+# A worker silent for this long is reported stale and restarted
+STALE_AFTER = 3 * HEALTH_INTERVAL
+
+# Restart delays (seconds): doubled after each crash, reset after a stable run
+RESTART_INITIAL = 1.0
+RESTART_MAX     = 60.0
+STABLE_AFTER    = 60.0
+
+# -------------------------------------------------------------------
+# Camera list
+# -------------------------------------------------------------------
+
+def normalize_spec(entry):
+    """
+    Fill in defaults for one camera entry.
+
+    Args:
+        entry (dict): At least 'spot_id'; optionally 'camera', 'substream',
+            'size' ('WxH' or [w, h]), 'fps', 'smoothing' and 'keepalive'.
+
+    Returns:
+        dict: Complete spec with all of the above keys, plus the 'zone'
+        and 'server' (host, port) the supervisor was started with.
+    """
+    spot_id = int(entry["spot_id"])
+    size = entry.get("size")
+    if isinstance(size, str):
+        size = parse_size(size)
+    return {
+        "spot_id": spot_id,
+        "camera": parse_source(str(entry.get("camera", spot_id - 1))),
+        "substream": entry.get("substream"),
+        "size": tuple(size) if size else None,
+        "fps": float(entry.get("fps", cp.TARGET_FPS)),
+        "smoothing": entry.get("smoothing", DEFAULT_MODE),
+        "keepalive": float(entry.get("keepalive", KEEPALIVE)),
+        "zone": cp.ZONE,
+        "server": (cp.SERVER_HOST, cp.SERVER_PORT),
+    }
+
+def load_config(path=CONFIG_PATH):
+    """
+    Read the camera list from a JSON file.
+
+    Returns:
+        list[dict] or None: Normalized specs, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    entries = data["cameras"] if isinstance(data, dict) else data
+    return [normalize_spec(entry) for entry in entries]
+
+def specs_from_server():
+    """
+    Build one camera spec per spot of the zone known to the ParkingServer.
+
+    Returns:
+        list[dict]: Specs using camera index spot_id - 1.
+    """
+    try:
+        data = cp._server_request({"action": "get_parking_spots", "zone": cp.ZONE})
+    finally:
+        # The supervisor itself does not talk to the server after startup
+        cp.close_camera_socket()
+    return [normalize_spec({"spot_id": spot["id"]}) for spot in data.get("spots", [])]
+
+# -------------------------------------------------------------------
+# Child processes
+# -------------------------------------------------------------------
+
+def inference_worker(request_queue, response_queues, ready, stop, max_batch, model_path):
+    """
+    Hold the model and classify crops from all cameras in batches.
+
+    Every request is (spot_id, seq, rgb) with a model-sized RGB uint8
+    crop; the answer (seq, score) goes to that spot's response queue.
+    Whatever is waiting on the queue when a batch starts is classified
+    together, so the batch size adapts to the load.
+    """
+    model = cp.load_model(model_path)
+    preprocessor = Preprocessor(roi=None, max_batch=max_batch)
+    ready.set()
+
+    try:
+        while not stop.is_set():
+            try:
+                items = [request_queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(items) < max_batch:
+                try:
+                    items.append(request_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for i, (_, _, rgb) in enumerate(items):
+                preprocessor.fill_rgb(i, rgb)
+            scores = model.predict_on_batch(preprocessor.batch(len(items)))
+            for (spot_id, seq, _), score in zip(items, scores):
+                response_queues[spot_id].put((seq, float(score[0])))
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; the supervisor handles it
+        pass
+
+def _heartbeat(health_queue, spec, state, stats=None, **extra):
+    message = {"spot_id": spec["spot_id"], "pid": os.getpid(), "state": state,
+               "time": time.time()}
+    if stats is not None:
+        snapshot = stats.snapshot()
+        message.update(frames=snapshot["frames"], fps=snapshot["fps"],
+                       dropped=snapshot["dropped"], saturated=snapshot["saturated"])
+    message.update(extra)
+    health_queue.put(message)
+
+def camera_worker(spec, request_queue, response_queue, health_queue, ready, stop):
+    """
+    Capture, crop and report for one spot; inference is delegated to the
+    inference process.
+
+    Args:
+        spec (dict): Normalized camera spec.
+        request_queue: Shared queue of the inference process.
+        response_queue: This spot's result queue.
+        health_queue: Heartbeats to the supervisor.
+        ready: Event set while the inference process has the model loaded.
+        stop: Event set by the supervisor on shutdown.
+    """
+    spot_id = spec["spot_id"]
+    # camera_predict helpers read these module globals (separate per process)
+    cp.SPOT_ID, cp.CAMERA_SOURCE = spot_id, spec["camera"]
+    (cp.SERVER_HOST, cp.SERVER_PORT), cp.ZONE = spec["server"], spec["zone"]
+
+    cap = cp.open_camera(spec["camera"], spec["substream"], spec["size"])
+    if cap is None or (not cap.isOpened() and not cap.is_network):
+        print(f"❌ Camera {spec['camera']} not found. Marking Spot {spot_id} as occupied.")
+        cp.send_status_to_server(spot_id, "occupied", quiet=True)
+        cp.save_status_locally(spot_id, "occupied")
+        _heartbeat(health_queue, spec, "camera_missing")
+        raise SystemExit(2)
+
+    stats = PipelineStats(target_fps=spec["fps"], report_interval=cp.STATS_REPORT_INTERVAL)
+    grabber = FrameGrabber(cap, stats, name=f"grabber-{spot_id}").start()
+    reporter = cp.StatusReporter(spot_id, stats).start()
+    smoother = StatusSmoother(spec["smoothing"], keepalive=spec["keepalive"])
+    base_roi = (cp.CROP_X, cp.CROP_Y, cp.CROP_W, cp.CROP_H)
+    roi, frame_size, seq = base_roi, None, 0
+
+    period = 1.0 / spec["fps"]
+    next_tick = time.monotonic()
+    last_beat = 0.0
+    state, last_status = "starting", None
+    try:
+        while not stop.is_set():
+            now = time.monotonic()
+            if now - last_beat >= HEALTH_INTERVAL:
+                _heartbeat(health_queue, spec, state, stats, last_status=last_status,
+                           confidence=smoother.confidence() if smoother.status else None,
+                           changes=smoother.changes, published=reporter.published,
+                           reconnects=cap.reconnects, unpublished=reporter.skipped)
+                last_beat = now
+
+            frame, captured_at = grabber.read(timeout=cp.FRAME_TIMEOUT)
+            if frame is None:
+                state = "no_frames"
+                continue
+
+            if frame.shape[1::-1] != frame_size:
+                frame_size = frame.shape[1::-1]
+                roi = scale_roi(base_roi, frame_size)
+
+            with stats.stage("preprocess"):
+                rgb = to_model_rgb(crop(frame, roi))
+
+            if not ready.is_set():
+                # The inference process is (re)loading the model
+                state = "waiting_for_model"
+                stats.frame_dropped()
+                ready.wait(cp.FRAME_TIMEOUT)
+                continue
+
+            # Round trip through the shared inference process
+            seq += 1
+            with stats.stage("inference"):
+                try:
+                    request_queue.put((spot_id, seq, rgb), timeout=INFERENCE_TIMEOUT)
+                except queue.Full:
+                    # Inference is stuck or gone: drop the frame, keep the heartbeats going
+                    state = "inference_busy"
+                    stats.frame_dropped()
+                    continue
+                score = None
+                deadline = time.monotonic() + INFERENCE_TIMEOUT
+                while score is None and time.monotonic() < deadline:
+                    try:
+                        reply_seq, reply_score = response_queue.get(
+                            timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    # Late answers to frames that already timed out are discarded
+                    if reply_seq == seq:
+                        score = reply_score
+            if score is None:
+                state = "inference_timeout"
+                stats.frame_dropped()
+                continue
+
+            predicted, confidence, changed = smoother.update(score)
+            last_status = cp.resolve_status(predicted, reporter.current_status)
+            cp.annotate_frame(frame, last_status, roi, confidence)
+            reporter.submit(frame, predicted, captured_at, confidence,
+                            smoother.should_publish(changed))
+            stats.frame_done()
+            state = "running"
+
+            if stats.report_due():
+                snapshot = stats.snapshot()
+                print(f"📊 Spot {spot_id} | {stats.format_compact(snapshot)}")
+                cp.report_stats_to_server(spot_id, snapshot)
+
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                stop.wait(delay)
+            else:
+                next_tick = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        grabber.stop()
+        reporter.stop()
+        cap.release()
+        _heartbeat(health_queue, spec, "stopped", stats)
+
+# -------------------------------------------------------------------
+# Supervisor
+# -------------------------------------------------------------------
+
+class _Child:
+    """Bookkeeping for one supervised process."""
+
+    def __init__(self, name, target, args):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = RESTART_INITIAL
+        self.next_start = 0.0
+        self.last_exitcode = None
+
+class CameraSupervisor:
+    """
+    Starts the inference process and one worker per camera, restarts
+    them when they exit, and publishes their health.
+
+    Attributes:
+        specs (list[dict]): Normalized camera specs.
+        status_path (str): Health file written every HEALTH_INTERVAL seconds.
+        health (dict): Latest heartbeat per spot_id.
+    """
+
+    def __init__(self, specs, model_path=cp.MODEL_PATH, max_batch=MAX_BATCH,
+                 status_path=STATUS_PATH):
+        """
+        Args:
+            specs (list[dict]): Normalized camera specs (see normalize_spec()).
+            model_path (str): Keras model loaded by the inference process.
+            max_batch (int): Largest inference batch.
+            status_path (str): Where to write the health file.
+        """
+        self.specs = specs
+        self.status_path = status_path
+        self.health = {}
+        self.started_at = time.time()
+
+        # Spawned (not forked) children: no TensorFlow or OpenCV thread
+        # state is inherited, and workers only import what they use
+        ctx = mp.get_context("spawn")
+        self.ctx = ctx
+        self.stop_event = ctx.Event()
+        self.ready = ctx.Event()
+        self.requests = ctx.Queue(maxsize=max(4 * len(specs), max_batch))
+        self.responses = {spec["spot_id"]: ctx.Queue() for spec in specs}
+        self.health_queue = ctx.Queue()
+
+        self.inference = _Child("inference", inference_worker,
+                                (self.requests, self.responses, self.ready,
+                                 self.stop_event, max_batch, model_path))
+        self.workers = {
+            spec["spot_id"]: _Child(f"camera-{spec['spot_id']}", camera_worker,
+                                    (spec, self.requests, self.responses[spec["spot_id"]],
+                                     self.health_queue, self.ready, self.stop_event))
+            for spec in specs
+        }
+
+    def _spawn(self, child):
+        child.process = self.ctx.Process(target=child.target, args=child.args,
+                                         name=child.name, daemon=True)
+        child.process.start()
+        child.started_at = time.monotonic()
+
+    def _check(self, child, now):
+        """Restart a child that exited, honouring its backoff delay."""
+        if child.process is not None and child.process.is_alive():
+            return
+        if child.process is not None:
+            # Just exited: schedule the restart
+            child.last_exitcode = child.process.exitcode
+            ran = now - child.started_at
+            child.backoff = RESTART_INITIAL if ran >= STABLE_AFTER else child.backoff
+            child.next_start = now + child.backoff
+            print(f"⚠️ {child.name} exited with code {child.last_exitcode} after {ran:.0f}s; "
+                  f"restarting in {child.backoff:.0f}s")
+            if child is self.inference:
+                # Workers wait until the new process has loaded the model
+                self.ready.clear()
+            child.backoff = min(child.backoff * 2, RESTART_MAX)
+            child.process = None
+        if now >= child.next_start:
+            child.restarts += 1
+            self._spawn(child)
+
+    def _restart_if_silent(self, spot_id, child):
+        """
+        Terminate a running worker that sent no heartbeat for STALE_AFTER
+        seconds (e.g. stuck in a camera or queue call); _check() then
+        restarts it with the usual backoff.
+        """
+        if child.process is None or not child.process.is_alive():
+            return
+        beat = self.health.get(spot_id)
+        if beat is not None and beat.get("pid") == child.process.pid:
+            silent = time.time() - beat["time"]
+        else:
+            # No heartbeat from this process yet
+            silent = time.monotonic() - child.started_at
+        if silent > STALE_AFTER:
+            print(f"⚠️ {child.name} sent no heartbeat for {silent:.0f}s; restarting it")
+            child.process.terminate()
+            child.process.join(1.0)
+            if child.process.is_alive():
+                child.process.kill()
+                child.process.join(1.0)
+
+    def start(self):
+        """Start the inference process, wait for the model, then start the workers."""
+        start = time.monotonic()
+        self._spawn(self.inference)
+        while not self.ready.wait(0.5):
+            if not self.inference.process.is_alive():
+                raise RuntimeError("❌ Inference process failed to load the model")
+        print(f"🧠 Model loaded by inference process {self.inference.process.pid} "
+              f"in {time.monotonic() - start:.1f}s")
+        for child in self.workers.values():
+            self._spawn(child)
+        print(f"▶️ Supervising {len(self.workers)} camera(s) "
+              f"(startup {time.monotonic() - start:.1f}s)")
+
+    def _drain_health(self):
+        while True:
+            try:
+                message = self.health_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.health[message["spot_id"]] = message
+
+    def status(self):
+        """
+        Build the health report.
+
+        Returns:
+            dict: Supervisor uptime, inference process state and one entry
+            per worker with its last heartbeat, restarts and liveness.
+        """
+        now = time.time()
+
+        def proc_info(child):
+            alive = child.process is not None and child.process.is_alive()
+            return {"pid": child.process.pid if alive else None, "alive": alive,
+                    "restarts": child.restarts, "last_exitcode": child.last_exitcode}
+
+        workers = []
+        for spec in self.specs:
+            child = self.workers[spec["spot_id"]]
+            beat = self.health.get(spec["spot_id"], {})
+            age = now - beat["time"] if beat else None
+            entry = dict(beat, spot_id=spec["spot_id"], camera=str(spec["camera"]),
+                         heartbeat_age_s=round(age, 1) if age is not None else None,
+                         stale=age is None or age > STALE_AFTER,
+                         **proc_info(child))
+            entry.pop("time", None)
+            workers.append(entry)
+        return {
+            "updated_at": now,
+            "uptime_s": round(now - self.started_at, 1),
+            "inference": proc_info(self.inference),
+            "workers": workers,
+        }
+
+    def write_status(self):
+        """Write status() to the health file atomically."""
+        os.makedirs(os.path.dirname(self.status_path) or ".", exist_ok=True)
+        tmp_path = self.status_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(tmp_path, self.status_path)
+
+    def run(self):
+        """Supervise until interrupted (Ctrl+C), then shut everything down."""
+        self.start()
+        last_status = 0.0
+        try:
+            while True:
+                now = time.monotonic()
+                self._drain_health()
+                self._check(self.inference, now)
+                for spot_id, child in self.workers.items():
+                    self._restart_if_silent(spot_id, child)
+                    self._check(child, now)
+                if now - last_status >= HEALTH_INTERVAL:
+                    self.write_status()
+                    last_status = now
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            print("🛑 Stopping camera supervisor...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout=5.0):
+        """Ask all children to stop, then terminate those that do not."""
+        self.stop_event.set()
+        children = [self.inference, *self.workers.values()]
+        deadline = time.monotonic() + timeout
+        for child in children:
+            if child.process is not None:
+                child.process.join(max(0.0, deadline - time.monotonic()))
+        for child in children:
+            if child.process is not None and child.process.is_alive():
+                child.process.terminate()
+        self._drain_health()
+        self.write_status()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the predictors for all cameras")
+    parser.add_argument('--config', default=CONFIG_PATH, help="Camera list (JSON)")
+    parser.add_argument('--from-server', action='store_true',
+                        help="Use one camera per spot from get_parking_spots")
+    parser.add_argument('--server', type=cp.parse_server, default=(cp.SERVER_HOST, cp.SERVER_PORT),
+                        metavar='HOST:PORT', help="Server of the cameras' zone")
+    parser.add_argument('--zone', default=cp.ZONE, help="Zone of the cameras' spots")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--model', default=cp.MODEL_PATH)
+    parser.add_argument('--status', default=STATUS_PATH, help="Health file to write")
+    args = parser.parse_args()
+    (cp.SERVER_HOST, cp.SERVER_PORT), cp.ZONE = args.server, args.zone
+
+    specs = None if args.from_server else load_config(args.config)
+    if specs is None:
+        print(f"ℹ️ No camera config at '{args.config}', using the spots known to the server")
+        specs = specs_from_server()
+    if not specs:
+        print("❌ No cameras to supervise.")
+        return
+
+    CameraSupervisor(specs, args.model, args.max_batch, args.status).run()
+
+if __name__ == "__main__":
+    main()
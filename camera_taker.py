@@ -6,7 +6,8 @@ label them as 'empty' or 'occupied', and save both the full-frame
 and cropped ROI images into organized folders.
 
 Usage:
-    1. Run the script: python camera_taker.py
+    1. Run the script: python camera_taker.py [--camera SOURCE] [--substream URL] [--size WxH]
+       SOURCE is a camera index (default 0), an RTSP/HTTP URL or a video file.
     2. A live video window will open with a yellow rectangle indicating
        the crop area.
     3. Press 'E' to label the current frame as EMPTY.
@@ -14,9 +15,12 @@ Usage:
     5. Press 'Q' to quit the application.
 """
 
+import argparse
 import cv2
 import os
 import time
+from camera_source import open_source, parse_size
+from preprocessing import DEFAULT_ROI, scale_roi
 
 # -------------------------------------------------------------------
 # Configuration: folder names and crop rectangle
@@ -30,14 +34,11 @@ FULL_OCCUPIED_FOLDER = "occupied_spots"
 CROPPED_EMPTY_FOLDER    = "cropped_dataset/cropped_empty"
 CROPPED_OCCUPIED_FOLDER = "cropped_dataset/cropped_occupied"
 
-# Region of interest (ROI) to crop: (x, y, width, height)
-CROP_X = 140
-CROP_Y = 250
-CROP_W = 360
-CROP_H = 180
+# Region of interest (ROI) to crop: (x, y, width, height), shared with inference
+CROP_X, CROP_Y, CROP_W, CROP_H = DEFAULT_ROI
 
-# Camera index to open (0 is usually the default webcam)
-CAMERA_INDEX = 0
+# Default camera to open (0 is usually the default webcam)
+CAMERA_SOURCE = "0"
 
 def ensure_folders_exist():
     """
@@ -51,13 +52,22 @@ def ensure_folders_exist():
     ]:
         os.makedirs(folder, exist_ok=True)
 
-def capture_and_label_spots():
+def capture_and_label_spots(source=CAMERA_SOURCE, substream=None, size=None):
     """
-    Open the webcam feed, display a live rectangle for the crop area,
+    Open the camera feed, display a live rectangle for the crop area,
     and respond to keypresses to save labeled images.
+
+    Args:
+        source (str or int): Camera index, stream URL or video file.
+        substream (str, optional): Low-resolution stream URL to prefer.
+        size (tuple, optional): (width, height) to request from a local camera.
     """
-    # Initialize webcam capture
-    cam = cv2.VideoCapture(CAMERA_INDEX)
+    # Initialize camera capture (network streams reconnect automatically)
+    try:
+        cam = open_source(source, substream=substream, size=size)
+    except FileNotFoundError as e:
+        print(e)
+        return
     if not cam.isOpened():
         print("❌ Error: Camera not detected.")
         return
@@ -69,20 +79,27 @@ def capture_and_label_spots():
             # Read a frame from the webcam
             ret, frame = cam.read()
             if not ret:
+                if cam.is_network:
+                    continue
                 print("❌ Failed to capture frame.")
                 break
 
-            # Draw the cropping rectangle in yellow (BGR: 0,255,255)
+            # ROI scaled to the stream resolution
+            x, y, w, h = scale_roi((CROP_X, CROP_Y, CROP_W, CROP_H), frame.shape[1::-1])
+
+            # Draw the cropping rectangle in yellow (BGR: 0,255,255) on a
+            # copy, so the saved images do not contain it
+            preview = frame.copy()
             cv2.rectangle(
-                frame,
-                (CROP_X, CROP_Y),
-                (CROP_X + CROP_W, CROP_Y + CROP_H),
+                preview,
+                (x, y),
+                (x + w, y + h),
                 (0, 255, 255),
                 2
             )
 
             # Display the live feed window
-            cv2.imshow("Live Parking Spot Feed", frame)
+            cv2.imshow("Live Parking Spot Feed", preview)
 
             # Wait for a key press for 1ms
             key = cv2.waitKey(1) & 0xFF
@@ -97,7 +114,7 @@ def capture_and_label_spots():
                 cropped_path = os.path.join(CROPPED_EMPTY_FOLDER, filename)
 
                 cv2.imwrite(full_path, frame)
-                cropped = frame[CROP_Y:CROP_Y + CROP_H, CROP_X:CROP_X + CROP_W]
+                cropped = frame[y:y + h, x:x + w]
                 cv2.imwrite(cropped_path, cropped)
 
                 print(f"✅ Saved EMPTY image: {full_path} and cropped to {cropped_path}")
@@ -109,7 +126,7 @@ def capture_and_label_spots():
                 cropped_path = os.path.join(CROPPED_OCCUPIED_FOLDER, filename)
 
                 cv2.imwrite(full_path, frame)
-                cropped = frame[CROP_Y:CROP_Y + CROP_H, CROP_X:CROP_X + CROP_W]
+                cropped = frame[y:y + h, x:x + w]
                 cv2.imwrite(cropped_path, cropped)
 
                 print(f"✅ Saved OCCUPIED image: {full_path} and cropped to {cropped_path}")
@@ -128,5 +145,11 @@ if __name__ == "__main__":
     """
     Entry point: ensure folders exist, then start capture loop.
     """
+    parser = argparse.ArgumentParser(description="Capture and label parking spot images")
+    parser.add_argument('--camera', default=CAMERA_SOURCE,
+                        help="Camera index, RTSP/HTTP URL or video file")
+    parser.add_argument('--substream', help="Low-resolution stream URL of the same camera")
+    parser.add_argument('--size', type=parse_size, help="Capture resolution WIDTHxHEIGHT")
+    args = parser.parse_args()
     ensure_folders_exist()
-    capture_and_label_spots()
+    capture_and_label_spots(args.camera, args.substream, args.size)
@@ -9,16 +9,75 @@ Usage:
     python client.py
 """
 
-import socket
-import json
+from protocol import connect
 
 # Server connection settings
 SERVER_HOST = "127.0.0.1"  # Change if server runs on a different host
 SERVER_PORT = 65432        # Must match the ParkingServer port
 
+class ParkingClient:
+    """
+    Persistent AES-encrypted connection to the ParkingServer.
+
+    Speaks the framed protocol (see protocol.py) like app.py and
+    camera_predict.py: length-prefixed frames, each encrypted under its
+    own nonce. One instance must only be used by one thread at a time.
+
+    Attributes:
+        host (str): Server address.
+        port (int): Server port.
+        timeout (float): Socket timeout in seconds.
+    """
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, timeout=10.0):
+        """
+        Prepare a client; the socket is opened lazily on the first request.
+
+        Args:
+            host (str): Server address.
+            port (int): Server port.
+            timeout (float): Socket timeout in seconds.
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.channel = None
+
+    def request(self, action, data=None):
+        """
+        Send one request and wait for its response.
+
+        Args:
+            action (str): The action name (e.g., "get_parking_spots").
+            data (dict, optional): Additional parameters for the action.
+
+        Returns:
+            dict: Parsed JSON response from the server.
+
+        Raises:
+            OSError, ValueError: On connection, framing or decoding errors.
+                The connection is closed so the next call reconnects.
+        """
+        payload = {"action": action}
+        if data:
+            payload.update(data)
+        try:
+            if self.channel is None:
+                self.channel = connect(self.host, self.port, timeout=self.timeout)
+            return self.channel.request(payload)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        """Close the underlying connection, if open."""
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+
 def send_request(action, data=None):
     """
-    Send a JSON request to the ParkingServer and receive its response.
+    Send an AES-encrypted request to the ParkingServer and receive its response.
 
     Args:
         action (str): The action name (e.g., "register", "login", etc.).
@@ -27,18 +86,13 @@ def send_request(action, data=None):
     Returns:
         dict: Parsed JSON response from the server, or error information.
     """
-    payload = {"action": action}
-    if data:
-        payload.update(data)
-
+    client = ParkingClient()
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-            client_socket.connect((SERVER_HOST, SERVER_PORT))
-            client_socket.send(json.dumps(payload).encode("utf-8"))
-            raw = client_socket.recv(4096).decode("utf-8")
-            return json.loads(raw)
+        return client.request(action, data)
     except Exception as e:
         return {"status": "error", "message": str(e)}
+    finally:
+        client.close()
 
 def register():
     """Prompt for username/password and register a new user with the server."""
@@ -0,0 +1,157 @@
+"""
+frame_grabber.py
+
+Decouples frame capture from frame processing for the camera pipeline.
+
+A FrameGrabber reads from a cv2.VideoCapture-like source in a background
+thread as fast as the device delivers frames and keeps only the newest
+one. The driver buffer is therefore drained continuously, so the
+processing loop always works on a current frame instead of one that sat
+in the queue for seconds, and a slow inference or server round-trip
+never stalls capture. Frames replaced before anyone consumed them are
+counted as dropped in PipelineStats.
+
+Classes:
+    LatestSlot: Single-value mailbox that keeps only the most recent item.
+    FrameGrabber: Background capture thread built on LatestSlot.
+"""
+
+import threading
+import time
+
+
+class LatestSlot:
+    """
+    Thread-safe mailbox holding at most one item (drop-oldest).
+
+    put() never blocks: a newer item simply replaces an unconsumed one.
+    get() blocks until an item that has not been returned yet is
+    available, the timeout expires, or the slot is closed.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._fresh = False
+        self._closed = False
+
+    def put(self, item, merge=None):
+        """
+        Store an item, replacing any unconsumed one.
+
+        Args:
+            item: The new value.
+            merge (callable, optional): merge(old, new) -> stored item, called
+                when an unconsumed item is replaced, so that information in
+                the old item (e.g. a pending status change) is not lost.
+
+        Returns:
+            bool: True if an unconsumed item was discarded.
+        """
+        with self._cond:
+            replaced = self._fresh
+            if replaced and merge is not None:
+                item = merge(self._item, item)
+            self._item = item
+            self._fresh = True
+            self._cond.notify_all()
+            return replaced
+
+    def get(self, timeout=None):
+        """
+        Take the newest item that has not been returned before.
+
+        Args:
+            timeout (float, optional): Seconds to wait; None waits forever.
+
+        Returns:
+            object or None: The item, or None on timeout or after close().
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._fresh or self._closed, timeout):
+                return None
+            if not self._fresh:
+                return None
+            self._fresh = False
+            return self._item
+
+    def close(self):
+        """Wake up all waiting consumers; further get() calls return None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FrameGrabber:
+    """
+    Background thread that keeps the latest frame of a capture source.
+
+    Attributes:
+        cap: Object with a cv2.VideoCapture compatible read() method.
+        stats (PipelineStats or None): Receives 'capture' timings and
+            the number of frames dropped because a newer one replaced them.
+        frames (int): Frames read successfully so far.
+        failures (int): Failed read() calls so far.
+    """
+
+    # Pause after a failed read so a broken device does not spin the CPU
+    RETRY_DELAY = 0.5
+
+    def __init__(self, cap, stats=None, name="frame-grabber"):
+        """
+        Prepare (but do not start) the capture thread.
+
+        Args:
+            cap: Opened capture source.
+            stats (PipelineStats, optional): Statistics collector.
+            name (str): Thread name, handy when several cameras run.
+        """
+        self.cap = cap
+        self.stats = stats
+        self.frames = 0
+        self.failures = 0
+        self._slot = LatestSlot()
+        self._running = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        """Start capturing and return self for chaining."""
+        self._running.set()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running.is_set():
+            start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                self.failures += 1
+                time.sleep(self.RETRY_DELAY)
+                continue
+            self.frames += 1
+            if self.stats:
+                self.stats.record("capture", time.perf_counter() - start)
+            # Timestamp taken after the read returns: age of the frame seen by consumers
+            if self._slot.put((frame, time.monotonic())) and self.stats:
+                self.stats.frame_dropped()
+
+    def read(self, timeout=None):
+        """
+        Return the newest frame not handed out before.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a new frame.
+
+        Returns:
+            tuple: (frame, captured_at) where captured_at is a
+            time.monotonic() timestamp, or (None, None) on timeout.
+        """
+        item = self._slot.get(timeout)
+        return item if item is not None else (None, None)
+
+    def stop(self, timeout=2.0):
+        """Stop the capture thread and wait for it to finish its current read."""
+        self._running.clear()
+        self._slot.close()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
@@ -0,0 +1,308 @@
+"""
+benchmark_model.py
+
+Headless inference micro-benchmark for the parking spot classifier.
+
+Measures, on CPU, for the saved model (and any exported variants):
+  - TensorFlow import time and model load time
+  - Single-sample latency through both model.predict() and a direct call
+  - Batched throughput for batch sizes 1..256
+  - Resident memory after loading and peak RSS of the process
+
+Input samples are real images from cropped_dataset/, preprocessed the
+same way as for evaluation. Each model is benchmarked in its own
+subprocess so load time and peak RSS are not polluted by the others.
+Nothing is plotted; results are printed as a table and written to JSON.
+
+Usage:
+    python ml_model/benchmark_model.py [--model PATH ...] [--batch-sizes 1,8,32]
+        [--samples 256] [--repeats 20] [--output FILE]
+
+Supported model formats:
+    .h5 / .keras (Keras), SavedModel directories, .tflite (TF Lite interpreter)
+
+Outputs:
+    - benchmarks/results/model_<commit>.json : Machine-readable results
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Allow importing shared modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import Preprocessor, load_image  # noqa: E402
+
+# -------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------
+MODEL_PATH   = 'ml_model/parking_model.h5'
+DATASET_PATH = 'cropped_dataset'
+RESULTS_DIR  = os.path.join('benchmarks', 'results')
+
+DEFAULT_BATCH_SIZES = "1,2,4,8,16,32,64,128,256"
+
+# -------------------------------------------------------------------
+# Measurement helpers
+# -------------------------------------------------------------------
+
+def rss_mb():
+    """
+    Current resident set size in MiB, or None if it cannot be read.
+    Uses /proc on Linux and psutil elsewhere when it is installed.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in KiB on Linux
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except (ImportError, AttributeError):
+            return None
+
+def git_commit():
+    """Return the short hash of the checked-out commit, or 'unknown'."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def load_samples(dataset_path, count):
+    """
+    Load up to `count` images from the dataset class folders and
+    preprocess them with the shared preprocessing module into a float32
+    batch of shape (N, IMG_HEIGHT, IMG_WIDTH, 3).
+    Images are repeated if the dataset is smaller than `count`.
+    """
+    paths = sorted(glob.glob(os.path.join(dataset_path, '*', '*.jpg')))
+    if not paths:
+        raise FileNotFoundError(f"No .jpg images found under '{dataset_path}'")
+
+    preprocessor = Preprocessor(roi=None, max_batch=count)
+    for i in range(count):
+        preprocessor.fill_rgb(i, load_image(paths[i % len(paths)]))
+    return preprocessor.batch(count)
+
+def time_calls(fn, repeats):
+    """Call fn() `repeats` times and return sorted durations in seconds."""
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+def summarize(durations):
+    """p50/p99/mean of a sorted list of durations, in milliseconds."""
+    def pct(p):
+        return durations[min(len(durations) - 1, int(round(p / 100 * (len(durations) - 1))))]
+    return {
+        "p50_ms": round(pct(50) * 1000, 3),
+        "p99_ms": round(pct(99) * 1000, 3),
+        "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+    }
+
+# -------------------------------------------------------------------
+# Model runners
+# -------------------------------------------------------------------
+
+def load_runner(tf, model_path):
+    """
+    Load a model and return (call, predict) callables taking a float32 batch.
+
+    `predict` is the API used by camera_predict.py (model.predict);
+    `call` is the lowest-overhead path available for the format.
+    """
+    if model_path.endswith('.tflite'):
+        interpreter = tf.lite.Interpreter(model_path=model_path)
+        input_index = interpreter.get_input_details()[0]['index']
+        output_index = interpreter.get_output_details()[0]['index']
+        state = {"batch": None}
+
+        def call(batch):
+            if state["batch"] != len(batch):
+                interpreter.resize_tensor_input(input_index, batch.shape)
+                interpreter.allocate_tensors()
+                state["batch"] = len(batch)
+            interpreter.set_tensor(input_index, batch)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)
+        return call, call
+
+    if os.path.isdir(model_path) and not model_path.endswith('.keras'):
+        loaded = tf.saved_model.load(model_path)
+        serve = loaded.signatures['serving_default']
+
+        def call(batch):
+            return next(iter(serve(tf.constant(batch)).values())).numpy()
+        return call, call
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+
+    def call(batch):
+        return model(batch, training=False).numpy()
+
+    def predict(batch):
+        return model.predict(batch, verbose=0)
+    return call, predict
+
+def benchmark_one(args, model_path):
+    """
+    Benchmark a single model in the current process.
+
+    Returns:
+        dict: Load, latency, throughput and memory figures.
+    """
+    rss_start = rss_mb()
+
+    start = time.perf_counter()
+    import tensorflow as tf
+    import_s = time.perf_counter() - start
+
+    # Keep the benchmark on CPU so numbers are comparable across machines
+    tf.config.set_visible_devices([], 'GPU')
+
+    start = time.perf_counter()
+    call, predict = load_runner(tf, model_path)
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',') if b]
+    samples = load_samples(args.dataset, max(args.samples, max(batch_sizes)))
+    single = samples[:1]
+
+    # Warm up graph tracing / kernel selection before timing anything
+    for _ in range(3):
+        call(single)
+        predict(single)
+
+    result = {
+        "model": model_path,
+        "size_mb": round(_path_size(model_path) / 2**20, 2),
+        "tf_version": tf.__version__,
+        "import_s": round(import_s, 3),
+        "load_s": round(load_s, 3),
+        "single_call": summarize(time_calls(lambda: call(single), args.repeats)),
+        "single_predict": summarize(time_calls(lambda: predict(single), args.repeats)),
+        "batches": [],
+    }
+
+    for batch_size in batch_sizes:
+        batch = samples[:batch_size]
+        call(batch)  # warm up this input shape
+        durations = time_calls(lambda: call(batch), max(3, args.repeats // 2))
+        stats = summarize(durations)
+        stats["batch_size"] = batch_size
+        stats["images_per_s"] = round(batch_size / (sum(durations) / len(durations)), 1)
+        result["batches"].append(stats)
+
+    result["rss_start_mb"] = _round(rss_start)
+    result["rss_loaded_mb"] = _round(rss_loaded)
+    result["peak_rss_mb"] = _round(peak_rss_mb())
+    return result
+
+def _path_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f))
+                   for d, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+def run_isolated(args, model_path):
+    """Benchmark one model in a fresh interpreter and return its result dict."""
+    cmd = [sys.executable, os.path.abspath(__file__), '--single',
+           '--model', model_path, '--dataset', args.dataset,
+           '--batch-sizes', args.batch_sizes, '--samples', str(args.samples),
+           '--repeats', str(args.repeats)]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    # The child prints its JSON result as the last line of output
+    return json.loads(out.strip().splitlines()[-1])
+
+# -------------------------------------------------------------------
+# Reporting
+# -------------------------------------------------------------------
+
+def print_table(results):
+    """Print a compact per-model summary table."""
+    for r in results:
+        print(f"\n📦 {r['model']}  ({r['size_mb']} MB, TF {r['tf_version']})")
+        print(f"   import {r['import_s']:.2f}s | load {r['load_s']:.2f}s | "
+              f"RSS loaded {r['rss_loaded_mb']} MB | peak {r['peak_rss_mb']} MB")
+        print(f"   single-sample call    p50 {r['single_call']['p50_ms']:.2f} ms  "
+              f"p99 {r['single_call']['p99_ms']:.2f} ms")
+        print(f"   single-sample predict p50 {r['single_predict']['p50_ms']:.2f} ms  "
+              f"p99 {r['single_predict']['p99_ms']:.2f} ms")
+        print(f"   {'batch':>6} {'p50 ms':>10} {'p99 ms':>10} {'img/s':>10}")
+        for b in r['batches']:
+            print(f"   {b['batch_size']:>6} {b['p50_ms']:>10.2f} "
+                  f"{b['p99_ms']:>10.2f} {b['images_per_s']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking model inference benchmark")
+    parser.add_argument('--model', action='append',
+                        help=f"Model file/directory (repeatable, default {MODEL_PATH})")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--batch-sizes', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--samples', type=int, default=256,
+                        help="Number of dataset images to load")
+    parser.add_argument('--repeats', type=int, default=20,
+                        help="Timed repetitions per measurement")
+    parser.add_argument('--output', help="Results JSON path")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    models = args.model or [MODEL_PATH]
+
+    # Child mode: benchmark exactly one model and emit JSON on stdout
+    if args.single:
+        os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+        print(json.dumps(benchmark_one(args, models[0])))
+        return
+
+    results = []
+    for model_path in models:
+        print(f"⏱️ Benchmarking {model_path} ...")
+        results.append(run_isolated(args, model_path))
+    print_table(results)
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"model_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            "benchmark": "model",
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }, f, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,24 +2,21 @@
 evaluate_model.py
 
 Evaluates the performance of the trained parking spot classifier on the validation set.
-Loads the saved Keras model, prepares the validation data generator,
+Loads the saved Keras model, builds the validation split with the same
+tf.data pipeline as train_model.py (or from packed shards with --packed),
 computes predictions, and prints a classification report.
 Also plots a confusion matrix to visualize true vs. predicted labels.
 
+TensorFlow, scikit-learn and matplotlib are imported inside main(), so
+--help and argument errors return immediately.
+
 Usage:
-    python evaluate_model.py
+    python evaluate_model.py [--packed [DIR]] [--no-plot]
 """
 
-import os
+import argparse
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from sklearn.metrics import (
-    confusion_matrix,
-    classification_report,
-    ConfusionMatrixDisplay
-)
-import matplotlib.pyplot as plt
+from pack_dataset import PACKED_PATH, PackedDataset
 
 # -------------------------------------------------------------------
 # Configuration
@@ -27,80 +24,86 @@ import matplotlib.pyplot as plt
 # Path to the saved model
 MODEL_PATH = 'ml_model/parking_model.h5'
 
-# Validation dataset directory (same structure as used for training)
-DATASET_PATH = 'cropped_dataset'
-
-# Image dimensions must match those used during training
-IMG_WIDTH  = 360
-IMG_HEIGHT = 102
-
-# Batch size for evaluation
-BATCH_SIZE = 32
-
-# -------------------------------------------------------------------
-# Load the trained model
-# -------------------------------------------------------------------
-model = tf.keras.models.load_model(MODEL_PATH)
-print(f"✅ Loaded model from '{MODEL_PATH}'")
-
-# -------------------------------------------------------------------
-# Prepare the validation data generator
-# -------------------------------------------------------------------
-val_datagen = ImageDataGenerator(
-    rescale=1.0 / 255,       # Normalize pixel values to [0,1]
-    validation_split=0.2      # Reserve 20% of data for validation
-)
-
-# Create validation dataset iterator
-val_ds = val_datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(IMG_HEIGHT, IMG_WIDTH),  # Resize images to model input
-    batch_size=BATCH_SIZE,
-    class_mode='binary',                  # Binary labels: empty vs. occupied
-    subset='validation',                  # Use the validation split
-    shuffle=False                         # Keep order for label alignment
-)
-
-# -------------------------------------------------------------------
-# Generate predictions on the validation set
-# -------------------------------------------------------------------
-# model.predict returns an array of probabilities
-y_pred_probs = model.predict(val_ds, verbose=0)
-
-# Convert probabilities to binary class predictions (threshold 0.5)
-y_pred_classes = (y_pred_probs > 0.5).astype(int).reshape(-1)
-
-# True labels from the generator
-y_true = val_ds.classes
-
-# Get human-readable class names from the generator
-class_names = list(val_ds.class_indices.keys())
-
-# -------------------------------------------------------------------
-# Print classification report
-# -------------------------------------------------------------------
-print("\nClassification Report:")
-print(classification_report(
-    y_true,
-    y_pred_classes,
-    target_names=class_names
-))
-
-# -------------------------------------------------------------------
-# Plot confusion matrix
-# -------------------------------------------------------------------
-cm = confusion_matrix(y_true, y_pred_classes)
-disp = ConfusionMatrixDisplay(
-    confusion_matrix=cm,
-    display_labels=class_names
-)
-
-# Create the plot (uses matplotlib)
-disp.plot(cmap=plt.cm.Blues)
-plt.title('Confusion Matrix')
-plt.tight_layout()
-
-# Show the plot window
-plt.show()
-
-
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the parking spot classifier")
+    parser.add_argument('--packed', nargs='?', const=PACKED_PATH,
+                        help="Read pre-decoded shards written by pack_dataset.py "
+                             f"(default folder: {PACKED_PATH})")
+    parser.add_argument('--no-plot', action='store_true',
+                        help="Only print the report, do not open the confusion matrix")
+    args = parser.parse_args()
+
+    # Heavy imports only once the arguments are known to be valid
+    import tensorflow as tf
+    from sklearn.metrics import (
+        confusion_matrix,
+        classification_report,
+        ConfusionMatrixDisplay
+    )
+    from train_model import (
+        DATASET_PATH, VALIDATION_SPLIT,
+        list_dataset, make_dataset, make_packed_dataset
+    )
+
+    # ---------------------------------------------------------------
+    # Load the trained model
+    # ---------------------------------------------------------------
+    model = tf.keras.models.load_model(MODEL_PATH)
+    print(f"✅ Loaded model from '{MODEL_PATH}'")
+
+    # ---------------------------------------------------------------
+    # Prepare the validation split (same split as used for training)
+    # ---------------------------------------------------------------
+    if args.packed:
+        packed = PackedDataset(args.packed)
+        _, val_idx = packed.split(VALIDATION_SPLIT)
+        val_ds = make_packed_dataset(packed, val_idx, training=False)
+        y_true = packed.labels[val_idx]
+        class_names = packed.class_names
+    else:
+        _, _, val_paths, val_labels, class_names = list_dataset(DATASET_PATH)
+        val_ds = make_dataset(val_paths, val_labels, training=False, cache='none')
+        y_true = np.array(val_labels)
+
+    # ---------------------------------------------------------------
+    # Generate predictions on the validation set
+    # ---------------------------------------------------------------
+    # model.predict returns an array of probabilities
+    y_pred_probs = model.predict(val_ds, verbose=0)
+
+    # Convert probabilities to binary class predictions (threshold 0.5)
+    y_pred_classes = (y_pred_probs > 0.5).astype(int).reshape(-1)
+
+    # ---------------------------------------------------------------
+    # Print classification report
+    # ---------------------------------------------------------------
+    print("\nClassification Report:")
+    print(classification_report(
+        y_true,
+        y_pred_classes,
+        target_names=class_names
+    ))
+
+    # ---------------------------------------------------------------
+    # Plot confusion matrix
+    # ---------------------------------------------------------------
+    if args.no_plot:
+        return
+    import matplotlib.pyplot as plt
+
+    cm = confusion_matrix(y_true, y_pred_classes)
+    disp = ConfusionMatrixDisplay(
+        confusion_matrix=cm,
+        display_labels=class_names
+    )
+
+    # Create the plot (uses matplotlib)
+    disp.plot(cmap=plt.cm.Blues)
+    plt.title('Confusion Matrix')
+    plt.tight_layout()
+
+    # Show the plot window
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+pack_dataset.py
+
+Packs the labeled crops under cropped_dataset/ into memory-mappable NumPy
+shards so training and evaluation no longer decode and resize every JPEG
+on every run.
+
+Layout of the packed directory:
+    manifest.json           : Image size, class names, shard list and one
+                              entry per source file (SHA-1, size, mtime,
+                              label, shard and row)
+    images_<n>.npy          : uint8 array of shape (rows, IMG_HEIGHT, IMG_WIDTH, 3), RGB
+    labels_<n>.npy          : uint8 array of shape (rows,)
+
+Packing is incremental: files whose size and mtime are unchanged are not
+read at all, files whose content hash is unchanged keep their row, and
+only new or modified images are decoded and appended as a new shard.
+Rows of deleted or replaced files are skipped by readers; once they make
+up a large share of the shards everything is rewritten compactly.
+
+Usage:
+    python ml_model/pack_dataset.py [--dataset cropped_dataset] [--out ml_model/packed]
+                                    [--rebuild] [--workers N]
+
+Classes:
+    PackedDataset: Zero-copy reader used by train_model.py and evaluate_model.py.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Allow importing shared modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import IMG_HEIGHT, IMG_WIDTH, load_image  # noqa: E402
+
+# -------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------
+DATASET_PATH = 'cropped_dataset'
+PACKED_PATH  = 'ml_model/packed'
+MANIFEST     = 'manifest.json'
+
+SHARD_SIZE       = 1024                # Max rows written per new shard (~113 MB)
+COMPACT_RATIO    = 0.25                # Rewrite all shards above this dead-row share
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# -------------------------------------------------------------------
+# Helpers
+# -------------------------------------------------------------------
+
+def file_sha1(path):
+    """Return the hex SHA-1 digest of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def scan_dataset(dataset_path):
+    """
+    List image files per class folder.
+
+    Returns:
+        tuple: (class_names, {relative_path: label})
+    """
+    class_names = sorted(d for d in os.listdir(dataset_path)
+                         if os.path.isdir(os.path.join(dataset_path, d)))
+    files = {}
+    for label, name in enumerate(class_names):
+        for filename in sorted(os.listdir(os.path.join(dataset_path, name))):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                files[f"{name}/{filename}"] = label
+    return class_names, files
+
+def load_manifest(packed_path):
+    """Return the manifest dict of a packed directory, or None if missing/incompatible."""
+    try:
+        with open(os.path.join(packed_path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("img_width") != IMG_WIDTH
+            or manifest.get("img_height") != IMG_HEIGHT):
+        return None
+    return manifest
+
+# -------------------------------------------------------------------
+# Packing
+# -------------------------------------------------------------------
+
+def pack_dataset(dataset_path=DATASET_PATH, packed_path=PACKED_PATH,
+                 rebuild=False, workers=None):
+    """
+    Create or incrementally update the packed shards for a dataset.
+
+    Args:
+        dataset_path (str): Root folder with one subfolder per class.
+        packed_path (str): Output folder for shards and manifest.
+        rebuild (bool): Ignore any existing manifest and repack everything.
+        workers (int, optional): Decoder threads (default: CPU count).
+
+    Returns:
+        dict: The written manifest.
+    """
+    start = time.perf_counter()
+    os.makedirs(packed_path, exist_ok=True)
+    class_names, current = scan_dataset(dataset_path)
+
+    old = None if rebuild else load_manifest(packed_path)
+    if old and old.get("class_names") != class_names:
+        old = None
+    old_files = old["files"] if old else {}
+    shards = old["shards"] if old else []
+    if old is None:
+        # Full repack: drop shards from any previous, incompatible layout
+        for name in os.listdir(packed_path):
+            if name.endswith('.npy') and name.startswith(('images_', 'labels_')):
+                os.remove(os.path.join(packed_path, name))
+
+    # Decide which files can keep their packed row
+    files, todo, hashed = {}, [], 0
+    for rel, label in current.items():
+        path = os.path.join(dataset_path, rel)
+        st = os.stat(path)
+        entry = old_files.get(rel)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            files[rel] = entry
+            continue
+        sha1 = file_sha1(path)
+        hashed += 1
+        if entry and entry["sha1"] == sha1 and entry["label"] == label:
+            files[rel] = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+            continue
+        todo.append((rel, label, sha1, st))
+
+    # Compact when too many rows belong to deleted or replaced files
+    total_rows = sum(s["count"] for s in shards)
+    if total_rows and (total_rows - len(files)) / total_rows > COMPACT_RATIO:
+        print(f"🧹 Compacting: {total_rows - len(files)} of {total_rows} packed rows are stale")
+        return pack_dataset(dataset_path, packed_path, rebuild=True, workers=workers)
+
+    # Decode new/changed images in parallel (OpenCV releases the GIL)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for offset in range(0, len(todo), SHARD_SIZE):
+            chunk = todo[offset:offset + SHARD_SIZE]
+            images = np.empty((len(chunk), IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.uint8)
+            labels = np.empty(len(chunk), dtype=np.uint8)
+            decoded = pool.map(lambda item: load_image(os.path.join(dataset_path, item[0])),
+                               chunk)
+
+            shard_id = max((s["id"] for s in shards), default=-1) + 1
+            for row, ((rel, label, sha1, st), img) in enumerate(zip(chunk, decoded)):
+                images[row] = img
+                labels[row] = label
+                files[rel] = {"sha1": sha1, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                              "label": label, "shard": shard_id, "row": row}
+
+            shard = {"id": shard_id, "images": f"images_{shard_id:05d}.npy",
+                     "labels": f"labels_{shard_id:05d}.npy", "count": len(chunk)}
+            np.save(os.path.join(packed_path, shard["images"]), images)
+            np.save(os.path.join(packed_path, shard["labels"]), labels)
+            shards.append(shard)
+
+    # Forget shards no live file points to any more
+    live = {entry["shard"] for entry in files.values()}
+    for shard in [s for s in shards if s["id"] not in live]:
+        for name in (shard["images"], shard["labels"]):
+            try:
+                os.remove(os.path.join(packed_path, name))
+            except FileNotFoundError:
+                pass
+    shards = [s for s in shards if s["id"] in live]
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "img_width": IMG_WIDTH,
+        "img_height": IMG_HEIGHT,
+        "class_names": class_names,
+        "shards": shards,
+        "files": dict(sorted(files.items())),
+    }
+    tmp = os.path.join(packed_path, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(packed_path, MANIFEST))
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Packed {len(files)} images ({len(todo)} decoded, {hashed} hashed, "
+          f"{len(files) - len(todo)} reused) into {len(shards)} shard(s) "
+          f"under '{packed_path}' in {elapsed:.2f}s")
+    return manifest
+
+# -------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------
+
+class PackedDataset:
+    """
+    Memory-mapped view over packed shards.
+
+    Shards are opened with np.load(mmap_mode='r'), so nothing is read
+    from disk until rows are accessed, and batches are gathered straight
+    from the page cache.
+
+    Attributes:
+        class_names (list[str]): Class names in label order.
+        paths (list[str]): Relative source path of every live row, sorted.
+        labels (np.ndarray): uint8 label of every live row.
+    """
+
+    def __init__(self, packed_path=PACKED_PATH):
+        """
+        Open a packed directory.
+
+        Raises:
+            FileNotFoundError: If no compatible manifest exists; run
+                pack_dataset.py first.
+        """
+        manifest = load_manifest(packed_path)
+        if manifest is None:
+            raise FileNotFoundError(
+                f"No packed dataset in '{packed_path}'. Run: python ml_model/pack_dataset.py")
+        self.class_names = manifest["class_names"]
+        self._images = {s["id"]: np.load(os.path.join(packed_path, s["images"]), mmap_mode='r')
+                        for s in manifest["shards"]}
+        entries = manifest["files"]
+        self.paths = list(entries)
+        self._shard = np.array([entries[p]["shard"] for p in self.paths], dtype=np.int64)
+        self._row = np.array([entries[p]["row"] for p in self.paths], dtype=np.int64)
+        self.labels = np.array([entries[p]["label"] for p in self.paths], dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def take(self, indices):
+        """
+        Gather rows into one contiguous uint8 batch.
+
+        Args:
+            indices (array-like of int): Row indices into this dataset.
+
+        Returns:
+            tuple: (images of shape (N, IMG_HEIGHT, IMG_WIDTH, 3), labels of shape (N,))
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        images = np.empty((len(indices), IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.uint8)
+        shards, rows = self._shard[indices], self._row[indices]
+        for shard_id in np.unique(shards):
+            mask = shards == shard_id
+            images[mask] = self._images[shard_id][rows[mask]]
+        return images, self.labels[indices]
+
+    def split(self, validation_split):
+        """
+        Deterministic train/validation split matching train_model.list_dataset:
+        the first `validation_split` of each class (by sorted file name)
+        is used for validation.
+
+        Returns:
+            tuple: (train_indices, val_indices) as int64 arrays.
+        """
+        train, val = [], []
+        for label in range(len(self.class_names)):
+            members = np.flatnonzero(self.labels == label)
+            cut = int(len(members) * validation_split)
+            val.append(members[:cut])
+            train.append(members[cut:])
+        return np.concatenate(train), np.concatenate(val)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack cropped images into .npy shards")
+    parser.add_argument('--dataset', default=DATASET_PATH)
+    parser.add_argument('--out', default=PACKED_PATH)
+    parser.add_argument('--rebuild', action='store_true', help="Repack everything")
+    parser.add_argument('--workers', type=int, help="Decoder threads")
+    args = parser.parse_args()
+    pack_dataset(args.dataset, args.out, rebuild=args.rebuild, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
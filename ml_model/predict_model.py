@@ -1,23 +1,43 @@
 """
 predict_model.py
 
-Command-line utility to classify a single parking spot image as EMPTY or OCCUPIED
+Command-line utility to classify parking spot images as EMPTY or OCCUPIED
 using a pre-trained TensorFlow Keras model.
 
+Single-image mode prints a human-readable verdict. Batch mode accepts any
+mix of files, directories (searched recursively), glob patterns and '-'
+(one path per line on stdin), decodes images in worker threads and runs
+batched inference, streaming one CSV or JSONL record per image so the
+model is loaded only once for thousands of captures.
+
 Usage:
     python predict_model.py <path_to_image>
+    python predict_model.py [--format csv|jsonl] [--batch-size N] [--workers N]
+                            [--no-crop] INPUT [INPUT ...]
 
 Outputs:
-    Prints "🅿️  Spot is EMPTY" if the model predicts empty,
+    Single image: prints "🅿️  Spot is EMPTY" if the model predicts empty,
     or "🚗  Spot is OCCUPIED" if the model predicts occupied.
+    Batch mode: path, score, label and error columns on stdout and a
+    throughput summary on stderr.
 """
 
+import argparse
+import csv
+import glob
+import json
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
-import tensorflow as tf
+
+# Allow importing shared modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import DEFAULT_ROI, Preprocessor, load_image  # noqa: E402
 
 # -------------------------------------------------------------------
 # Configuration: model path and crop settings (must match training)
@@ -25,19 +45,36 @@ import tensorflow as tf
 MODEL_PATH = 'ml_model/parking_model.h5'
 
 # Region of interest (ROI) for cropping from full image: (x, y, width, height)
-CROP_X = 140
-CROP_Y = 250
-CROP_W = 360
-CROP_H = 180
+CROP_X, CROP_Y, CROP_W, CROP_H = DEFAULT_ROI
+
+# Shared preprocessing (crop, resize to model input, RGB, scale to [0, 1])
+preprocessor = Preprocessor(roi=(CROP_X, CROP_Y, CROP_W, CROP_H))
+
+# Batch mode defaults
+BATCH_SIZE = 64
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
 
 # -------------------------------------------------------------------
-# Load the trained model once at module import
+# Model loading (deferred: --help and argument errors never import TensorFlow)
 # -------------------------------------------------------------------
-try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-except Exception as e:
-    print(f"❌ Failed to load model from '{MODEL_PATH}': {e}")
-    sys.exit(1)
+_model = None
+
+def get_model():
+    """
+    Import TensorFlow and load the trained model on first use.
+
+    Returns:
+        tf.keras.Model: The cached model.
+    """
+    global _model
+    if _model is None:
+        import tensorflow as tf
+        try:
+            _model = tf.keras.models.load_model(MODEL_PATH)
+        except Exception as e:
+            print(f"❌ Failed to load model from '{MODEL_PATH}': {e}")
+            sys.exit(1)
+    return _model
 
 def prepare_image(image_path: str) -> np.ndarray:
     """
@@ -47,7 +84,7 @@ def prepare_image(image_path: str) -> np.ndarray:
         image_path (str): Path to the input image file.
 
     Returns:
-        np.ndarray: Preprocessed image tensor of shape (1, IMG_H, IMG_W, 3).
+        np.ndarray: Preprocessed image tensor of shape (1, IMG_HEIGHT, IMG_WIDTH, 3).
 
     Raises:
         ValueError: If the image cannot be loaded.
@@ -57,17 +94,8 @@ def prepare_image(image_path: str) -> np.ndarray:
     if img is None:
         raise ValueError(f"❌ Error loading image: {image_path}")
 
-    # Crop to the same region used during training
-    cropped_img = img[CROP_Y:CROP_Y + CROP_H, CROP_X:CROP_X + CROP_W]
-
-    # Resize to the model's expected input dimensions (width, height)
-    cropped_img = cv2.resize(cropped_img, (CROP_W, CROP_H))
-
-    # Normalize pixel values to [0, 1]
-    cropped_img = cropped_img.astype(np.float32) / 255.0
-
-    # Add a batch dimension so shape is (1, height, width, channels)
-    return np.expand_dims(cropped_img, axis=0)
+    # Crop, resize to the model input, convert to RGB and normalize
+    return preprocessor.prepare_one(img)
 
 def predict(image_path: str) -> None:
     """
@@ -83,7 +111,7 @@ def predict(image_path: str) -> None:
         return
 
     # Run the model prediction (sigmoid output)
-    score = model.predict(img_tensor, verbose=0)[0][0]
+    score = get_model().predict_on_batch(img_tensor)[0][0]
 
     # Interpret probability threshold 0.5
     if score < 0.5:
@@ -91,21 +119,157 @@ def predict(image_path: str) -> None:
     else:
         print("🚗  Spot is OCCUPIED")
 
+# -------------------------------------------------------------------
+# Batch mode
+# -------------------------------------------------------------------
+
+def expand_inputs(inputs):
+    """
+    Lazily expand command-line inputs into image paths.
+
+    Args:
+        inputs (list[str]): Files, directories, glob patterns or '-' for stdin.
+
+    Yields:
+        str: Image paths in a stable (sorted) order per input.
+    """
+    for item in inputs:
+        if item == '-':
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(item):
+            yield from sorted(glob.glob(item, recursive=True))
+        else:
+            yield item
+
+def iter_batches(paths, batch_size, pool, roi, prefetch=2):
+    """
+    Decode images in worker threads, keeping up to `prefetch` batches in
+    flight ahead of inference so decoding and the model overlap.
+
+    Yields:
+        list[tuple]: (path, future) pairs; each future resolves to an RGB
+        uint8 image or raises ValueError for unreadable files.
+    """
+    pending, chunk = deque(), []
+    for path in paths:
+        chunk.append((path, pool.submit(load_image, path, roi)))
+        if len(chunk) == batch_size:
+            pending.append(chunk)
+            chunk = []
+            if len(pending) > prefetch:
+                yield pending.popleft()
+    if chunk:
+        pending.append(chunk)
+    while pending:
+        yield pending.popleft()
+
+class ResultWriter:
+    """Streams one record per image as CSV or JSON Lines."""
+
+    FIELDS = ("path", "score", "label", "error")
+
+    def __init__(self, fmt, stream=sys.stdout):
+        self.fmt = fmt
+        self.stream = stream
+        if fmt == 'csv':
+            self.writer = csv.writer(stream)
+            self.writer.writerow(self.FIELDS)
+
+    def write(self, path, score=None, error=None):
+        label = None if score is None else ("empty" if score < 0.5 else "occupied")
+        score = None if score is None else round(float(score), 6)
+        if self.fmt == 'csv':
+            self.writer.writerow((path, "" if score is None else score, label or "", error or ""))
+        else:
+            record = {"path": path, "score": score, "label": label}
+            if error:
+                record["error"] = error
+            self.stream.write(json.dumps(record) + "\n")
+
+def predict_batch(inputs, fmt='csv', batch_size=BATCH_SIZE, workers=None, crop=True):
+    """
+    Classify many images with batched inference and stream the results.
+
+    Args:
+        inputs (list[str]): Files, directories, glob patterns or '-'.
+        fmt (str): 'csv' or 'jsonl'.
+        batch_size (int): Images per model call.
+        workers (int, optional): Decoder threads (default: CPU count).
+        crop (bool): Crop the ROI first; disable for already cropped images.
+    """
+    roi = (CROP_X, CROP_Y, CROP_W, CROP_H) if crop else None
+    batch_pre = Preprocessor(roi=None, max_batch=batch_size)
+    writer = ResultWriter(fmt)
+    done = failed = 0
+    start = time.perf_counter()
+
+    # Import TensorFlow and load the model while the first batches decode
+    loader = ThreadPoolExecutor(max_workers=1)
+    model_future = loader.submit(get_model)
+    loader.shutdown(wait=False)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for chunk in iter_batches(expand_inputs(inputs), batch_size, pool, roi):
+            ok = []
+            for path, future in chunk:
+                try:
+                    batch_pre.fill_rgb(len(ok), future.result())
+                    ok.append(path)
+                except Exception as e:
+                    writer.write(path, error=str(e))
+                    failed += 1
+
+            if ok:
+                scores = model_future.result().predict_on_batch(batch_pre.batch(len(ok)))
+                for path, score in zip(ok, scores[:, 0]):
+                    writer.write(path, score=score)
+                done += len(ok)
+            sys.stdout.flush()
+
+    elapsed = time.perf_counter() - start
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"✅ Classified {done} images ({failed} failed) in {elapsed:.2f}s "
+          f"({rate:.1f} img/s)", file=sys.stderr)
+
 def main():
     """
-    Parse command-line arguments and invoke prediction.
+    Parse command-line arguments and run single-image or batch prediction.
     Exits with usage instructions if input is invalid.
     """
-    if len(sys.argv) != 2:
-        print("Usage: python predict_model.py <path_to_image>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Classify parking spot images as EMPTY or OCCUPIED")
+    parser.add_argument('inputs', nargs='+',
+                        help="Image files, directories, glob patterns, or '-' for stdin")
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help="Batch output format (default: csv)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, help="Decoder threads")
+    parser.add_argument('--no-crop', action='store_true',
+                        help="Inputs are already cropped to the parking spot")
+    args = parser.parse_args()
 
-    image_path = sys.argv[1]
-    if not os.path.isfile(image_path):
-        print(f"❌ Error: '{image_path}' does not exist or is not a file.")
-        sys.exit(1)
+    # A single plain file without batch options keeps the original output
+    single = (len(args.inputs) == 1 and args.format is None and not args.no_crop
+              and args.inputs[0] != '-' and not os.path.isdir(args.inputs[0])
+              and not glob.has_magic(args.inputs[0]))
+    if single:
+        image_path = args.inputs[0]
+        if not os.path.isfile(image_path):
+            print(f"❌ Error: '{image_path}' does not exist or is not a file.")
+            sys.exit(1)
+        predict(image_path)
+        return
 
-    predict(image_path)
+    predict_batch(args.inputs, fmt=args.format or 'csv', batch_size=args.batch_size,
+                  workers=args.workers, crop=not args.no_crop)
 
 if __name__ == "__main__":
     main()
@@ -3,139 +3,309 @@ train_model.py
 
 Retrains a convolutional neural network to classify parking spot images
 as 'empty' or 'occupied', using data augmentation and early stopping.
-Loads images from a directory structured by class labels, applies preprocessing,
-builds and trains a TensorFlow Keras model, and saves the trained model to disk.
+Loads images from a directory structured by class labels through a
+streaming tf.data pipeline, builds and trains a TensorFlow Keras model,
+and saves the trained model to disk.
+
+Input pipeline:
+    - JPEGs are decoded and resized in parallel (num_parallel_calls=AUTOTUNE)
+      with the shared preprocessing module used for live inference
+    - Decoded uint8 tensors are cached in memory or in an on-disk cache file,
+      so only the first epoch pays for decoding
+    - Augmentation runs as vectorized Keras preprocessing layers on whole batches
+    - Shuffling is seeded and the next batch is prefetched while training
+
+With --packed, batches are gathered from the memory-mapped shards written
+by pack_dataset.py instead of decoding the JPEGs.
 
 Usage:
-    python train_model.py
+    python train_model.py [--cache memory|disk|none] [--epochs N] [--packed [DIR]]
 
 Outputs:
     - ml_model/parking_model.h5 : Saved Keras model for inference in camera_predict.py
 """
 
+import argparse
+import hashlib
 import os
+import sys
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import EarlyStopping
+from pack_dataset import PACKED_PATH, PackedDataset
+
+# Allow importing shared modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import preprocessing  # noqa: E402
 
 # -------------------------------------------------------------------
 # Configuration: paths and hyperparameters
 # -------------------------------------------------------------------
 DATASET_PATH = 'cropped_dataset'   # Root folder with subfolders for 'empty' and 'occupied'
-IMG_WIDTH    = 360                 # Width of input images (pixels)
-IMG_HEIGHT   = 102                 # Height of input images (pixels)
+CACHE_DIR    = 'ml_model/.cache'   # Location of on-disk decode caches (--cache disk)
+IMG_WIDTH    = preprocessing.IMG_WIDTH    # Width of input images (pixels)
+IMG_HEIGHT   = preprocessing.IMG_HEIGHT   # Height of input images (pixels)
 BATCH_SIZE   = 32                  # Number of images per gradient update
 EPOCHS       = 20                  # Maximum number of training epochs
+VALIDATION_SPLIT = 0.2             # Fraction of each class reserved for validation
+SEED         = 123                 # Seed for shuffling and augmentation
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+AUTOTUNE = tf.data.AUTOTUNE
 
 # -------------------------------------------------------------------
-# Data Augmentation and Preprocessing
+# Dataset listing and splitting
 # -------------------------------------------------------------------
-# Apply random transformations to increase training robustness
-train_datagen = ImageDataGenerator(
-    rescale=1.0 / 255,            # Normalize pixel values to [0,1]
-    validation_split=0.2,         # Reserve 20% of data for validation
-    rotation_range=20,            # Random rotations up to 20°
-    width_shift_range=0.2,        # Horizontal shifts up to 20%
-    height_shift_range=0.2,       # Vertical shifts up to 20%
-    zoom_range=0.3,               # Zoom in/out up to 30%
-    brightness_range=[0.5, 1.5],  # Random brightness adjustments
-    shear_range=0.2,              # Random shear transformations
-    horizontal_flip=True,         # Random horizontal flips
-    fill_mode='nearest'           # Fill empty pixels after transform
-)
-
-# Only rescaling for validation set
-val_datagen = ImageDataGenerator(
-    rescale=1.0 / 255,
-    validation_split=0.2
-)
-
-# Load training dataset from directory with subfolders for each class
-train_ds = train_datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(IMG_HEIGHT, IMG_WIDTH),  # Resize images to model input size
-    batch_size=BATCH_SIZE,
-    class_mode='binary',                  # Two classes: empty vs. occupied
-    subset='training',
-    seed=123                              # Seed for reproducibility
-)
-
-# Load validation dataset
-val_ds = val_datagen.flow_from_directory(
-    DATASET_PATH,
-    target_size=(IMG_HEIGHT, IMG_WIDTH),
-    batch_size=BATCH_SIZE,
-    class_mode='binary',
-    subset='validation',
-    seed=123
-)
+
+def list_dataset(dataset_path):
+    """
+    Collect image paths and binary labels from the class subfolders.
+
+    Class indices follow the sorted subfolder names (empty=0, occupied=1),
+    the same order flow_from_directory used, so the model's sigmoid output
+    keeps its meaning.
+
+    Returns:
+        tuple: (train_paths, train_labels, val_paths, val_labels, class_names)
+    """
+    class_names = sorted(d for d in os.listdir(dataset_path)
+                         if os.path.isdir(os.path.join(dataset_path, d)))
+    train_paths, train_labels, val_paths, val_labels = [], [], [], []
+
+    for label, name in enumerate(class_names):
+        folder = os.path.join(dataset_path, name)
+        files = sorted(f for f in os.listdir(folder)
+                       if f.lower().endswith(IMAGE_EXTENSIONS))
+        # Deterministic split: the first VALIDATION_SPLIT of every class
+        split = int(len(files) * VALIDATION_SPLIT)
+        for i, filename in enumerate(files):
+            path = os.path.join(folder, filename)
+            if i < split:
+                val_paths.append(path)
+                val_labels.append(label)
+            else:
+                train_paths.append(path)
+                train_labels.append(label)
+
+    return train_paths, train_labels, val_paths, val_labels, class_names
+
+def cache_key(paths):
+    """
+    Fingerprint a file list (names, sizes and modification times) so an
+    on-disk cache is rebuilt automatically whenever the dataset changes.
+    """
+    digest = hashlib.sha1(f"{IMG_WIDTH}x{IMG_HEIGHT}".encode())
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
 
 # -------------------------------------------------------------------
-# Model Architecture
+# tf.data pipeline
 # -------------------------------------------------------------------
-model = keras.Sequential([
-    # Input layer expecting images of shape (IMG_HEIGHT, IMG_WIDTH, 3)
-    layers.Input(shape=(IMG_HEIGHT, IMG_WIDTH, 3)),
 
-    # Convolutional block 1
-    layers.Conv2D(32, (3, 3), activation='relu'),
-    layers.MaxPooling2D(),
+def decode_and_resize(path, label):
+    """
+    Read one image file and resize it to the model input as uint8 RGB.
 
-    # Convolutional block 2
-    layers.Conv2D(64, (3, 3), activation='relu'),
-    layers.MaxPooling2D(),
+    Decoding goes through preprocessing.load_image, the exact code path
+    used at inference time. OpenCV releases the GIL, so the parallel map
+    still decodes on several cores.
+    """
+    image = tf.numpy_function(lambda p: preprocessing.load_image(p.decode()), [path], tf.uint8)
+    image.set_shape((IMG_HEIGHT, IMG_WIDTH, 3))
+    return image, label
 
-    # Convolutional block 3
-    layers.Conv2D(128, (3, 3), activation='relu'),
-    layers.MaxPooling2D(),
+def build_augmentation():
+    """
+    Vectorized augmentation roughly matching the old ImageDataGenerator
+    settings (rotation, shifts, zoom, horizontal flip). Brightness is
+    applied separately in augment_batch as a multiplicative factor.
+    """
+    return keras.Sequential([
+        layers.RandomRotation(20 / 360, fill_mode='nearest', seed=SEED),
+        layers.RandomTranslation(0.2, 0.2, fill_mode='nearest', seed=SEED),
+        layers.RandomZoom(0.3, fill_mode='nearest', seed=SEED),
+        layers.RandomFlip('horizontal', seed=SEED),
+    ], name='augmentation')
 
-    # Flatten feature maps to a 1D vector
-    layers.Flatten(),
+def make_dataset(paths, labels, training, cache):
+    """
+    Build a batched, prefetched tf.data pipeline from image files.
 
-    # Dropout for regularization
-    layers.Dropout(0.4),
+    Args:
+        paths (list[str]): Image file paths.
+        labels (list[int]): Binary labels aligned with paths.
+        training (bool): Shuffle and augment when True.
+        cache (str): 'memory', 'disk' or 'none'.
 
-    # Fully connected layer
-    layers.Dense(128, activation='relu'),
+    Returns:
+        tf.data.Dataset: Yields (float32 images in [0, 1], float32 labels).
+    """
+    ds = tf.data.Dataset.from_tensor_slices((paths, tf.cast(labels, tf.float32)))
+    ds = ds.map(decode_and_resize, num_parallel_calls=AUTOTUNE, deterministic=True)
 
-    # Output layer with sigmoid for binary classification
-    layers.Dense(1, activation='sigmoid')
-])
+    # Cache the decoded uint8 tensors (a quarter of the float32 size)
+    if cache == 'memory':
+        ds = ds.cache()
+    elif cache == 'disk':
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        subset = 'train' if training else 'val'
+        ds = ds.cache(os.path.join(CACHE_DIR, f"{subset}_{cache_key(paths)}"))
 
-# -------------------------------------------------------------------
-# Compile Model
-# -------------------------------------------------------------------
-model.compile(
-    optimizer='adam',               # Adaptive learning rate optimization
-    loss='binary_crossentropy',     # Suitable for binary classification
-    metrics=['accuracy']            # Track accuracy during training
-)
+    if training:
+        ds = ds.shuffle(len(paths), seed=SEED, reshuffle_each_iteration=True)
 
-# -------------------------------------------------------------------
-# Callbacks
-# -------------------------------------------------------------------
-# Stop training early if validation loss does not improve for 3 epochs
-early_stop = EarlyStopping(
-    monitor='val_loss',
-    patience=3,
-    restore_best_weights=True
-)
+    return finish_batches(ds.batch(BATCH_SIZE), training)
+
+def make_packed_dataset(packed, indices, training):
+    """
+    Build the same pipeline on top of pre-decoded shards (see pack_dataset.py).
+
+    Only row indices flow through tf.data; each batch is gathered straight
+    from the memory-mapped shards, so no JPEG is decoded at all.
+
+    Args:
+        packed (PackedDataset): Opened packed dataset.
+        indices (np.ndarray): Rows belonging to this subset.
+        training (bool): Shuffle and augment when True.
+
+    Returns:
+        tf.data.Dataset: Yields (float32 images in [0, 1], float32 labels).
+    """
+    def gather(batch_indices):
+        images, labels = packed.take(batch_indices)
+        return images, labels.astype('float32')
+
+    def load_batch(batch_indices):
+        images, labels = tf.numpy_function(gather, [batch_indices], (tf.uint8, tf.float32))
+        images.set_shape((None, IMG_HEIGHT, IMG_WIDTH, 3))
+        labels.set_shape((None,))
+        return images, labels
+
+    ds = tf.data.Dataset.from_tensor_slices(indices)
+    if training:
+        ds = ds.shuffle(len(indices), seed=SEED, reshuffle_each_iteration=True)
+    ds = ds.batch(BATCH_SIZE).map(load_batch, num_parallel_calls=AUTOTUNE, deterministic=True)
+    return finish_batches(ds, training)
+
+def finish_batches(ds, training):
+    """
+    Turn batches of uint8 images into model input: augment (training only),
+    scale to [0, 1] and prefetch.
+    """
+    if training:
+        augmentation = build_augmentation()
+
+        def augment_batch(images, labels):
+            images = tf.cast(images, tf.float32)
+            images = augmentation(images, training=True)
+            # Random brightness in [0.5, 1.5], one factor per image
+            factors = tf.random.uniform((tf.shape(images)[0], 1, 1, 1), 0.5, 1.5, seed=SEED)
+            images = tf.clip_by_value(images * factors, 0.0, 255.0)
+            return images * preprocessing.SCALE, labels
+
+        ds = ds.map(augment_batch, num_parallel_calls=AUTOTUNE)
+    else:
+        ds = ds.map(lambda images, labels: (tf.cast(images, tf.float32) * preprocessing.SCALE,
+                                            labels),
+                    num_parallel_calls=AUTOTUNE)
+
+    return ds.prefetch(AUTOTUNE)
 
 # -------------------------------------------------------------------
-# Train Model
+# Model Architecture
 # -------------------------------------------------------------------
-history = model.fit(
-    train_ds,                       # Training data generator
-    validation_data=val_ds,         # Validation data generator
-    epochs=EPOCHS,
-    callbacks=[early_stop]          # Early stopping callback
-)
+
+def build_model():
+    """Build and compile the CNN classifier."""
+    model = keras.Sequential([
+        # Input layer expecting images of shape (IMG_HEIGHT, IMG_WIDTH, 3)
+        layers.Input(shape=(IMG_HEIGHT, IMG_WIDTH, 3)),
+
+        # Convolutional block 1
+        layers.Conv2D(32, (3, 3), activation='relu'),
+        layers.MaxPooling2D(),
+
+        # Convolutional block 2
+        layers.Conv2D(64, (3, 3), activation='relu'),
+        layers.MaxPooling2D(),
+
+        # Convolutional block 3
+        layers.Conv2D(128, (3, 3), activation='relu'),
+        layers.MaxPooling2D(),
+
+        # Flatten feature maps to a 1D vector
+        layers.Flatten(),
+
+        # Dropout for regularization
+        layers.Dropout(0.4),
+
+        # Fully connected layer
+        layers.Dense(128, activation='relu'),
+
+        # Output layer with sigmoid for binary classification
+        layers.Dense(1, activation='sigmoid')
+    ])
+
+    model.compile(
+        optimizer='adam',               # Adaptive learning rate optimization
+        loss='binary_crossentropy',     # Suitable for binary classification
+        metrics=['accuracy']            # Track accuracy during training
+    )
+    return model
 
 # -------------------------------------------------------------------
-# Save Trained Model
+# Train and Save
 # -------------------------------------------------------------------
-os.makedirs('ml_model', exist_ok=True)             # Ensure output folder exists
-model.save('ml_model/parking_model.h5')            # Persist model for inference
-print("✅ Model retrained and saved to 'ml_model/parking_model.h5'")
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain the parking spot classifier")
+    parser.add_argument('--cache', choices=('memory', 'disk', 'none'), default='memory',
+                        help="Where to cache decoded images between epochs")
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--packed', nargs='?', const=PACKED_PATH,
+                        help="Read pre-decoded shards written by pack_dataset.py "
+                             f"(default folder: {PACKED_PATH})")
+    args = parser.parse_args()
+
+    # Seed Python, NumPy and TensorFlow for reproducible runs
+    keras.utils.set_random_seed(SEED)
+
+    if args.packed:
+        packed = PackedDataset(args.packed)
+        train_idx, val_idx = packed.split(VALIDATION_SPLIT)
+        print(f"📦 Using {len(train_idx)} training and {len(val_idx)} validation "
+              f"packed images in classes {packed.class_names}")
+        train_ds = make_packed_dataset(packed, train_idx, training=True)
+        val_ds = make_packed_dataset(packed, val_idx, training=False)
+    else:
+        train_paths, train_labels, val_paths, val_labels, class_names = list_dataset(DATASET_PATH)
+        print(f"📂 Found {len(train_paths)} training and {len(val_paths)} validation "
+              f"images in classes {class_names}")
+        train_ds = make_dataset(train_paths, train_labels, training=True, cache=args.cache)
+        val_ds = make_dataset(val_paths, val_labels, training=False, cache=args.cache)
+
+    model = build_model()
+
+    # Stop training early if validation loss does not improve for 3 epochs
+    early_stop = EarlyStopping(
+        monitor='val_loss',
+        patience=3,
+        restore_best_weights=True
+    )
+
+    model.fit(
+        train_ds,                       # Training tf.data pipeline
+        validation_data=val_ds,         # Validation tf.data pipeline
+        epochs=args.epochs,
+        callbacks=[early_stop]          # Early stopping callback
+    )
+
+    os.makedirs('ml_model', exist_ok=True)             # Ensure output folder exists
+    model.save('ml_model/parking_model.h5')            # Persist model for inference
+    print("✅ Model retrained and saved to 'ml_model/parking_model.h5'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+pipeline_stats.py
+
+Lightweight per-stage timing collector for the camera prediction pipeline.
+
+Keeps a rolling window of durations for each pipeline stage (capture,
+preprocess, inference, server round-trip, imwrite, ...), tracks achieved
+versus target frames per second and dropped frames, and produces both a
+compact one-line report for the console and a JSON-serializable snapshot
+that camera_predict.py forwards to the ParkingServer.
+
+Classes:
+    PipelineStats: Thread-safe rolling stage timer and FPS tracker.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, pct):
+    """
+    Return the nearest-rank percentile of an already sorted sequence.
+
+    Args:
+        sorted_values (list[float]): Values sorted in ascending order.
+        pct (float): Percentile to compute, between 0 and 100.
+
+    Returns:
+        float: The percentile value, or 0.0 for an empty sequence.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+class PipelineStats:
+    """
+    Rolling timing statistics for a frame-processing pipeline.
+
+    Durations are kept per stage in fixed-size windows so that the
+    reported percentiles always describe recent behaviour. All methods
+    are safe to call from several threads (e.g. a capture thread that
+    counts dropped frames while the main loop times inference).
+
+    Attributes:
+        target_fps (float or None): Frame rate the pipeline is supposed to reach.
+        window (int): Number of samples kept per stage and for FPS estimation.
+        report_interval (float): Seconds between two periodic reports.
+    """
+
+    def __init__(self, target_fps=None, window=120, report_interval=30.0):
+        """
+        Initialize an empty statistics collector.
+
+        Args:
+            target_fps (float, optional): Desired frames per second.
+            window (int): Rolling window size (samples per stage).
+            report_interval (float): Seconds between periodic reports.
+        """
+        self.target_fps = target_fps
+        self.window = window
+        self.report_interval = report_interval
+
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._frame_times = deque(maxlen=window)
+        self._frames = 0
+        self._dropped = 0
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    # ---------------------------------------------------------------
+    # Recording
+    # ---------------------------------------------------------------
+
+    def record(self, stage, seconds):
+        """
+        Add one duration sample for a stage.
+
+        Args:
+            stage (str): Stage name (e.g. 'capture', 'inference').
+            seconds (float): Measured duration in seconds.
+        """
+        with self._lock:
+            samples = self._stages.get(stage)
+            if samples is None:
+                samples = self._stages[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager that times the enclosed block as one stage sample.
+
+        Example:
+            with stats.stage("inference"):
+                score = model.predict(batch)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def frame_done(self):
+        """Mark one frame as fully processed (used for achieved FPS)."""
+        with self._lock:
+            self._frames += 1
+            self._frame_times.append(time.monotonic())
+
+    def frame_dropped(self, count=1):
+        """
+        Count frames that were captured (or expected) but never processed.
+
+        Args:
+            count (int): Number of dropped frames to add.
+        """
+        with self._lock:
+            self._dropped += count
+
+    # ---------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------
+
+    def achieved_fps(self):
+        """
+        Estimate the current processing rate from the recent frame window.
+
+        Returns:
+            float: Frames per second over the rolling window.
+        """
+        with self._lock:
+            return self._achieved_fps_locked()
+
+    def _achieved_fps_locked(self):
+        if len(self._frame_times) < 2:
+            return 0.0
+        span = self._frame_times[-1] - self._frame_times[0]
+        return (len(self._frame_times) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        """
+        Build a JSON-serializable summary of the current statistics.
+
+        Returns:
+            dict: Frame counters, FPS figures and per-stage percentiles in
+            milliseconds, e.g. ``{"fps": 0.98, "stages": {"inference":
+            {"p50_ms": 41.2, ...}}}``.
+        """
+        with self._lock:
+            fps = self._achieved_fps_locked()
+            stages = {}
+            for name, samples in self._stages.items():
+                ordered = sorted(samples)
+                stages[name] = {
+                    "count": len(ordered),
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                    "p90_ms": round(percentile(ordered, 90) * 1000, 2),
+                    "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+                    "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+                }
+            frames, dropped = self._frames, self._dropped
+            uptime = time.monotonic() - self._started
+
+        saturated = bool(self.target_fps and frames > 1
+                         and fps < 0.9 * self.target_fps)
+        return {
+            "frames": frames,
+            "dropped": dropped,
+            "fps": round(fps, 2),
+            "target_fps": self.target_fps,
+            "saturated": saturated,
+            "uptime_s": round(uptime, 1),
+            "stages": stages,
+        }
+
+    def format_compact(self, snapshot=None):
+        """
+        Render a snapshot as a single human-readable log line.
+
+        Args:
+            snapshot (dict, optional): Result of snapshot(); taken now if omitted.
+
+        Returns:
+            str: e.g. ``"0.97/1.00 fps | dropped 0 | capture 3.1/5.0ms | ..."``
+            where each stage shows p50/p99.
+        """
+        snap = snapshot or self.snapshot()
+        target = f"{snap['target_fps']:.2f}" if snap["target_fps"] else "-"
+        parts = [f"{snap['fps']:.2f}/{target} fps",
+                 f"frames {snap['frames']}",
+                 f"dropped {snap['dropped']}"]
+        for name, s in snap["stages"].items():
+            parts.append(f"{name} {s['p50_ms']:.1f}/{s['p99_ms']:.1f}ms")
+        if snap["saturated"]:
+            parts.append("SATURATED")
+        return " | ".join(parts)
+
+    def report_due(self):
+        """
+        Check whether the periodic report interval has elapsed.
+
+        Returns:
+            bool: True at most once per report_interval seconds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_report < self.report_interval:
+                return False
+            self._last_report = now
+            return True
@@ -0,0 +1,205 @@
+"""
+preprocessing.py
+
+Single source of truth for turning camera frames or image files into
+model input for the parking spot classifier. Used by camera_predict.py,
+ml_model/predict_model.py, ml_model/train_model.py and the dataset tools,
+so training and inference can never disagree on size, colour order or
+scaling.
+
+Model input contract:
+    - Region of interest cropped from the full frame (crops are views, not copies)
+    - Resized to IMG_WIDTH x IMG_HEIGHT with bilinear interpolation
+    - RGB channel order (OpenCV decodes BGR, training images are RGB)
+    - float32 scaled to [0, 1]
+
+Classes:
+    Preprocessor: Batch preprocessing into preallocated float32 buffers.
+"""
+
+import cv2
+import numpy as np
+
+# -------------------------------------------------------------------
+# Model input geometry
+# -------------------------------------------------------------------
+
+# Image dimensions the model was trained on (width, height)
+IMG_WIDTH  = 360
+IMG_HEIGHT = 102
+
+# Default region of interest in a full camera frame: (x, y, width, height)
+DEFAULT_ROI = (140, 250, 360, 180)
+
+# Frame size (width, height) that ROI coordinates refer to
+ROI_FRAME_SIZE = (640, 480)
+
+# Pixel scaling factor applied after resizing
+SCALE = np.float32(1.0 / 255.0)
+
+# -------------------------------------------------------------------
+# Single-image helpers
+# -------------------------------------------------------------------
+
+def crop(frame, roi):
+    """
+    Return the region of interest of a frame as a NumPy view (no copy).
+
+    Args:
+        frame (np.ndarray): Full BGR frame of shape (H, W, 3).
+        roi (tuple or None): (x, y, width, height); None returns the frame.
+
+    Returns:
+        np.ndarray: View of the cropped region.
+    """
+    if roi is None:
+        return frame
+    x, y, w, h = roi
+    return frame[y:y + h, x:x + w]
+
+def scale_roi(roi, frame_size, reference=ROI_FRAME_SIZE):
+    """
+    Map an ROI defined on a reference frame size onto another resolution,
+    e.g. when a camera sub-stream or a 4K main stream is used.
+
+    Args:
+        roi (tuple): (x, y, width, height) in reference coordinates.
+        frame_size (tuple): Actual (width, height) of the frames.
+        reference (tuple): (width, height) the ROI was defined for.
+
+    Returns:
+        tuple: Scaled (x, y, width, height) in integer pixels.
+    """
+    if tuple(frame_size) == tuple(reference):
+        return tuple(roi)
+    sx = frame_size[0] / reference[0]
+    sy = frame_size[1] / reference[1]
+    x, y, w, h = roi
+    return (int(round(x * sx)), int(round(y * sy)),
+            max(1, int(round(w * sx))), max(1, int(round(h * sy))))
+
+def to_model_rgb(image_bgr, out=None):
+    """
+    Resize a BGR image to the model input size and convert it to RGB uint8.
+
+    Args:
+        image_bgr (np.ndarray): BGR uint8 image of any size.
+        out (np.ndarray, optional): Preallocated (IMG_HEIGHT, IMG_WIDTH, 3) uint8 buffer.
+
+    Returns:
+        np.ndarray: RGB uint8 image of shape (IMG_HEIGHT, IMG_WIDTH, 3).
+    """
+    resized = cv2.resize(image_bgr, (IMG_WIDTH, IMG_HEIGHT), interpolation=cv2.INTER_LINEAR)
+    if out is None:
+        return cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=out)
+    return out
+
+def load_image(path, roi=None):
+    """
+    Read an image file and convert it to model-sized RGB uint8.
+
+    Args:
+        path (str): Image file path.
+        roi (tuple, optional): Region to crop before resizing.
+
+    Returns:
+        np.ndarray: RGB uint8 image of shape (IMG_HEIGHT, IMG_WIDTH, 3).
+
+    Raises:
+        ValueError: If the image cannot be read or the ROI is outside it.
+    """
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"❌ Error loading image: {path}")
+    region = crop(image, roi)
+    if region.size == 0:
+        raise ValueError(f"❌ ROI {roi} is outside image {path} of size "
+                         f"{image.shape[1]}x{image.shape[0]}")
+    return to_model_rgb(region)
+
+# -------------------------------------------------------------------
+# Batch preprocessing
+# -------------------------------------------------------------------
+
+class Preprocessor:
+    """
+    Converts batches of frames into model input without per-frame
+    allocations.
+
+    The float32 batch buffer and the uint8 scratch images are allocated
+    once; every call crops views, resizes into the scratch buffer,
+    converts BGR to RGB and scales straight into the batch slot.
+    The returned array is a view of the internal buffer and is
+    overwritten by the next call.
+
+    Attributes:
+        roi (tuple or None): Default region of interest, None for pre-cropped input.
+        max_batch (int): Capacity of the preallocated batch buffer.
+    """
+
+    def __init__(self, roi=DEFAULT_ROI, max_batch=1):
+        """
+        Allocate the reusable buffers.
+
+        Args:
+            roi (tuple or None): Default (x, y, width, height) crop.
+            max_batch (int): Largest batch prepare() will be called with.
+        """
+        self.roi = roi
+        self.max_batch = max_batch
+        self._batch = np.empty((max_batch, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        self._bgr = np.empty((IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.uint8)
+        self._rgb = np.empty((IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.uint8)
+
+    def _ensure_capacity(self, count):
+        if count > self.max_batch:
+            self.max_batch = count
+            self._batch = np.empty((count, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+
+    def prepare(self, frames, roi=None):
+        """
+        Preprocess a sequence of BGR frames into one float32 batch.
+
+        Args:
+            frames (Sequence[np.ndarray]): BGR uint8 frames.
+            roi (tuple, optional): Crop override for this call.
+
+        Returns:
+            np.ndarray: View of shape (len(frames), IMG_HEIGHT, IMG_WIDTH, 3).
+        """
+        self._ensure_capacity(len(frames))
+        for i, frame in enumerate(frames):
+            self.fill(i, frame, roi)
+        return self._batch[:len(frames)]
+
+    def prepare_one(self, frame, roi=None):
+        """Preprocess a single frame into a batch of one (see prepare())."""
+        self.fill(0, frame, roi)
+        return self._batch[:1]
+
+    def fill(self, index, frame, roi=None):
+        """
+        Preprocess one frame into slot `index` of the batch buffer.
+
+        Useful when frames arrive one at a time and the caller assembles
+        the batch itself via batch(count). Not thread-safe: the scratch
+        buffers are shared, so call it from one thread only.
+        """
+        roi = self.roi if roi is None else roi
+        cv2.resize(crop(frame, roi), (IMG_WIDTH, IMG_HEIGHT), dst=self._bgr,
+                   interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        np.multiply(self._rgb, SCALE, out=self._batch[index])
+
+    def fill_rgb(self, index, image_rgb):
+        """Scale an already model-sized RGB uint8 image into slot `index`."""
+        np.multiply(image_rgb, SCALE, out=self._batch[index])
+
+    def reserve(self, count):
+        """Grow the batch buffer (discarding its content) to hold `count` frames."""
+        self._ensure_capacity(count)
+
+    def batch(self, count):
+        """Return a view of the first `count` prepared slots."""
+        return self._batch[:count]
@@ -0,0 +1,490 @@
+"""
+protocol.py
+
+Framed, encrypted transport between the ParkingServer and its clients.
+
+The legacy wire format sends one AES-CTR ciphertext per request with no
+length prefix and a fixed nonce, and answers with a 4-byte length
+followed by the ciphertext. This module implements its successor:
+
+    hello     client -> server: MAGIC, 2-byte length, JSON options
+              ({"version", "ciphers": [...], "random": hex,
+                "codecs": [...], "compression": [...]})
+              server -> client: MAGIC, 2-byte length, JSON choices
+              ({"version", "cipher", "random": hex, "codec", "compression"})
+    frame     4-byte big-endian length of what follows,
+              nonce (8 bytes), ciphertext, tag (16 bytes, GCM only)
+
+The cipher is negotiated in the hello (see aes_cipher.py):
+    gcm   AES-GCM under per-connection keys derived with HKDF from the
+          shared key, both randoms and a hash of both hello messages;
+          counter nonces, and the frame header is authenticated with
+          the payload
+
+The hello itself travels in the clear. Because the exact bytes of both
+hellos go into the key derivation, a hello changed on the way (e.g. a
+cipher or codec removed from the client's lists) gives the two sides
+different keys, and the first frame fails authentication. The
+unauthenticated AES-CTR mode is only used by legacy clients.
+
+Message bodies are encoded with the serializer and compression agreed
+in the hello (see serializers.py); clients that offer none get plain
+JSON.
+
+The server tells the two formats apart by the full MAGIC at the start
+of a connection (see is_hello()). The legacy path assumes no legacy
+request starts with those four bytes: plain JSON starts with '{' or
+whitespace, and the fixed-nonce ciphertext of a request has the same
+first bytes for a given key (keystream XOR '{"ac'), which match MAGIC
+for about one key in 2**32. Any single byte, NUL included, can start a
+legacy ciphertext under some PARKSCOUT_AES_KEY, so one byte is not
+enough.
+
+Every message has its own nonce. A frame goes out in a single
+sendall() (header and body encrypted straight into one reusable
+buffer), which avoids the Nagle/delayed-ACK stall of writing the header
+and body separately. Payloads above STREAM_THRESHOLD are encrypted and
+sent in STREAM_CHUNK pieces instead of being copied whole, and received
+in pieces that are decrypted as soon as they arrive.
+
+Classes:
+    Channel: One framed, encrypted connection.
+    ProtocolError: Malformed hello or frame.
+
+Functions:
+    connect:      Open a connection and perform the client hello.
+    is_hello:     Check whether a connection starts with the framed protocol.
+    server_hello: Answer a client hello and return the Channel.
+"""
+
+import hashlib
+import json
+import socket
+import struct
+
+from Cryptodome.Random import get_random_bytes
+
+from aes_cipher import AES_KEY, GcmSessionCipher, derive_session_keys
+from serializers import COMPRESSIONS, SERIALIZERS, Codec, preferred_serializers
+
+# First bytes of a hello (see the module docstring for the legacy format)
+MAGIC = b"\x00PSC"
+VERSION = 1
+
+# Ciphers in order of preference. Only authenticated AES-GCM with
+# per-connection keys: an unauthenticated mode on offer would let an
+# attacker downgrade the connection to it
+CIPHERS = ("gcm",)
+
+# Length of the random value each side contributes to the session keys
+RANDOM_SIZE = 16
+
+_HELLO = struct.Struct(">H")
+_LENGTH = struct.Struct(">I")
+
+# Frames larger than this are rejected (protects against garbage lengths)
+MAX_FRAME = 64 * 1024 * 1024
+
+# Payloads above the threshold are encrypted and sent in chunks
+STREAM_THRESHOLD = 256 * 1024
+STREAM_CHUNK = 64 * 1024
+
+class ProtocolError(ValueError):
+    """Raised on a malformed hello or frame."""
+
+class Channel:
+    """
+    Framed, encrypted message channel over a connected socket.
+
+    Not thread-safe: one request/response exchange at a time.
+
+    Attributes:
+        sock (socket.socket): The connected socket.
+        cipher (GcmSessionCipher): Negotiated cipher.
+        options (dict): Parameters agreed in the hello.
+        codec (Codec): Message encoding agreed in the hello.
+    """
+
+    def __init__(self, sock, cipher, options=None):
+        """
+        Args:
+            sock (socket.socket): Connected socket (hello already exchanged).
+            cipher (GcmSessionCipher): Cipher for both directions.
+            options (dict, optional): Negotiated hello parameters.
+        """
+        self.sock = sock
+        self.cipher = cipher
+        self.options = options or {}
+        self.codec = Codec.from_options(self.options)
+        self._header_size = _LENGTH.size + cipher.nonce_size
+        self._overhead = cipher.nonce_size + cipher.tag_size
+        self._send_buf = bytearray(4096)
+        self._recv_buf = bytearray(4096)
+        try:
+            # Request/response traffic: never hold back a small frame
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+    # ---------------------------------------------------------------
+    # Sending
+    # ---------------------------------------------------------------
+
+    def _header(self, buf, length, nonce):
+        _LENGTH.pack_into(buf, 0, self._overhead + length)
+        buf[_LENGTH.size:self._header_size] = nonce
+
+    def send(self, payload):
+        """
+        Encrypt and send one message.
+
+        Args:
+            payload (bytes-like): Plaintext message.
+        """
+        size = len(payload)
+        if size > STREAM_THRESHOLD:
+            payload = memoryview(payload)
+            self.send_stream((payload[i:i + STREAM_CHUNK]
+                              for i in range(0, size, STREAM_CHUNK)), size)
+            return
+
+        total = self._header_size + size + self.cipher.tag_size
+        if len(self._send_buf) < total:
+            self._send_buf = bytearray(max(total, 2 * len(self._send_buf)))
+        view = memoryview(self._send_buf)
+        nonce = self.cipher.new_nonce()
+        self._header(view, size, nonce)
+        # The header is authenticated (GCM) as associated data
+        self.cipher.encrypt_into(nonce, payload, view[self._header_size:total],
+                                 view[:self._header_size])
+        self.sock.sendall(view[:total])
+
+    def send_stream(self, chunks, length):
+        """
+        Send one message of known length from an iterable of chunks.
+
+        Each chunk is encrypted into a reusable buffer and written
+        immediately, so the whole plaintext never has to be in memory.
+
+        Args:
+            chunks (iterable): bytes-like pieces of the message.
+            length (int): Total length of all chunks.
+
+        Raises:
+            ProtocolError: If the chunks do not add up to `length`.
+        """
+        nonce = self.cipher.new_nonce()
+        header = bytearray(self._header_size)
+        self._header(header, length, nonce)
+        self.sock.sendall(header)
+
+        encryptor = self.cipher.encryptor(nonce, header)
+        buf = memoryview(bytearray(STREAM_CHUNK))
+        sent = 0
+        for chunk in chunks:
+            chunk = memoryview(chunk)
+            for i in range(0, len(chunk), STREAM_CHUNK):
+                piece = chunk[i:i + STREAM_CHUNK]
+                out = buf[:len(piece)]
+                encryptor.update_into(piece, out)
+                self.sock.sendall(out)
+                sent += len(piece)
+        if sent != length:
+            raise ProtocolError(f"Stream sent {sent} bytes, announced {length}")
+        self.sock.sendall(encryptor.finalize())
+
+    # ---------------------------------------------------------------
+    # Receiving
+    # ---------------------------------------------------------------
+
+    def _recv_exact_into(self, view):
+        received = 0
+        while received < len(view):
+            n = self.sock.recv_into(view[received:])
+            if not n:
+                raise ConnectionError("Connection closed by peer")
+            received += n
+
+    def _read_header(self):
+        """Read a frame header; return (payload length, nonce, header) or None at EOF."""
+        header = bytearray(self._header_size)
+        view = memoryview(header)
+        n = self.sock.recv_into(view)
+        if not n:
+            return None
+        self._recv_exact_into(view[n:])
+        length = _LENGTH.unpack_from(header)[0] - self._overhead
+        if not 0 <= length <= MAX_FRAME:
+            raise ProtocolError(f"Invalid frame length {length}")
+        return length, bytes(header[_LENGTH.size:]), header
+
+    def _read_tag(self):
+        tag = bytearray(self.cipher.tag_size)
+        self._recv_exact_into(memoryview(tag))
+        return tag
+
+    def recv_stream(self, chunk_size=STREAM_CHUNK):
+        """
+        Receive one message piece by piece.
+
+        With an authenticated cipher the tag is only checked after the
+        last chunk; a forged message raises ValueError at the end of the
+        iteration, so act on the chunks only once it completes.
+
+        Yields:
+            memoryview: Decrypted chunks, valid until the next iteration
+            (the buffer is reused).
+
+        Raises:
+            ConnectionError: If the peer closed the connection.
+            ValueError: If the message fails authentication.
+        """
+        header = self._read_header()
+        if header is None:
+            raise ConnectionError("Connection closed by peer")
+        length, nonce, aad = header
+        decryptor = self.cipher.decryptor(nonce, aad)
+        raw = memoryview(bytearray(min(chunk_size, length) or 1))
+        buf = memoryview(bytearray(len(raw)))
+        remaining = length
+        while remaining:
+            n = self.sock.recv_into(raw[:min(remaining, len(raw))])
+            if not n:
+                raise ConnectionError("Connection closed by peer")
+            decryptor.update_into(raw[:n], buf[:n])
+            remaining -= n
+            yield buf[:n]
+        decryptor.finalize(self._read_tag())
+
+    def recv(self):
+        """
+        Receive and decrypt one message.
+
+        Small frames are read into a reusable buffer and decrypted in one
+        call; large ones are decrypted piece by piece as they arrive.
+
+        Returns:
+            bytearray or None: The plaintext, or None if the peer closed
+            the connection between messages.
+
+        Raises:
+            ConnectionError: If the peer closed the connection mid-frame.
+            ProtocolError: On an invalid frame length.
+            ValueError: If the message fails authentication.
+        """
+        header = self._read_header()
+        if header is None:
+            return None
+        length, nonce, aad = header
+        data = bytearray(length)
+
+        if length > STREAM_THRESHOLD:
+            decryptor = self.cipher.decryptor(nonce, aad)
+            out = memoryview(data)
+            raw = memoryview(bytearray(STREAM_CHUNK))
+            received = 0
+            while received < length:
+                n = self.sock.recv_into(raw[:min(length - received, STREAM_CHUNK)])
+                if not n:
+                    raise ConnectionError("Connection closed by peer")
+                decryptor.update_into(raw[:n], out[received:received + n])
+                received += n
+            decryptor.finalize(self._read_tag())
+            return data
+
+        total = length + self.cipher.tag_size
+        if len(self._recv_buf) < total:
+            self._recv_buf = bytearray(max(total, 2 * len(self._recv_buf)))
+        body = memoryview(self._recv_buf)[:total]
+        self._recv_exact_into(body)
+        self.cipher.decrypt_into(nonce, body, data, aad)
+        return data
+
+    # ---------------------------------------------------------------
+    # Messages
+    # ---------------------------------------------------------------
+
+    def send_message(self, message):
+        """Encode a message (dict) with the agreed codec and send it."""
+        self.send(self.codec.encode(message))
+
+    def recv_message(self):
+        """
+        Receive and decode one message.
+
+        Returns:
+            dict or None: The decoded object, or None at end of connection.
+
+        Raises:
+            ValueError: On a malformed or unauthenticated message.
+        """
+        data = self.recv()
+        return None if data is None else self.codec.decode(data)
+
+    def request(self, message):
+        """
+        Send a request and wait for its response.
+
+        Returns:
+            dict: Decoded response.
+
+        Raises:
+            ConnectionError: If the server closed the connection.
+        """
+        self.send_message(message)
+        response = self.recv_message()
+        if response is None:
+            raise ConnectionError("Connection closed by server")
+        return response
+
+    def close(self):
+        """Close the socket."""
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+# -------------------------------------------------------------------
+# Hello
+# -------------------------------------------------------------------
+
+def _send_hello(sock, options):
+    """Send a hello; return its bytes as sent (for the transcript)."""
+    body = json.dumps(options).encode("utf-8")
+    message = MAGIC + _HELLO.pack(len(body)) + body
+    sock.sendall(message)
+    return message
+
+def _recv_exact(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed during hello")
+        buf += chunk
+    return bytes(buf)
+
+def _recv_hello(sock):
+    """Receive a hello; return (options, its bytes as received)."""
+    head = _recv_exact(sock, len(MAGIC) + _HELLO.size)
+    if head[:len(MAGIC)] != MAGIC:
+        raise ProtocolError("Peer does not speak the framed protocol")
+    size = _HELLO.unpack_from(head, len(MAGIC))[0]
+    body = _recv_exact(sock, size)
+    try:
+        return json.loads(body), head + body
+    except ValueError as e:
+        raise ProtocolError(f"Invalid hello: {e}") from e
+
+def _random_from(hello):
+    try:
+        value = bytes.fromhex(hello["random"])
+    except (KeyError, TypeError, ValueError):
+        raise ProtocolError("Hello without a valid 'random' field") from None
+    if len(value) != RANDOM_SIZE:
+        raise ProtocolError("Hello 'random' has the wrong length")
+    return value
+
+def _session_cipher(key, client_hello, server_hello, server_side):
+    """
+    Build the GCM cipher of one side of the connection from both hellos
+    (their randoms, and a hash of their exact bytes as the transcript).
+    """
+    client_random = _random_from(json.loads(client_hello[len(MAGIC) + _HELLO.size:]))
+    server_random = _random_from(json.loads(server_hello[len(MAGIC) + _HELLO.size:]))
+    transcript = hashlib.sha256(client_hello + server_hello).digest()
+    c2s, s2c = derive_session_keys(key, client_random, server_random, transcript)
+    return GcmSessionCipher(s2c, c2s) if server_side else GcmSessionCipher(c2s, s2c)
+
+def is_hello(sock):
+    """
+    Check, without consuming anything, whether a freshly accepted
+    connection starts with a hello rather than a legacy request.
+
+    Returns:
+        bool: True if the connection starts with MAGIC. Also False if
+        the peer closed the connection before sending all of it.
+    """
+    peeked = sock.recv(len(MAGIC), socket.MSG_PEEK)
+    if peeked and len(peeked) < len(MAGIC) and MAGIC.startswith(peeked):
+        # Only part of the magic has arrived yet: wait for the rest
+        peeked = sock.recv(len(MAGIC), socket.MSG_PEEK | socket.MSG_WAITALL)
+    return peeked == MAGIC
+
+def connect(host, port, key=AES_KEY, timeout=None, ciphers=CIPHERS, codecs=None,
+            compression=COMPRESSIONS):
+    """
+    Open a framed connection to the ParkingServer.
+
+    Args:
+        host (str): Server address.
+        port (int): Server port.
+        key (bytes): Shared AES key.
+        timeout (float, optional): Socket timeout in seconds.
+        ciphers (tuple): Acceptable ciphers, most preferred first.
+        codecs (tuple, optional): Acceptable serializers, most preferred
+            first; default: serializers.preferred_serializers().
+        compression (tuple): Acceptable compressions; () for none.
+
+    Returns:
+        Channel: Ready-to-use channel.
+
+    Raises:
+        OSError: On connection errors.
+        ProtocolError: If the server rejected or did not understand the hello.
+    """
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        codecs = tuple(codecs or preferred_serializers())
+        sent = _send_hello(sock, {"version": VERSION, "ciphers": list(ciphers),
+                                  "random": get_random_bytes(RANDOM_SIZE).hex(),
+                                  "codecs": list(codecs), "compression": list(compression)})
+        reply, received = _recv_hello(sock)
+        if "error" in reply:
+            raise ProtocolError(f"Server refused the hello: {reply['error']}")
+        if (reply.get("version") != VERSION or reply.get("cipher") not in ciphers
+                or reply.get("codec", "json") not in codecs
+                or reply.get("compression") not in (None,) + tuple(compression)):
+            raise ProtocolError(f"Unsupported hello reply {reply}")
+        return Channel(sock, _session_cipher(key, sent, received, False), reply)
+    except Exception:
+        sock.close()
+        raise
+
+def server_hello(sock, key=AES_KEY, ciphers=CIPHERS, codecs=tuple(SERIALIZERS),
+                 compression=COMPRESSIONS):
+    """
+    Read a client hello, pick cipher and codec and answer it.
+
+    For each choice the first entry of the client's list that the server
+    accepts wins; clients that send no codec list get 'json' and no
+    compression. A client must offer a cipher.
+
+    Args:
+        sock (socket.socket): Accepted connection (see is_hello()).
+        key (bytes): Shared AES key.
+        ciphers (tuple): Ciphers the server accepts.
+        codecs (tuple): Serializers the server accepts.
+        compression (tuple): Compressions the server accepts.
+
+    Returns:
+        Channel: Server side of the connection.
+
+    Raises:
+        ProtocolError: On a malformed hello, an unsupported version or
+            no cipher in common.
+    """
+    hello, received = _recv_hello(sock)
+    chosen = next((c for c in hello.get("ciphers") or [] if c in ciphers), None)
+    codec = next((c for c in hello.get("codecs") or ["json"] if c in codecs), None)
+    if hello.get("version") != VERSION or chosen is None or codec is None:
+        _send_hello(sock, {"version": VERSION, "error": "unsupported version, cipher or codec"})
+        raise ProtocolError(f"Unsupported hello {hello}")
+
+    options = {"version": VERSION, "cipher": chosen, "codec": codec,
+               "compression": next((c for c in hello.get("compression") or [] if c in compression),
+                                   None)}
+    _random_from(hello)    # refuse a hello without a usable random before answering
+    options["random"] = get_random_bytes(RANDOM_SIZE).hex()
+    sent = _send_hello(sock, options)
+    return Channel(sock, _session_cipher(key, received, sent, True), options)
@@ -3,48 +3,184 @@ scan_cameras.py
 
 A simple script to detect connected webcams using OpenCV.
 
-This script attempts to open camera indices from 0 up to a specified maximum.
-For each index, it prints whether a camera is found and returns a list of successful indices.
+All camera indices from 0 up to a specified maximum are probed
+concurrently, each with its own timeout, so a device that blocks inside
+cv2.VideoCapture no longer stalls the whole scan. For every camera found
+the probe records its resolution, the FPS the driver reports, the FPS
+actually achieved while reading a few frames, and the capture backend.
+Results are written to a cached inventory file that camera_predict.py
+reads at startup instead of probing devices again.
+
+Usage:
+    python scan_cameras.py [--max-index N] [--timeout SECONDS] [--output FILE]
+
+Outputs:
+    - camera_inventory.json : Probed cameras and their capabilities
 """
 
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+
 import cv2
 
-def scan_cameras(max_index=5):
+# Default location of the cached camera inventory
+INVENTORY_PATH = "camera_inventory.json"
+
+# Seconds a single device may take to open and deliver its sample frames
+PROBE_TIMEOUT = 5.0
+
+# Frames read per camera to measure the achievable frame rate
+FPS_SAMPLE_FRAMES = 10
+
+def probe_camera(index, sample_frames=FPS_SAMPLE_FRAMES):
+    """
+    Open one camera index and measure its capabilities.
+
+    Args:
+        index (int): OpenCV camera index.
+        sample_frames (int): Frames to read for the FPS measurement.
+
+    Returns:
+        dict: 'index', 'available' and, for working cameras, 'width',
+        'height', 'reported_fps', 'measured_fps', 'backend' and 'api'
+        (the cv2.CAP_* constant to reopen it with); 'error' otherwise.
+    """
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(index)
+    try:
+        # Check if the camera device was opened successfully
+        if not cap.isOpened():
+            return {"index": index, "available": False, "error": "not found"}
+
+        # Try to read a single frame to verify the stream
+        ret, frame = cap.read()
+        if not ret:
+            return {"index": index, "available": False, "error": "opened but failed to read frame"}
+        open_s = time.perf_counter() - start
+
+        read_start, frames = time.perf_counter(), 0
+        for _ in range(sample_frames):
+            if cap.read()[0]:
+                frames += 1
+        elapsed = time.perf_counter() - read_start
+
+        try:
+            backend = cap.getBackendName()
+        except cv2.error:
+            backend = "UNKNOWN"
+
+        return {
+            "index": index,
+            "available": True,
+            "width": int(frame.shape[1]),
+            "height": int(frame.shape[0]),
+            "reported_fps": round(cap.get(cv2.CAP_PROP_FPS), 2),
+            "measured_fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+            "backend": backend,
+            "api": getattr(cv2, f"CAP_{backend}", cv2.CAP_ANY),
+            "open_s": round(open_s, 3),
+        }
+    finally:
+        # Always release the capture device to free the resource
+        cap.release()
+
+def scan_cameras(max_index=5, timeout=PROBE_TIMEOUT, inventory_path=INVENTORY_PATH):
     """
-    Scan for connected cameras by attempting to open each index.
+    Scan for connected cameras by probing all indices concurrently.
+
+    Each probe runs in a daemon thread; a probe still blocked after
+    `timeout` seconds is reported as timed out and abandoned, so a hung
+    driver cannot keep the scan (or the interpreter) alive.
 
     Args:
         max_index (int): Number of camera indices to scan (will try from 0 to max_index-1).
+        timeout (float): Per-device limit in seconds for opening and sampling.
+        inventory_path (str or None): Where to write the inventory; None to skip.
 
     Returns:
         List[int]: Indices where cameras were successfully opened and a frame was read.
     """
-    found_indices = []
     print("🔍 Scanning for connected cameras...")
+    results = {}
 
-    for index in range(max_index):
-        # Attempt to initialize video capture on the current index
-        cap = cv2.VideoCapture(index)
+    def run_probe(index):
+        try:
+            results[index] = probe_camera(index)
+        except Exception as e:
+            results[index] = {"index": index, "available": False, "error": str(e)}
 
-        # Check if the camera device was opened successfully
-        if not cap.isOpened():
-            print(f"❌ No camera at index {index}")
+    threads = [threading.Thread(target=run_probe, args=(i,), daemon=True)
+               for i in range(max_index)]
+    for thread in threads:
+        thread.start()
+
+    # All probes share the same deadline, so the scan takes ~timeout at most
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    cameras = []
+    for index in range(max_index):
+        entry = results.get(index) or {"index": index, "available": False, "error": "timeout"}
+        cameras.append(entry)
+        if entry["available"]:
+            print(f"✅ Camera found at index {index}: {entry['width']}x{entry['height']} "
+                  f"@ {entry['measured_fps']} fps (reported {entry['reported_fps']}, "
+                  f"{entry['backend']})")
         else:
-            # Try to read a single frame to verify the stream
-            ret, _ = cap.read()
-            if ret:
-                print(f"✅ Camera found at index {index}")
-                found_indices.append(index)
-            else:
-                print(f"❌ Camera at index {index} opened but failed to read frame")
+            print(f"❌ No camera at index {index} ({entry['error']})")
 
-        # Always release the capture device to free the resource
-        cap.release()
+    if inventory_path:
+        save_inventory(cameras, inventory_path)
+
+    return [c["index"] for c in cameras if c["available"]]
+
+def save_inventory(cameras, path=INVENTORY_PATH):
+    """Write probe results to the inventory file atomically."""
+    inventory = {
+        "host": socket.gethostname(),
+        "scanned_at": time.time(),
+        "cameras": cameras,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(inventory, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_inventory(path=INVENTORY_PATH, max_age=None):
+    """
+    Read the cached camera inventory.
 
-    return found_indices
+    Args:
+        path (str): Inventory file written by scan_cameras().
+        max_age (float, optional): Ignore inventories older than this many seconds.
+
+    Returns:
+        dict or None: {index: camera entry}, or None if missing, unreadable,
+        stale, or produced on another host.
+    """
+    try:
+        with open(path) as f:
+            inventory = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if inventory.get("host") != socket.gethostname():
+        return None
+    if max_age is not None and time.time() - inventory.get("scanned_at", 0) > max_age:
+        return None
+    return {c["index"]: c for c in inventory.get("cameras", [])}
 
 if __name__ == "__main__":
     """
     Entry point: scan for up to 5 cameras (indices 0–4) and display results.
     """
-    scan_cameras()
+    parser = argparse.ArgumentParser(description="Probe connected cameras")
+    parser.add_argument("--max-index", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT)
+    parser.add_argument("--output", default=INVENTORY_PATH)
+    args = parser.parse_args()
+    scan_cameras(args.max_index, args.timeout, args.output)
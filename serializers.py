@@ -0,0 +1,366 @@
+"""
+serializers.py
+
+Message encodings for the framed socket protocol (see protocol.py).
+
+A connection agrees on a serializer and, optionally, on compression in
+its hello. Serializers:
+    json     stdlib json, compact separators (always available)
+    msgpack  MessagePack: smaller and faster to parse than JSON. Uses the
+             `msgpack` package when installed, otherwise the pure-Python
+             implementation below (slower than json, so clients only
+             offer msgpack first when the package is present)
+
+With zlib compression negotiated, every payload starts with one flag
+byte and bodies above COMPRESS_THRESHOLD bytes (spot lists, history,
+camera images) are deflated when that makes them smaller. Without it
+the payload is the bare serializer output, which is what clients that
+predate the negotiation send.
+
+Classes:
+    Codec: Serializer plus optional compression for one connection.
+
+Functions:
+    get_serializer: Look up a serializer by name.
+    preferred_serializers: Serializer names in order of preference.
+"""
+
+import json
+import struct
+import zlib
+
+try:
+    import msgpack
+except ImportError:  # optional: the pure-Python codec below is used instead
+    msgpack = None
+
+# Bodies at least this large are compressed (when negotiated)
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 1      # Fast: the link is a LAN, CPU time matters more
+# Largest size a compressed body may expand to, the same bound as an
+# uncompressed frame (protocol.MAX_FRAME): a small frame must not be
+# able to inflate to gigabytes before it is even parsed
+MAX_DECOMPRESSED = 64 * 1024 * 1024
+
+# Flag byte in front of payloads on connections with compression
+_RAW  = b"\x00"
+_ZLIB = b"\x01"
+
+COMPRESSIONS = ("zlib",)
+
+# -------------------------------------------------------------------
+# JSON
+# -------------------------------------------------------------------
+
+class JsonSerializer:
+    """Stdlib JSON, UTF-8 encoded."""
+
+    name = "json"
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj).encode("utf-8")
+
+    def loads(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+# -------------------------------------------------------------------
+# MessagePack (pure-Python fallback)
+# -------------------------------------------------------------------
+
+def _pack(obj, out):
+    """Append the MessagePack encoding of `obj` to bytearray `out`."""
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif 0 <= obj <= 0xffffffffffffffff:
+            for limit, code, fmt in ((0xff, 0xcc, ">B"), (0xffff, 0xcd, ">H"),
+                                     (0xffffffff, 0xce, ">I")):
+                if obj <= limit:
+                    out.append(code)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                out.append(0xcf)
+                out += struct.pack(">Q", obj)
+        elif -0x8000000000000000 <= obj < 0:
+            for limit, code, fmt in ((-0x80, 0xd0, ">b"), (-0x8000, 0xd1, ">h"),
+                                     (-0x80000000, 0xd2, ">i")):
+                if obj >= limit:
+                    out.append(code)
+                    out += struct.pack(fmt, obj)
+                    break
+            else:
+                out.append(0xd3)
+                out += struct.pack(">q", obj)
+        else:
+            raise OverflowError("Integer out of MessagePack range")
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            out.append(0xa0 | size)
+        elif size <= 0xff:
+            out += b"\xd9" + struct.pack(">B", size)
+        elif size <= 0xffff:
+            out += b"\xda" + struct.pack(">H", size)
+        else:
+            out += b"\xdb" + struct.pack(">I", size)
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        size = len(obj)
+        if size <= 0xff:
+            out += b"\xc4" + struct.pack(">B", size)
+        elif size <= 0xffff:
+            out += b"\xc5" + struct.pack(">H", size)
+        else:
+            out += b"\xc6" + struct.pack(">I", size)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size < 16:
+            out.append(0x90 | size)
+        elif size <= 0xffff:
+            out += b"\xdc" + struct.pack(">H", size)
+        else:
+            out += b"\xdd" + struct.pack(">I", size)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size < 16:
+            out.append(0x80 | size)
+        elif size <= 0xffff:
+            out += b"\xde" + struct.pack(">H", size)
+        else:
+            out += b"\xdf" + struct.pack(">I", size)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} is not MessagePack serializable")
+
+# Fixed-size types: code -> struct format
+_FIXED = {
+    0xca: struct.Struct(">f"), 0xcb: struct.Struct(">d"),
+    0xcc: struct.Struct(">B"), 0xcd: struct.Struct(">H"),
+    0xce: struct.Struct(">I"), 0xcf: struct.Struct(">Q"),
+    0xd0: struct.Struct(">b"), 0xd1: struct.Struct(">h"),
+    0xd2: struct.Struct(">i"), 0xd3: struct.Struct(">q"),
+}
+# Length-prefixed types: code -> (kind, length struct)
+_SIZED = {
+    0xc4: ("bin", _FIXED[0xcc]), 0xc5: ("bin", _FIXED[0xcd]), 0xc6: ("bin", _FIXED[0xce]),
+    0xd9: ("str", _FIXED[0xcc]), 0xda: ("str", _FIXED[0xcd]), 0xdb: ("str", _FIXED[0xce]),
+    0xdc: ("array", _FIXED[0xcd]), 0xdd: ("array", _FIXED[0xce]),
+    0xde: ("map", _FIXED[0xcd]), 0xdf: ("map", _FIXED[0xce]),
+}
+
+def _unpack(data, pos):
+    """Decode one object at `pos`; return (object, next position)."""
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if 0xa0 <= code <= 0xbf:
+        kind, size = "str", code & 0x1f
+    elif 0x90 <= code <= 0x9f:
+        kind, size = "array", code & 0x0f
+    elif 0x80 <= code <= 0x8f:
+        kind, size = "map", code & 0x0f
+    elif code == 0xc0:
+        return None, pos
+    elif code == 0xc2:
+        return False, pos
+    elif code == 0xc3:
+        return True, pos
+    elif code in _FIXED:
+        fmt = _FIXED[code]
+        return fmt.unpack_from(data, pos)[0], pos + fmt.size
+    elif code in _SIZED:
+        kind, fmt = _SIZED[code]
+        size = fmt.unpack_from(data, pos)[0]
+        pos += fmt.size
+    else:
+        raise ValueError(f"Unsupported MessagePack type 0x{code:02x}")
+
+    if kind in ("str", "bin"):
+        end = pos + size
+        if end > len(data):
+            raise ValueError("Truncated MessagePack data")
+        return (str(data[pos:end], "utf-8") if kind == "str" else bytes(data[pos:end])), end
+    if kind == "array":
+        items = []
+        for _ in range(size):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    result = {}
+    for _ in range(size):
+        key, pos = _unpack(data, pos)
+        result[key], pos = _unpack(data, pos)
+    return result, pos
+
+class MsgpackSerializer:
+    """
+    MessagePack through the `msgpack` package, or the pure-Python
+    implementation when it is not installed.
+
+    Attributes:
+        native (bool): True when the `msgpack` package is used.
+    """
+
+    name = "msgpack"
+
+    def __init__(self, native=None):
+        """
+        Args:
+            native (bool, optional): Force (True) or avoid (False) the
+                `msgpack` package; default: use it when installed.
+        """
+        self.native = msgpack is not None if native is None else native
+        if self.native:
+            self._packer = msgpack.Packer()
+
+    def dumps(self, obj):
+        if self.native:
+            return self._packer.pack(obj)
+        out = bytearray()
+        _pack(obj, out)
+        return out
+
+    def loads(self, data):
+        if self.native:
+            try:
+                return msgpack.unpackb(data, raw=False, strict_map_key=False)
+            except TypeError as e:
+                # e.g. an array used as a map key (unhashable)
+                raise ValueError(f"Invalid MessagePack data: {e}") from e
+        try:
+            obj, end = _unpack(memoryview(data), 0)
+        except (IndexError, struct.error) as e:
+            raise ValueError(f"Truncated MessagePack data: {e}") from e
+        except TypeError as e:
+            raise ValueError(f"Invalid MessagePack data: {e}") from e
+        if end != len(data):
+            raise ValueError("Extra data after MessagePack object")
+        return obj
+
+# -------------------------------------------------------------------
+# Negotiation
+# -------------------------------------------------------------------
+
+SERIALIZERS = {
+    "json": JsonSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+def get_serializer(name):
+    """
+    Return a new serializer instance.
+
+    Raises:
+        ValueError: For an unknown name.
+    """
+    try:
+        return SERIALIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown serializer '{name}'") from None
+
+def preferred_serializers():
+    """
+    Serializer names a client should offer, most preferred first.
+
+    msgpack leads only when the native package is installed; the
+    pure-Python version is kept for talking to peers that ask for it.
+    """
+    return ("msgpack", "json") if msgpack is not None else ("json", "msgpack")
+
+class Codec:
+    """
+    Turns messages into payload bytes and back for one connection.
+
+    Attributes:
+        serializer: JsonSerializer or MsgpackSerializer instance.
+        compression (str or None): 'zlib' or None.
+        threshold (int): Minimum body size that is compressed.
+    """
+
+    def __init__(self, serializer="json", compression=None, threshold=COMPRESS_THRESHOLD):
+        """
+        Args:
+            serializer (str): Serializer name (see SERIALIZERS).
+            compression (str, optional): 'zlib' or None.
+            threshold (int): Bodies at least this large are compressed.
+
+        Raises:
+            ValueError: For an unknown serializer or compression.
+        """
+        if compression not in (None,) + COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}'")
+        self.serializer = get_serializer(serializer)
+        self.compression = compression
+        self.threshold = threshold
+
+    @classmethod
+    def from_options(cls, options):
+        """Build the codec agreed in a hello ({'codec': ..., 'compression': ...})."""
+        return cls(options.get("codec", "json"), options.get("compression"))
+
+    def encode(self, message):
+        """
+        Serialize (and possibly compress) one message.
+
+        Returns:
+            bytes-like: Payload to send.
+        """
+        body = self.serializer.dumps(message)
+        if self.compression is None:
+            return body
+        if len(body) >= self.threshold:
+            packed = zlib.compress(body, COMPRESS_LEVEL)
+            if len(packed) < len(body):
+                return _ZLIB + packed
+        return _RAW + body
+
+    def decode(self, payload):
+        """
+        Decode one received payload.
+
+        Raises:
+            ValueError: On malformed data.
+        """
+        if self.compression is None:
+            return self.serializer.loads(payload)
+        flag = payload[:1]
+        body = memoryview(payload)[1:]
+        if flag == _ZLIB:
+            inflater = zlib.decompressobj()
+            try:
+                body = inflater.decompress(body, MAX_DECOMPRESSED)
+            except zlib.error as e:
+                raise ValueError(f"Invalid compressed payload: {e}") from e
+            if inflater.unconsumed_tail:
+                raise ValueError(f"Compressed payload expands beyond {MAX_DECOMPRESSED} bytes")
+            if not inflater.eof:
+                raise ValueError("Invalid compressed payload: truncated stream")
+        elif flag != _RAW:
+            raise ValueError("Invalid payload flag")
+        return self.serializer.loads(body)
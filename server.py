@@ -1,19 +1,71 @@
+import argparse
 import socket
 import threading
 import logging
 import json
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, exists
+import random
+import time
+from sqlalchemy import (create_engine, event, inspect, literal, text, Column, Float, Integer,
+                        String, ForeignKey, exists, select, update)
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 from concurrent.futures import ThreadPoolExecutor
-from aes_cipher import Cipher  # AES encryption module
+from aes_cipher import AES_KEY, AES_NONCE, Cipher  # AES encryption module
+from protocol import is_hello, server_hello
+from spot_events import ChangeFeed, HoldScheduler, SpotReplica
 from datetime import datetime
 import base64
 import os
 
-# AES Configuration
-AES_KEY = b'ThisIsASecretKey'
-AES_NONCE = b'ThisIsASecretN'
+# Actions that only read: served in a read-only session whose transaction
+# ends as soon as the handler returns
+READ_ACTIONS = frozenset({
+    "login", "get_parking_history", "get_parking_spots",
+    "get_camera_image", "get_camera_stats", "get_spot_changes",
+})
+# Actions a read replica serves: spots come from its in-memory copy of
+# the primary's state, the rest is read from the shared database.
+# Everything else is refused and has to go to the primary.
+REPLICA_ACTIONS = frozenset({
+    "login", "get_parking_history", "get_parking_spots",
+    "get_camera_image", "get_spot_changes",
+})
+
+# SQLite connection settings: WAL lets readers and the writer work
+# concurrently, busy_timeout makes a writer wait for the lock instead of
+# failing at once
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Writes that fail because SQLite is busy/locked are retried this many
+# times, after BUSY_BACKOFF * 2**attempt seconds (plus jitter)
+WRITE_RETRIES = 5
+BUSY_BACKOFF  = 0.01
+
+# Reservations not turned into a parked car within this many seconds are
+# released (0 disables expiry)
+RESERVATION_TTL = float(os.getenv("PARKSCOUT_RESERVATION_TTL", "900"))
+
+# Zone (parking lot / area) of spots created before zones existed, and
+# the zone new spots of this server go to unless the request names one.
+# A city-wide deployment runs one server per group of zones; app.py
+# routes each zone to its server (see zone_router.py).
+DEFAULT_ZONE = "default"
+ZONE = os.getenv("PARKSCOUT_ZONE", DEFAULT_ZONE)
+
+# Spot changes kept for get_spot_changes, and the longest a client may
+# wait there for a new one
+CHANGE_FEED_SIZE = 10000
+MAX_CHANGE_WAIT  = 30.0
+# A camera confidence that moved at least this much since it was last
+# published is published even if the status did not change (replicas
+# show it)
+CONFIDENCE_STEP  = 0.05
 
 # Logging Setup
 logging.basicConfig(
@@ -58,7 +110,7 @@ class ParkingHistory(Base):
     __tablename__ = 'parking_history'
 
     id            = Column(Integer, primary_key=True)
-    user_id       = Column(Integer, ForeignKey('users.id'))
+    user_id       = Column(Integer, ForeignKey('users.id'), index=True)
     parking_date  = Column(String, nullable=False)
     parking_time  = Column(String, nullable=False)
     spot_id       = Column(Integer, nullable=True)
@@ -71,24 +123,48 @@ class ParkingSpot(Base):
     Attributes:
         id (int): Primary key.
         status (str): 'available', 'reserved', etc.
+        zone (str): Parking lot / area the spot belongs to.
+        reserved_until (float): Epoch seconds at which a reservation
+            expires; None unless the spot is reserved.
     """
     __tablename__ = 'parking_spots'
 
-    id     = Column(Integer, primary_key=True)
-    status = Column(String, default="available")
+    id             = Column(Integer, primary_key=True)
+    status         = Column(String, default="available")
+    zone           = Column(String, default=DEFAULT_ZONE, index=True)
+    reserved_until = Column(Float, nullable=True)
+
+# Hot read paths select plain column tuples with Core instead of loading
+# ORM instances: no identity map, no attribute instrumentation, and rows
+# go straight into the response dicts. The ORM is used for writes only.
+SPOT_COLUMNS    = (select(ParkingSpot.id, ParkingSpot.status, ParkingSpot.zone)
+                   .order_by(ParkingSpot.id))
+HISTORY_COLUMNS = (select(ParkingHistory.parking_date, ParkingHistory.parking_time,
+                          ParkingHistory.spot_id)
+                   .order_by(ParkingHistory.id))
 
 class ParkingServer:
     """
     A socket-based server for managing parking spots, reservations, and history,
     with optional AES encryption for client-server communication.
 
+    Reservations expire after a TTL (HoldScheduler) and every spot change
+    is published to a change feed that clients read with get_spot_changes
+    (ChangeFeed); see spot_events.py. Started with replica_of, the server
+    is a read replica: it serves REPLICA_ACTIONS from a copy of the
+    primary's spots that follows the primary's change feed (SpotReplica)
+    and from the shared database, so reads scale with more processes.
+    server_cluster.py runs several servers on one port as worker
+    processes (--workers), so writes use more than one core as well.
+
     Methods:
         init_database: Create DB tables if they don't exist.
         start:          Begin listening for client connections.
         shutdown:       Gracefully close server.
     """
 
-    def __init__(self, host="127.0.0.1", port=65432, max_workers=10, db_url="sqlite:///parking.db"):
+    def __init__(self, host="127.0.0.1", port=65432, max_workers=10, db_url="sqlite:///parking.db",
+                 reservation_ttl=RESERVATION_TTL, zone=ZONE, accounts=True, replica_of=None):
         """
         Initialize server settings, AES cipher, DB engine, and thread pool.
 
@@ -97,86 +173,341 @@ class ParkingServer:
             port (int): Port number to listen on.
             max_workers (int): Max threads for client handlers.
             db_url (str): SQLAlchemy DB connection URL.
+            reservation_ttl (float): Seconds a reservation is held (0: forever).
+            zone (str): Zone of spots added without one.
+            accounts (bool): This server holds the user accounts. Zone
+                servers that don't accept the user IDs of the account
+                server without looking them up.
+            replica_of (tuple, optional): (host, port) of the primary: run
+                as a read replica of it (REPLICA_ACTIONS only). db_url must
+                be the primary's database; it is only read.
         """
         self.host = host
         self.port = port
+        self.zone = zone
+        self.accounts = accounts
         self.cipher = Cipher(AES_KEY, AES_NONCE)
-        self.engine = create_engine(db_url, connect_args={"check_same_thread": False})
+        self.engine = self._create_engine(db_url, max_workers)
         self.SessionLocal = sessionmaker(bind=self.engine)
+        # Sessions are per request (see handle_request()); writes in a
+        # read-only session are a bug and are refused at flush time
+        event.listen(self.SessionLocal, "before_flush", self._refuse_read_only_flush)
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.server_socket = None
+        # Latest pipeline statistics reported by each camera, keyed by spot ID
+        self.camera_stats = {}
+        self.camera_stats_lock = threading.Lock()
+        # Smoothed confidence of the last camera-reported status, keyed by spot ID
+        # (kept in memory: it is only meaningful while the camera keeps reporting)
+        self.spot_confidence = {}
+        # Reservation holds expire on a heap-driven timer; every spot change
+        # is published to the change feed (see spot_events.py). Commits and
+        # publishing are serialized so the feed order matches the database.
+        self.reservation_ttl = reservation_ttl
+        self.holds = HoldScheduler(self._release_holds)
+        self.changes = ChangeFeed(CHANGE_FEED_SIZE)
+        self._commit_lock = threading.Lock()
+        self._published_confidence = {}
+        self.replica = SpotReplica(*replica_of, self.changes) if replica_of else None
+        # Set in the worker processes of server_cluster.py: changes and
+        # camera stats then go through the cluster's broker to all workers
+        self.cluster = None
+
+    @staticmethod
+    def _create_engine(db_url, max_workers):
+        """
+        Create the engine with a connection pool sized for the handler
+        threads and, for SQLite files, WAL mode.
+        """
+        url = make_url(db_url)
+        if url.get_backend_name() != "sqlite":
+            return create_engine(db_url, pool_size=max_workers, pool_pre_ping=True)
+
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if url.database not in (None, "", ":memory:"):
+            # One pooled connection per handler thread, reused across requests
+            kwargs.update(pool_size=max_workers, max_overflow=max_workers)
+        engine = create_engine(db_url, **kwargs)
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+
+        return engine
+
+    @staticmethod
+    def _refuse_read_only_flush(session, _context, _instances):
+        if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+            raise RuntimeError("Write attempted in a read-only request")
 
     def init_database(self):
-        """Create all tables defined on Base if not already present."""
+        """Create all tables, columns and indexes defined on Base if not already present."""
         Base.metadata.create_all(self.engine)
+        # create_all() skips tables that exist, so add columns and indexes
+        # introduced later (e.g. parking_spots.reserved_until,
+        # parking_history.user_id) to older databases here
+        self._add_missing_columns()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def _add_missing_columns(self):
+        """
+        ALTER TABLE ... ADD COLUMN for model columns an existing table
+        lacks (nullable ones only). A scalar column default becomes the
+        SQL default, so existing rows get it too.
+        """
+        inspector = inspect(self.engine)
+        dialect = self.engine.dialect
+        quote = dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f"ALTER TABLE {quote(table.name)} "
+                       f"ADD COLUMN {quote(column.name)} {column.type.compile(dialect=dialect)}")
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(
+                        dialect=dialect, compile_kwargs={"literal_binds": True})
+                    ddl += f" DEFAULT {default}"
+                with self.engine.begin() as conn:
+                    conn.execute(text(ddl))
+                logging.info(f"[MIGRATION] Added column {table.name}.{column.name}")
+
+    def _load_holds(self):
+        """
+        Schedule the expiry of reservations stored in the database.
 
-    @staticmethod
-    def _is_likely_encrypted(raw: bytes) -> bool:
+        Reservations made before expiry existed (no reserved_until) get
+        a full TTL from now.
         """
-        Heuristic to guess if data is encrypted (non-JSON).
+        if self.reservation_ttl <= 0:
+            return
+        with self.SessionLocal() as session:
+            session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.status == "reserved", ParkingSpot.reserved_until.is_(None))
+                .values(reserved_until=time.time() + self.reservation_ttl))
+            session.commit()
+            rows = session.execute(select(ParkingSpot.id, ParkingSpot.reserved_until)
+                                   .where(ParkingSpot.status == "reserved")).all()
+        for spot_id, deadline in rows:
+            self.holds.schedule(spot_id, deadline)
+        if rows:
+            logging.info(f"[HOLDS] {len(rows)} reservations scheduled for expiry")
+
+    def _release_holds(self, spot_ids):
+        """
+        Release expired reservations in one batched UPDATE (scheduler thread).
+
+        Only spots that are still reserved with a passed deadline change:
+        a spot that was occupied or reserved again meanwhile is left alone.
+        """
+        def release(session):
+            now = time.time()
+            stmt = (update(ParkingSpot)
+                    .where(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == "reserved",
+                           ParkingSpot.reserved_until <= now)
+                    .values(status="available", reserved_until=None))
+            if self.engine.dialect.update_returning:
+                released = session.scalars(stmt.returning(ParkingSpot.id)).all()
+            else:
+                # No UPDATE ... RETURNING (SQLite < 3.35): one conditional
+                # UPDATE per spot, still in a single transaction
+                released = [spot_id for spot_id in spot_ids
+                            if session.execute(stmt.where(ParkingSpot.id == spot_id)).rowcount]
+            self._commit(session, [{"spot_id": spot_id, "status": "available", "confidence": None}
+                                   for spot_id in released])
+            return released
+
+        released = self._with_session(release)
+        for spot_id in released:
+            self.spot_confidence.pop(spot_id, None)
+        if released:
+            logging.info(f"[HOLDS] Released {len(released)} expired reservations")
+
+    def _commit(self, session, changes=()):
+        """
+        Commit and publish the resulting spot changes, in commit order.
+        With session None the changes are only published (nothing was
+        written, e.g. a new camera confidence).
+        """
+        with self._commit_lock:
+            if session is not None:
+                session.commit()
+            if self.cluster is not None:
+                # Numbered by the cluster and published by every worker,
+                # this one included, when the broker forwards them
+                self.cluster.publish(list(changes))
+            else:
+                self.changes.publish(list(changes))
+            for change in changes:
+                if "confidence" in change:
+                    self._published_confidence[change["spot_id"]] = change["confidence"]
+
+    def _confidence_moved(self, spot_id, confidence):
+        """True if `confidence` differs noticeably from the last published one."""
+        published = self._published_confidence.get(spot_id)
+        if published is None or confidence is None:
+            return published is not confidence
+        return abs(confidence - published) >= CONFIDENCE_STEP
+
+    def _parse_legacy(self, raw: bytes) -> dict:
+        """
+        Decode a legacy request, usually parsing the JSON only once.
+
+        Plain JSON requests start with '{' (after optional whitespace).
+        A ciphertext can start with '{' too under some keys, so such a
+        payload that is not valid JSON is decrypted after all; anything
+        else is decrypted first.
 
         Args:
             raw (bytes): Raw payload from socket.
 
         Returns:
-            bool: True if payload is probably encrypted.
+            dict: The request.
+
+        Raises:
+            ValueError: If the payload is not a valid request.
         """
-        try:
-            json.loads(raw.decode("utf-8"))
-            return False
-        except:
-            return True
+        if raw.lstrip()[:1] == b"{":
+            try:
+                return json.loads(raw)
+            except ValueError:
+                pass
+        return json.loads(self.cipher.aes_decrypt(raw))
 
     def handle_client(self, sock: socket.socket, addr):
         """
-        Main loop for handling a single client: receive, decrypt, dispatch, and respond.
+        Serve one client connection until it closes.
+
+        The first bytes decide the wire format: MAGIC starts the framed
+        protocol (protocol.py), anything else is a legacy client.
 
         Args:
             sock (socket.socket): Connected client socket.
             addr (tuple): Client address.
         """
         logging.info(f"[CONNECTED] {addr}")
-        session = self.SessionLocal()
         try:
-            while True:
-                raw_data = sock.recv(4096)
-                if not raw_data:
-                    break
-
-                # Attempt decryption if necessary
-                try:
-                    if self._is_likely_encrypted(raw_data):
-                        decrypted = self.cipher.aes_decrypt(raw_data)
-                    else:
-                        decrypted = raw_data.decode("utf-8")
-                    request = json.loads(decrypted)
-                except Exception as e:
-                    logging.error(f"[DECRYPTION ERROR] {e}")
-                    sock.send(json.dumps({"status":"error","message":"Invalid request"}).encode())
-                    break
-
-                # Route the action and prepare response
-                action = request.get("action")
-                response = self.dispatch_action(action, request, session)
-
-                # Encrypt response if client expects encrypted channel
-                out = json.dumps(response).encode("utf-8")
-                try:
-                    encrypted_out = self.cipher.aes_encrypt(out)
-                    length = len(encrypted_out)
-                    sock.sendall(length.to_bytes(4, byteorder='big'))  # Send 4-byte header
-                    sock.sendall(encrypted_out)  # Send actual encrypted message
-
-                except:
-                    sock.send(out)
-
+            if is_hello(sock):
+                self._serve_framed(sock)
+            else:
+                self._serve_legacy(sock)
         except Exception as e:
             logging.error(f"[ERROR] {e}")
         finally:
             sock.close()
-            session.close()
             logging.info(f"[DISCONNECTED] {addr}")
 
+    def handle_request(self, request):
+        """
+        Run one request in its own short-lived session.
+
+        Connections from the web app and the cameras stay open for hours;
+        a session per request keeps the identity map from growing and no
+        snapshot or transaction outlives the request (long-lived SQLite
+        readers would block WAL checkpoints). Actions in READ_ACTIONS get
+        a read-only session that is rolled back when the handler returns.
+        Requests that hit a busy SQLite database are retried with backoff.
+
+        Args:
+            request (dict): Decoded request including 'action'.
+
+        Returns:
+            dict: Response payload.
+        """
+        action = request.get("action")
+        if self.replica is not None and action not in REPLICA_ACTIONS:
+            return {"status": "error", "message": "Read-only replica",
+                    "primary": f"{self.replica.host}:{self.replica.port}"}
+        return self._with_session(lambda session: self.dispatch_action(action, request, session),
+                                  read_only=action in READ_ACTIONS)
+
+    def _with_session(self, fn, read_only=False):
+        """
+        Call fn(session) in a new session, retrying while SQLite is busy.
+
+        Args:
+            fn (callable): Work to run; must commit its own writes.
+            read_only (bool): Refuse writes in this session.
+
+        Returns:
+            Whatever fn returns.
+        """
+        for attempt in range(WRITE_RETRIES + 1):
+            with self.SessionLocal() as session:
+                session.info["read_only"] = read_only
+                try:
+                    return fn(session)
+                except OperationalError as e:
+                    session.rollback()
+                    if not self._is_busy(e) or attempt == WRITE_RETRIES:
+                        raise
+                except Exception:
+                    session.rollback()
+                    raise
+            # Another writer holds the database: back off and run the request again
+            time.sleep(BUSY_BACKOFF * 2 ** attempt * (1 + random.random()))
+
+    @staticmethod
+    def _is_busy(error):
+        """True for SQLite 'database is locked/busy' errors, which are worth retrying."""
+        message = str(error.orig).lower()
+        return "locked" in message or "busy" in message
+
+    def _serve_framed(self, sock):
+        """Request loop for the framed protocol: one frame in, one frame out."""
+        channel = server_hello(sock)
+        while True:
+            try:
+                request = channel.recv_message()
+            except ValueError as e:
+                logging.error(f"[DECRYPTION ERROR] {e}")
+                channel.send_message({"status": "error", "message": "Invalid request"})
+                break
+            if request is None:
+                break
+            if not isinstance(request, dict):
+                channel.send_message({"status": "error", "message": "Invalid request"})
+                continue
+            channel.send_message(self.handle_request(request))
+
+    def _serve_legacy(self, sock):
+        """
+        Request loop for legacy clients: receive, decrypt, dispatch, and respond.
+        """
+        while True:
+            raw_data = sock.recv(4096)
+            if not raw_data:
+                break
+
+            # Attempt decryption if necessary
+            try:
+                request = self._parse_legacy(raw_data)
+            except Exception as e:
+                logging.error(f"[DECRYPTION ERROR] {e}")
+                sock.send(json.dumps({"status":"error","message":"Invalid request"}).encode())
+                break
+
+            # Route the action and prepare response
+            response = self.handle_request(request)
+
+            # Encrypt response if client expects encrypted channel
+            out = json.dumps(response).encode("utf-8")
+            try:
+                encrypted_out = self.cipher.aes_encrypt(out)
+                length = len(encrypted_out)
+                # Header and body in one write: two small writes stall on Nagle/delayed ACK
+                sock.sendall(length.to_bytes(4, byteorder='big') + encrypted_out)
+
+            except:
+                sock.send(out)
+
     def dispatch_action(self, action, request, session):
         """
         Map an action string to the corresponding handler method.
@@ -194,13 +525,15 @@ class ParkingServer:
             "login": self._login,
             "add_parking_history": self._add_history,
             "get_parking_history": self._get_history,
-            "get_parking_spots": lambda req, sess: self._list_spots(sess),
+            "get_parking_spots": self._list_spots,
             "update_spot_status": self._update_spot,
-            "add_parking_spot": lambda req, sess: self._add_spot(sess),
+            "add_parking_spot": self._add_spot,
             "reserve_spot": self._reserve_spot,
             "remove_parking_spot": self._remove_spot,
             "get_camera_image": self._get_camera_image,
-
+            "report_camera_stats": self._report_camera_stats,
+            "get_camera_stats": self._get_camera_stats,
+            "get_spot_changes": self._get_spot_changes,
         }
         handler = mapping.get(action)
         if handler:
@@ -288,24 +621,41 @@ class ParkingServer:
             dict: List of history entries or error.
         """
         user_id = req.get("user_id")
-        entries = session.query(ParkingHistory).filter_by(user_id=user_id).all()
-        if not entries:
+        # Read path: plain column tuples, no ORM instances (see HISTORY_COLUMNS)
+        rows = session.execute(HISTORY_COLUMNS.where(ParkingHistory.user_id == user_id)).all()
+        if not rows:
             return {"status":"error","message":"No history found"}
         return {
             "status":"success",
             "history":[
                 {
-                    "parking_date": e.parking_date,
-                    "parking_time": e.parking_time,
-                    "spot_id": e.spot_id,
+                    "parking_date": date,
+                    "parking_time": time,
+                    "spot_id": spot_id,
                     "action": "Reserved"
-                } for e in entries
+                } for date, time, spot_id in rows
             ]
         }
 
     def _get_camera_image(self, req, session):
+        """
+        Latest camera frame of a spot, as written by camera_predict.py for
+        the spot's zone (static/camera_feed_<zone>_<spot_id>.jpg).
+
+        Expects:
+            req['spot_id'], optional req['zone'] the spot must be in.
+        """
         spot_id = req.get("spot_id")
-        file_path = os.path.join(os.path.dirname(__file__), "static", f"camera_feed_{spot_id}.jpg")
+        if not isinstance(spot_id, int):
+            return {"status": "error", "message": "Invalid spot ID"}
+        spot = session.get(ParkingSpot, spot_id)
+        if not spot or req.get("zone") not in (None, spot.zone):
+            return {"status": "error", "message": "Spot not found"}
+        zone = spot.zone or DEFAULT_ZONE
+        if "/" in zone or "\\" in zone:
+            return {"status": "error", "message": "Image not found"}
+        file_path = os.path.join(os.path.dirname(__file__), "static",
+                                 f"camera_feed_{zone}_{spot_id}.jpg")
         print(f"🖼️ Trying to load image from: {file_path}")
         print("📂 Exists?", os.path.exists(file_path))
         try:
@@ -319,47 +669,210 @@ class ParkingServer:
         except FileNotFoundError:
             return {"status": "error", "message": "Image not found"}
 
-    def _list_spots(self, session):
+    def _report_camera_stats(self, req, session):
         """
-        List all parking spots with their current status.
+        Store the latest pipeline timing report sent by a camera host.
+
+        Expects:
+            req['spot_id'] (int), req['stats'], optional req['host'] and
+            req['camera'] (these fields win over keys of the same name in
+            req['stats']).
 
         Returns:
-            dict: List of spot IDs and statuses.
+            dict: Success or error message.
+        """
+        spot_id = req.get("spot_id")
+        stats = req.get("stats")
+        if spot_id is None or not isinstance(stats, dict):
+            return {"status":"error","message":"Missing spot_id or stats"}
+        if not isinstance(spot_id, int) or isinstance(spot_id, bool):
+            return {"status":"error","message":"Invalid spot ID"}
+        entry = {
+            **stats,
+            "spot_id": spot_id,
+            "host": req.get("host"),
+            "camera": req.get("camera"),
+            "received_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self.camera_stats_lock:
+            self.camera_stats[spot_id] = entry
+        if self.cluster is not None:
+            self.cluster.share_camera_stats(entry)
+        return {"status":"success","message":"Stats recorded"}
+
+    def _get_camera_stats(self, req, session):
         """
-        spots = session.query(ParkingSpot).all()
+        Return the most recent pipeline statistics of every camera.
+
+        Expects:
+            optional req['spot_id'] to restrict the result to one camera.
+
+        Returns:
+            dict: List of per-camera statistics, saturated hosts first.
+        """
+        spot_id = req.get("spot_id")
+        if spot_id is not None and (not isinstance(spot_id, int) or isinstance(spot_id, bool)):
+            return {"status":"error","message":"Invalid spot ID"}
+        with self.camera_stats_lock:
+            if spot_id is not None:
+                cameras = [self.camera_stats[spot_id]] if spot_id in self.camera_stats else []
+            else:
+                cameras = list(self.camera_stats.values())
+        cameras.sort(key=lambda c: (not c.get("saturated"), c["spot_id"]))
+        return {"status":"success","cameras": cameras}
+
+    def _list_spots(self, req, session):
+        """
+        List parking spots with their current status.
+
+        Expects:
+            optional req['zone'] (a zone or a list of zones) and
+            req['status'] to list only the spots of those zones / with
+            that status.
+
+        Returns:
+            dict: List of spot IDs, statuses, zones and camera confidence
+            (None if unknown), and 'seq': the change feed position the
+            list is at least as new as (continue with get_spot_changes).
+        """
+        if self.replica is not None:
+            return self._list_replica_spots(req)
+        query = SPOT_COLUMNS
+        zone = req.get("zone")
+        if isinstance(zone, list):
+            query = query.where(ParkingSpot.zone.in_(zone))
+        elif zone is not None:
+            query = query.where(ParkingSpot.zone == zone)
+        if req.get("status") is not None:
+            query = query.where(ParkingSpot.status == req["status"])
+        # Read the position first: a change published after it may already
+        # be in the rows, and replaying it is harmless
+        seq = self.changes.seq
+        rows = session.execute(query).all()
+        confidence = self.spot_confidence
         return {
             "status": "success",
-            "spots": [{"id": s.id, "status": s.status} for s in spots]
+            "seq": seq,
+            "spots": [{"id": spot_id, "status": status, "zone": zone,
+                       "confidence": confidence.get(spot_id)}
+                      for spot_id, status, zone in rows]
         }
 
+    def _list_replica_spots(self, req):
+        """get_parking_spots on a replica: filter the in-memory copy."""
+        if not self.replica.is_fresh():
+            # Not synced yet, or lost the primary: the caller should ask the primary
+            return {"status":"error","message":"Replica not synced","replica_unavailable": True}
+        zone = req.get("zone")
+        zones = set(zone) if isinstance(zone, list) else None if zone is None else {zone}
+        status = req.get("status")
+        seq = self.changes.seq
+        spots = [spot for spot in self.replica.spots()
+                 if (zones is None or spot["zone"] in zones)
+                 and (status is None or spot["status"] == status)]
+        return {"status":"success","seq": seq,"spots": spots}
+
+    def _get_spot_changes(self, req, session):
+        """
+        Return the spot changes after a change feed position.
+
+        Expects:
+            req['since'] (seq from get_parking_spots or a previous call),
+            optional req['timeout']: seconds to wait for a change if there
+            is none yet (long poll, at most MAX_CHANGE_WAIT).
+
+        Returns:
+            dict: 'seq' (latest position), 'changes' ({'seq', 'spot_id',
+            'status'}, status None for a removed spot) and 'reset': True
+            if the changes are no longer available and the spot list has
+            to be reloaded.
+        """
+        since = req.get("since")
+        if not isinstance(since, int):
+            return {"status":"error","message":"Missing since"}
+        try:
+            timeout = min(max(float(req.get("timeout") or 0), 0.0), MAX_CHANGE_WAIT)
+        except (TypeError, ValueError):
+            return {"status":"error","message":"Invalid timeout"}
+        if self.replica is not None and not self.replica.is_fresh():
+            return {"status":"error","message":"Replica not synced","replica_unavailable": True}
+        seq, changes, reset = self.changes.since(since, timeout)
+        return {"status":"success","seq": seq,"changes": changes,"reset": reset}
+
     def _update_spot(self, req, session):
         """
         Update the status of a specific spot.
 
         Expects:
-            req['spot_id'], req['status'].
+            req['spot_id'], req['status'], optional req['confidence'] (0..1)
+            sent by cameras with their smoothed status, and optional
+            req['preserve_reserved']: if true, an 'available' update leaves
+            a reserved spot reserved. The check and the write are one
+            conditional UPDATE, so a reservation made concurrently is
+            never overwritten. Setting 'reserved' starts a new hold; any
+            other status ends it.
 
         Returns:
-            dict: Success or error message.
+            dict: Success or error message; 'spot_status' is the status
+            stored after the update.
         """
-        spot = session.get(ParkingSpot, req.get("spot_id"))
-
-        if not spot:
+        spot_id = req.get("spot_id")
+        status = req.get("status")
+        confidence = req.get("confidence")
+        if confidence is not None:
+            if not isinstance(confidence, (int, float)) or isinstance(confidence, bool) \
+                    or not 0.0 <= confidence <= 1.0:
+                return {"status":"error","message":"Confidence must be a number between 0 and 1"}
+            confidence = round(float(confidence), 3)
+        deadline = self._hold_deadline() if status == "reserved" else None
+        # Only rows whose status actually changes are written: cameras
+        # repeat their status every cycle and should not take the write lock
+        stmt = (update(ParkingSpot)
+                .where(ParkingSpot.id == spot_id, ParkingSpot.status.is_distinct_from(status))
+                .values(status=status, reserved_until=deadline))
+        if req.get("preserve_reserved") and status == "available":
+            stmt = stmt.where(ParkingSpot.status != "reserved")
+        changed = session.execute(stmt).rowcount
+        # Read back inside the same transaction: the stored status
+        final = session.scalar(select(ParkingSpot.status).where(ParkingSpot.id == spot_id))
+        if final is None:
+            session.rollback()
             return {"status":"error","message":"Spot not found"}
-        spot.status = req.get("status")
-        session.commit()
-        return {"status":"success","message":f"Spot {spot.id} updated to {spot.status}."}
 
-    def _add_spot(self, session):
+        change = {"spot_id": spot_id, "status": final, "confidence": confidence}
+        if changed:
+            self._commit(session, [change])
+            if deadline is not None:
+                self.holds.schedule(spot_id, deadline)
+            else:
+                self.holds.cancel(spot_id)
+        else:
+            session.rollback()
+            if self._confidence_moved(spot_id, confidence):
+                self._commit(None, [change])
+        if confidence is None:
+            self.spot_confidence.pop(spot_id, None)
+        else:
+            self.spot_confidence[spot_id] = confidence
+        return {"status":"success","message":f"Spot {spot_id} updated to {final}.",
+                "spot_status": final}
+
+    def _add_spot(self, req, session):
         """
         Create a new parking spot record.
 
+        Expects:
+            optional req['zone'] (default: the server's zone).
+
         Returns:
             dict: New spot ID.
         """
-        new_spot = ParkingSpot()
+        zone = req.get("zone") or self.zone
+        new_spot = ParkingSpot(status="available", zone=zone)
         session.add(new_spot)
-        session.commit()
+        session.flush()
+        self._commit(session, [{"spot_id": new_spot.id, "status": "available", "zone": zone,
+                                "confidence": None}])
         return {
             "status":"success",
             "message":f"Spot {new_spot.id} added",
@@ -370,54 +883,100 @@ class ParkingServer:
         """
         Reserve an available spot for a user and record history.
 
+        The availability check and the write are a single compare-and-set
+        UPDATE ... WHERE status = 'available': of any number of concurrent
+        attempts on a spot exactly one matches the row, so a spot can never
+        be booked twice, and a camera update cannot slip in between. The
+        hold expires after reservation_ttl seconds unless the spot changes
+        status first (see HoldScheduler).
+
         Expects:
-            req['user_id'], req['spot_id'].
+            req['user_id'], req['spot_id'], optional req['zone']: refuse
+            if the spot is in another zone (spot IDs are per server).
 
         Returns:
-            dict: Success or error.
+            dict: Success (with 'reserved_until', epoch seconds or None) or error.
         """
-        user = session.get(User, req.get("user_id"))
-        spot = session.get(ParkingSpot, req.get("spot_id"))
-
-        if user and spot and spot.status == "available":
-            spot.status = "reserved"
-            now = datetime.now()
-            session.add(ParkingHistory(
-                user_id=user.id,
-                parking_date=now.strftime("%Y-%m-%d"),
-                parking_time=now.strftime("%H:%M:%S"),
-                spot_id=spot.id
-            ))
-            session.commit()
-            return {"status":"success","message":f"Spot {spot.id} reserved"}
-        return {"status":"error","message":"Cannot reserve spot"}
+        user_id = req.get("user_id")
+        spot_id = req.get("spot_id")
+        in_spot = [ParkingSpot.id == spot_id]
+        if req.get("zone") is not None:
+            in_spot.append(ParkingSpot.zone == req["zone"])
+        if self.accounts and not session.query(exists().where(User.id == user_id)).scalar():
+            return {"status":"error","message":"Cannot reserve spot"}
+        # Cheap early rejection that takes no write lock; the UPDATE decides
+        if session.scalar(select(ParkingSpot.status).where(*in_spot)) != "available":
+            return {"status":"error","message":"Cannot reserve spot"}
+
+        deadline = self._hold_deadline()
+        reserved = session.execute(
+            update(ParkingSpot)
+            .where(*in_spot, ParkingSpot.status == "available")
+            .values(status="reserved", reserved_until=deadline)
+        ).rowcount
+        if reserved != 1:
+            session.rollback()
+            return {"status":"error","message":"Cannot reserve spot"}
+
+        now = datetime.now()
+        session.add(ParkingHistory(
+            user_id=user_id,
+            parking_date=now.strftime("%Y-%m-%d"),
+            parking_time=now.strftime("%H:%M:%S"),
+            spot_id=spot_id
+        ))
+        self._commit(session, [{"spot_id": spot_id, "status": "reserved", "confidence": None}])
+        if deadline is not None:
+            self.holds.schedule(spot_id, deadline)
+        self.spot_confidence.pop(spot_id, None)
+        return {"status":"success","message":f"Spot {spot_id} reserved",
+                "reserved_until": deadline}
+
+    def _hold_deadline(self):
+        """Expiry time (epoch seconds) of a reservation made now, or None without a TTL."""
+        return time.time() + self.reservation_ttl if self.reservation_ttl > 0 else None
 
     def _remove_spot(self, req, session):
         """
         Delete a parking spot record.
 
         Expects:
-            req['spot_id'].
+            req['spot_id'], optional req['zone'] the spot must be in.
 
         Returns:
             dict: Success or error message.
         """
         spot = session.get(ParkingSpot, req.get("spot_id"))
 
-        if not spot:
+        if not spot or req.get("zone") not in (None, spot.zone):
             return {"status":"error","message":"Spot not found"}
         session.delete(spot)
-        session.commit()
+        self._commit(session, [{"spot_id": spot.id, "status": None}])
+        self.holds.cancel(spot.id)
+        self.spot_confidence.pop(spot.id, None)
+        self._published_confidence.pop(spot.id, None)
         return {"status":"success","message":f"Spot {spot.id} removed"}
 
-    def start(self):
+    def start(self, sock=None):
         """
         Initialize DB, bind socket, and enter accept loop to handle clients.
+        A replica leaves the database alone and starts following its primary.
+
+        Args:
+            sock (socket.socket, optional): Listening socket to accept on
+                instead of binding host:port (server_cluster.py workers).
         """
-        self.init_database()
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen()
+        if self.replica is not None:
+            self.replica.start()
+        else:
+            self.init_database()
+            self._load_holds()
+            self.holds.start()
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind((self.host, self.port))
+            sock.listen()
+        self.server_socket = sock
         logging.info(f"[LISTENING] Server running on {self.host}:{self.port}")
 
         try:
@@ -427,6 +986,9 @@ class ParkingServer:
                 self.executor.submit(self.handle_client, client_sock, addr)
         except KeyboardInterrupt:
             self.shutdown()
+        except OSError:
+            # accept() fails once shutdown() has closed the listening socket
+            logging.info("[STOPPED] Listening socket closed")
 
     def shutdown(self):
         """
@@ -435,10 +997,38 @@ class ParkingServer:
         logging.info("[SHUTDOWN] Server is shutting down")
         if self.server_socket:
             self.server_socket.close()
+        self.holds.stop()
+        if self.replica is not None:
+            self.replica.stop()
         self.executor.shutdown(wait=False)
 
 
 if __name__ == "__main__":
     # Entry point: start the parking server
-    server = ParkingServer(host="0.0.0.0", port=65432, max_workers=10)
-    server.start()
+    parser = argparse.ArgumentParser(description="Run the ParkScout server")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=65432)
+    parser.add_argument('--max-workers', type=int, default=10)
+    parser.add_argument('--db', default="sqlite:///parking.db", help="SQLAlchemy database URL")
+    parser.add_argument('--zone', default=ZONE, help="Zone of spots added without one")
+    parser.add_argument('--no-accounts', action='store_true',
+                        help="Zone server: user accounts live on another server")
+    parser.add_argument('--replica-of', metavar='HOST:PORT',
+                        help="Serve reads only, following this primary (same --db)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Server processes sharing the port (see server_cluster.py)")
+    args = parser.parse_args()
+    if args.workers > 1 and args.replica_of:
+        parser.error("--workers cannot be combined with --replica-of")
+    replica_of = None
+    if args.replica_of:
+        primary_host, _, primary_port = args.replica_of.rpartition(':')
+        replica_of = (primary_host or "127.0.0.1", int(primary_port))
+    settings = dict(host=args.host, port=args.port, max_workers=args.max_workers,
+                    db_url=args.db, zone=args.zone, accounts=not args.no_accounts)
+    if args.workers > 1:
+        from server_cluster import ServerCluster
+        ServerCluster(args.workers, **settings).run()
+    else:
+        server = ParkingServer(replica_of=replica_of, **settings)
+        server.start()
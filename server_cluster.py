@@ -0,0 +1,421 @@
+"""
+server_cluster.py
+
+Runs the ParkingServer as several worker processes sharing one port.
+
+Because of the GIL, one ParkingServer process uses a single core for
+the protocol, AES and SQLAlchemy work however many handler threads it
+has. `server.py --workers N` starts N worker processes instead, each a
+complete ParkingServer with its own thread pool:
+
+    - Listening: every worker binds host:port with SO_REUSEPORT and the
+      kernel spreads new connections over them. Where SO_REUSEPORT is
+      missing, this process binds the port once and hands the socket to
+      the workers, which all accept on it.
+    - Spot state lives in the shared database (SQLite in WAL mode allows
+      one writer and many readers across processes). Writes that change
+      spots commit under one lock shared by all workers (CommitLock), so
+      commits and the numbering of the resulting changes happen in the
+      same order. The lock records its holder: when a worker dies
+      holding it, or the lock stays held without a recorded holder (a
+      worker died right after acquiring or right before releasing it),
+      the supervisor releases it and skips a change number, so the
+      other workers carry on and feed readers reload.
+    - Change notifications: workers send their numbered changes to a
+      broker in this process, which forwards them in sequence order to
+      every worker. Each worker publishes them to its own ChangeFeed, so
+      get_spot_changes gives the same sequence numbers on every worker
+      and a client can reconnect to any of them. Camera confidences and
+      camera stats travel the same way, so every worker answers
+      get_parking_spots and get_camera_stats for all cameras.
+    - Supervision: workers that exit are restarted with backoff (as in
+      camera_supervisor.py). A restarted worker reloads the reservation
+      holds from the database and continues the feed at the broker's
+      position.
+
+Usage:
+    python server.py --workers 4 [--host H] [--port P] [--db URL] ...
+
+Classes:
+    CommitLock:    Cross-process commit lock the supervisor can take back.
+    ClusterLink:   A worker's connection to the broker.
+    ServerCluster: Starts and supervises the workers, runs the broker.
+"""
+
+import heapq
+import logging
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.connection import wait
+
+from server import CHANGE_FEED_SIZE, ParkingServer
+from spot_events import ChangeFeed
+
+# Restart delays (seconds): doubled after each crash, reset after a stable run
+RESTART_INITIAL = 1.0
+RESTART_MAX     = 60.0
+STABLE_AFTER    = 60.0
+
+# Seconds the broker waits for a change number that was taken but never
+# sent (its worker died in between) before skipping it; the workers'
+# feeds then make their readers reload
+GAP_TIMEOUT = 2.0
+
+# Seconds a worker waits for the commit lock before failing the request
+COMMIT_LOCK_TIMEOUT = 30.0
+
+# Seconds the commit lock may stay held without a recorded owner before
+# the supervisor takes it back (its holder died between acquiring it and
+# recording its pid, or between clearing the pid and releasing it)
+ORPHAN_TIMEOUT = 5.0
+
+
+# -------------------------------------------------------------------
+# Worker side
+# -------------------------------------------------------------------
+
+class CommitLock:
+    """
+    The workers' commit lock: a cross-process lock that remembers the
+    pid of its holder, so that the supervisor can release it when that
+    worker dies before releasing it itself.
+    """
+
+    def __init__(self, ctx):
+        self._lock = ctx.Lock()
+        self._owner = ctx.RawValue("i", 0)    # pid of the holder, 0 when free
+        self._orphaned_since = None           # supervisor side, see recover_orphan()
+
+    def __enter__(self):
+        if not self._lock.acquire(timeout=COMMIT_LOCK_TIMEOUT):
+            raise TimeoutError("Commit lock not available")
+        self._owner.value = os.getpid()
+        return self
+
+    def __exit__(self, *exc):
+        self._owner.value = 0
+        self._lock.release()
+
+    def reset(self, pid, counter):
+        """
+        Release the lock if the (dead) process `pid` holds it.
+
+        The worker may have committed without sending its changes, so a
+        change number is skipped: the broker then reports the gap and
+        the workers' feeds make their readers reload.
+
+        Returns:
+            bool: True if the lock was released.
+        """
+        if pid is None or self._owner.value != pid:
+            return False
+        self._take_back(counter)
+        return True
+
+    def recover_orphan(self, counter, now):
+        """
+        Release the lock if it has been held without a recorded owner for
+        ORPHAN_TIMEOUT seconds (called periodically by the supervisor).
+
+        Returns:
+            bool: True if the lock was released.
+        """
+        orphaned = False
+        if self._owner.value == 0:
+            if self._lock.acquire(block=False):
+                self._lock.release()
+            else:
+                # Held: by a worker that has not recorded itself yet, or by nobody
+                orphaned = self._owner.value == 0
+        if not orphaned:
+            self._orphaned_since = None
+            return False
+        if self._orphaned_since is None:
+            self._orphaned_since = now
+            return False
+        if now - self._orphaned_since < ORPHAN_TIMEOUT:
+            return False
+        self._orphaned_since = None
+        self._take_back(counter)
+        return True
+
+    def _take_back(self, counter):
+        """Release the lock for a dead holder, skipping a change number (see reset())."""
+        counter.value += 1
+        self._owner.value = 0
+        self._lock.release()
+
+class ClusterLink:
+    """
+    Connects a worker's ParkingServer to the broker: sends the changes it
+    commits and applies everything the broker forwards.
+    """
+
+    def __init__(self, server, lock, counter, to_broker, from_broker):
+        """
+        Args:
+            server (ParkingServer): The worker's server.
+            lock (CommitLock): Becomes the server's commit lock.
+            counter: Shared number of the last change handed out.
+            to_broker, from_broker: Pipe ends to and from the broker.
+        """
+        self.server = server
+        self.counter = counter
+        self._to_broker = to_broker
+        self._from_broker = from_broker
+        self._send_lock = threading.Lock()
+        server._commit_lock = lock
+        server.cluster = self
+
+    def publish(self, changes):
+        """Number and send changes (called with the commit lock held)."""
+        if not changes:
+            return
+        # The counter is only touched under the commit lock
+        seq = self.counter.value + 1
+        self.counter.value += len(changes)
+        with self._send_lock:
+            self._to_broker.send(("changes", seq, changes))
+
+    def share_camera_stats(self, entry):
+        """Send a camera's stats to the other workers."""
+        with self._send_lock:
+            self._to_broker.send(("camera_stats", None, entry))
+
+    def start(self):
+        threading.Thread(target=self._run, name="cluster-link", daemon=True).start()
+
+    def _run(self):
+        try:
+            while True:
+                kind, seq, payload = self._from_broker.recv()
+                if kind == "changes":
+                    self._apply(seq, payload)
+                elif kind == "camera_stats":
+                    with self.server.camera_stats_lock:
+                        self.server.camera_stats[payload["spot_id"]] = payload
+        except (EOFError, OSError):
+            logging.error("[CLUSTER] Lost the broker, stopping")
+            self.server.shutdown()
+
+    def _apply(self, seq, changes):
+        server = self.server
+        server.changes.publish(changes, seq=seq)
+        # Confidences reported to other workers
+        for change in changes:
+            spot_id = change["spot_id"]
+            if change["status"] is None:
+                server.spot_confidence.pop(spot_id, None)
+                server._published_confidence.pop(spot_id, None)
+            elif "confidence" in change:
+                server._published_confidence[spot_id] = change["confidence"]
+                if change["confidence"] is None:
+                    server.spot_confidence.pop(spot_id, None)
+                else:
+                    server.spot_confidence[spot_id] = change["confidence"]
+
+def listen_socket(host, port, reuse_port):
+    """Listening TCP socket on host:port, optionally with SO_REUSEPORT."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen()
+    return sock
+
+def worker_main(settings, sock, lock, counter, seq, to_broker, from_broker):
+    """
+    Entry point of a worker process.
+
+    Args:
+        settings (dict): ParkingServer keyword arguments.
+        sock (socket.socket): Shared listening socket, or None to bind
+            host:port with SO_REUSEPORT.
+        seq (int): Broker position the change feed starts at.
+    """
+    server = ParkingServer(**settings)
+    server.changes = ChangeFeed(CHANGE_FEED_SIZE, seq)
+    link = ClusterLink(server, lock, counter, to_broker, from_broker)
+    link.start()
+    if sock is None:
+        sock = listen_socket(server.host, server.port, reuse_port=True)
+    server.start(sock)
+
+# -------------------------------------------------------------------
+# Supervisor and broker
+# -------------------------------------------------------------------
+
+class _Worker:
+    """Bookkeeping for one worker process."""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.to_worker = None      # broker -> worker pipe end
+        self.from_worker = None    # worker -> broker pipe end
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = RESTART_INITIAL
+        self.next_start = 0.0
+
+class ServerCluster:
+    """
+    Runs `workers` ParkingServer processes on one port and forwards spot
+    changes between them.
+
+    Attributes:
+        settings (dict): ParkingServer keyword arguments of the workers.
+    """
+
+    def __init__(self, workers, **settings):
+        """
+        Args:
+            workers (int): Number of worker processes.
+            **settings: ParkingServer arguments (host, port, db_url, ...).
+        """
+        self.settings = settings
+        # Spawned (not forked) workers: no engine, pool or thread state of
+        # this process is inherited
+        self.ctx = mp.get_context("spawn")
+        self.lock = CommitLock(self.ctx)
+        self.counter = self.ctx.RawValue("q", 0)
+        self.workers = [_Worker(i) for i in range(workers)]
+        self.reuse_port = hasattr(socket, "SO_REUSEPORT")
+        self.sock = None
+        self._next_seq = 1         # next change number to forward
+        self._pending = []         # heap of (seq, changes) received out of order
+        self._gap_since = None
+
+    def _spawn(self, worker):
+        # Changes published from here on are forwarded to the new worker,
+        # so its feed starts right after the last forwarded one
+        worker.from_worker, to_broker = self.ctx.Pipe(duplex=False)
+        from_broker, worker.to_worker = self.ctx.Pipe(duplex=False)
+        worker.process = self.ctx.Process(
+            target=worker_main, name=f"parking-worker-{worker.index}", daemon=True,
+            args=(self.settings, self.sock, self.lock, self.counter, self._next_seq - 1,
+                  to_broker, from_broker))
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        # Only the worker keeps its ends: a dead worker then shows up as
+        # EOF / a broken pipe here
+        to_broker.close()
+        from_broker.close()
+
+    def _drop(self, worker):
+        for conn in (worker.to_worker, worker.from_worker):
+            if conn is not None:
+                conn.close()
+        worker.to_worker = worker.from_worker = None
+
+    def _check(self, worker, now):
+        """Restart a worker that exited, honouring its backoff delay."""
+        if worker.process is not None and worker.process.is_alive():
+            return
+        if worker.process is not None:
+            ran = now - worker.started_at
+            worker.backoff = RESTART_INITIAL if ran >= STABLE_AFTER else worker.backoff
+            worker.next_start = now + worker.backoff
+            logging.error(f"[CLUSTER] Worker {worker.index} exited with code "
+                          f"{worker.process.exitcode} after {ran:.0f}s; "
+                          f"restarting in {worker.backoff:.0f}s")
+            worker.backoff = min(worker.backoff * 2, RESTART_MAX)
+            if self.lock.reset(worker.process.pid, self.counter):
+                logging.error(f"[CLUSTER] Worker {worker.index} died holding the commit lock; "
+                              f"released it")
+            worker.process = None
+            self._drop(worker)
+        if now >= worker.next_start:
+            worker.restarts += 1
+            self._spawn(worker)
+
+    def _broadcast(self, message):
+        for worker in self.workers:
+            if worker.to_worker is None:
+                continue
+            try:
+                worker.to_worker.send(message)
+            except OSError:
+                self._drop(worker)
+
+    def _receive(self, conn):
+        kind, seq, payload = conn.recv()
+        if kind == "camera_stats":
+            self._broadcast((kind, seq, payload))
+            return
+        heapq.heappush(self._pending, (seq, payload))
+        self._forward()
+
+    def _forward(self):
+        """Forward pending changes in sequence order."""
+        while self._pending and self._pending[0][0] <= self._next_seq:
+            seq, changes = heapq.heappop(self._pending)
+            self._broadcast(("changes", seq, changes))
+            self._next_seq = seq + len(changes)
+        if not self._pending:
+            self._gap_since = None
+        elif self._gap_since is None:
+            self._gap_since = time.monotonic()
+        elif time.monotonic() - self._gap_since >= GAP_TIMEOUT:
+            logging.error(f"[CLUSTER] Changes {self._next_seq}-{self._pending[0][0] - 1} "
+                          f"were lost, skipping them")
+            self._next_seq = self._pending[0][0]
+            self._gap_since = None
+            self._forward()
+
+    def start(self):
+        """Prepare the database once, then start the workers."""
+        setup = ParkingServer(db_url=self.settings.get("db_url", "sqlite:///parking.db"))
+        setup.init_database()
+        setup.engine.dispose()
+        if not self.reuse_port:
+            self.sock = listen_socket(self.settings.get("host", "127.0.0.1"),
+                                      self.settings.get("port", 65432), reuse_port=False)
+        for worker in self.workers:
+            self._spawn(worker)
+        logging.info(f"[CLUSTER] {len(self.workers)} workers on port "
+                     f"{self.settings.get('port', 65432)} "
+                     f"({'SO_REUSEPORT' if self.reuse_port else 'shared socket'})")
+
+    def run(self):
+        """Broker and supervise until interrupted (Ctrl+C or SIGTERM), then shut down."""
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        self.start()
+        try:
+            while True:
+                conns = {w.from_worker: w for w in self.workers if w.from_worker is not None}
+                for conn in wait(list(conns), timeout=0.5):
+                    try:
+                        self._receive(conn)
+                    except (EOFError, OSError):
+                        self._drop(conns[conn])
+                if self._pending:
+                    self._forward()
+                now = time.monotonic()
+                if self.lock.recover_orphan(self.counter, now):
+                    logging.error("[CLUSTER] Commit lock held without an owner for "
+                                  f"{ORPHAN_TIMEOUT:.0f}s; released it")
+                for worker in self.workers:
+                    self._check(worker, now)
+        except KeyboardInterrupt:
+            logging.info("[CLUSTER] Shutting down")
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout=5.0):
+        """Stop all workers."""
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+            self._drop(worker)
+        if self.sock is not None:
+            self.sock.close()
@@ -0,0 +1,150 @@
+"""
+smoothing.py
+
+Temporal smoothing of per-frame occupancy scores for one parking spot.
+
+A single frame is a poor witness: a car driving past the lens or a
+person walking through the spot produces a few 'occupied' frames in an
+empty spot. StatusSmoother combines recent sigmoid scores, either as an
+exponential moving average or as N-of-M voting, and only switches the
+status when the evidence crosses a hysteresis threshold. It also decides
+when a result is worth publishing: on a status change, or as a periodic
+keepalive so the server and UI know the camera is still alive.
+
+Classes:
+    StatusSmoother: EMA or voting smoother with hysteresis and keepalive.
+"""
+
+import time
+from collections import deque
+
+# Smoothing defaults
+DEFAULT_MODE = "ema"
+EMA_ALPHA    = 0.2      # Weight of the newest score in the moving average
+HIGH         = 0.7      # Smoothed score needed to switch to 'occupied'
+LOW          = 0.3      # Smoothed score needed to switch back to 'available'
+VOTE_WINDOW  = 5        # Frames considered in voting mode (M)
+VOTES        = 4        # Agreeing frames needed to switch in voting mode (N)
+KEEPALIVE    = 60.0     # Seconds between publishes when nothing changes
+
+MODES = ("ema", "vote", "none")
+
+
+class StatusSmoother:
+    """
+    Turns a stream of occupancy scores into a stable status.
+
+    Modes:
+        'ema':  exponential moving average of the scores; switches to
+                'occupied' above `high` and back to 'available' below `low`.
+        'vote': the last `window` frames vote (score >= 0.5); the status
+                switches once `votes` of them agree on the other state.
+        'none': per-frame threshold at 0.5 (the previous behaviour).
+
+    Attributes:
+        status (str or None): Current smoothed status.
+        probability (float): Smoothed probability that the spot is occupied.
+        changes (int): Number of status switches so far.
+    """
+
+    def __init__(self, mode=DEFAULT_MODE, alpha=EMA_ALPHA, high=HIGH, low=LOW,
+                 window=VOTE_WINDOW, votes=VOTES, keepalive=KEEPALIVE):
+        """
+        Args:
+            mode (str): 'ema', 'vote' or 'none'.
+            alpha (float): EMA weight of the newest score (0 < alpha <= 1).
+            high (float): Threshold to enter 'occupied' (EMA mode).
+            low (float): Threshold to return to 'available' (EMA mode).
+            window (int): Frames kept for voting.
+            votes (int): Agreeing frames required to switch (voting mode).
+            keepalive (float): Seconds after which an unchanged status is
+                published again.
+
+        Raises:
+            ValueError: On an unknown mode or inconsistent thresholds.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown smoothing mode '{mode}', expected one of {MODES}")
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError("Thresholds must satisfy 0 <= low <= high <= 1")
+        if not 0 < votes <= window:
+            raise ValueError("votes must be between 1 and window")
+        self.mode = mode
+        self.alpha = alpha
+        self.high = high
+        self.low = low
+        self.votes = votes
+        self.keepalive = keepalive
+
+        self.status = None
+        self.probability = 0.0
+        self.changes = 0
+        self._scores = deque(maxlen=window)
+        self._last_publish = None
+
+    def update(self, score):
+        """
+        Add one frame's sigmoid score.
+
+        Args:
+            score (float): Model output, probability of 'occupied'.
+
+        Returns:
+            tuple: (status, confidence, changed) where confidence is the
+            smoothed probability of the returned status and changed tells
+            whether the status just switched.
+        """
+        score = float(score)
+        self._scores.append(score)
+        previous = self.status
+
+        if self.mode == "ema":
+            self.probability = (score if previous is None else
+                                self.alpha * score + (1 - self.alpha) * self.probability)
+            if previous is None:
+                self.status = "occupied" if self.probability >= 0.5 else "available"
+            elif previous == "available" and self.probability >= self.high:
+                self.status = "occupied"
+            elif previous == "occupied" and self.probability <= self.low:
+                self.status = "available"
+        elif self.mode == "vote":
+            self.probability = sum(self._scores) / len(self._scores)
+            occupied_votes = sum(1 for s in self._scores if s >= 0.5)
+            if previous is None:
+                self.status = "occupied" if score >= 0.5 else "available"
+            elif previous == "available" and occupied_votes >= self.votes:
+                self.status = "occupied"
+            elif previous == "occupied" and len(self._scores) - occupied_votes >= self.votes:
+                self.status = "available"
+        else:
+            self.probability = score
+            self.status = "occupied" if score >= 0.5 else "available"
+
+        changed = previous is not None and self.status != previous
+        self.changes += changed
+        return self.status, self.confidence(), changed
+
+    def confidence(self):
+        """Smoothed probability of the current status (0.5 to 1.0 when stable)."""
+        if self.status == "occupied":
+            return round(self.probability, 3)
+        return round(1.0 - self.probability, 3)
+
+    def should_publish(self, changed, now=None):
+        """
+        Decide whether the current result must be sent to the server.
+
+        Args:
+            changed (bool): Whether the status just switched.
+            now (float, optional): time.monotonic() value, for testing.
+
+        Returns:
+            bool: True on the first result, on a change, or when the
+            keepalive interval has elapsed. Marks the result as published.
+        """
+        now = time.monotonic() if now is None else now
+        if (changed or self._last_publish is None
+                or now - self._last_publish >= self.keepalive):
+            self._last_publish = now
+            return True
+        return False
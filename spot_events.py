@@ -0,0 +1,335 @@
+"""
+spot_events.py
+
+Reservation expiry and change notifications for the ParkingServer.
+
+A reserved spot holds capacity until someone parks; an abandoned
+reservation would hold it forever. HoldScheduler keeps every active
+hold in a min-heap ordered by deadline, so scheduling is O(log n) and
+one background thread sleeps until exactly the next deadline instead of
+scanning the table periodically. Holds that fall due together are
+handed to the release callback as one batch (one UPDATE, one commit).
+Cancelling is O(1): the heap entry is left in place and skipped when
+it surfaces, because the deadline no longer matches the current one.
+
+ChangeFeed numbers every spot state change (status updates,
+reservations, expiries, added and removed spots) and keeps the most
+recent ones in a ring buffer. Clients ask for the changes after the
+last sequence number they saw and may wait for new ones (long poll),
+which pushes updates to them as soon as they are published without a
+full spot list per poll. A client that fell further behind than the
+buffer reaches is told to reload the full state instead.
+
+SpotReplica is such a client: it keeps a copy of every spot of a
+primary server in memory, for a read-replica server (see
+ParkingServer's replica_of), and republishes what it applies to the
+replica's own ChangeFeed so clients can follow a replica too.
+
+Classes:
+    HoldScheduler: Heap-based expiry of reservation holds.
+    ChangeFeed:    Sequence-numbered ring buffer of spot changes.
+    SpotReplica:   In-memory spot state following a primary's feed.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from protocol import connect
+
+# Releases that fail (e.g. database busy beyond the retries) are tried
+# again after this many seconds
+RELEASE_RETRY = 5.0
+# At most this many holds are released in one batch
+RELEASE_BATCH = 500
+
+# Long-poll wait of a replica on the primary, and the pause before it
+# reconnects after losing the primary
+FOLLOW_WAIT    = 20.0
+FOLLOW_BACKOFF = 1.0
+# A replica whose last answer from the primary is older than this is
+# stale (a long poll answers at least every FOLLOW_WAIT seconds)
+MAX_STALENESS  = FOLLOW_WAIT + 10.0
+
+
+class HoldScheduler:
+    """
+    Releases reservation holds when their deadline passes.
+
+    Attributes:
+        release (callable): Called with a list of spot IDs whose holds
+            are due; runs on the scheduler thread.
+    """
+
+    def __init__(self, release, clock=time.time):
+        """
+        Args:
+            release (callable): Batch release callback (list[int] -> None).
+            clock (callable): Time source for deadlines (epoch seconds).
+        """
+        self.release = release
+        self._clock = clock
+        self._heap = []          # (deadline, spot_id), may contain stale entries
+        self._deadlines = {}     # spot_id -> current deadline
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def __len__(self):
+        with self._cond:
+            return len(self._deadlines)
+
+    def schedule(self, spot_id, deadline):
+        """Set (or move) the hold deadline of a spot."""
+        with self._cond:
+            self._deadlines[spot_id] = deadline
+            heapq.heappush(self._heap, (deadline, spot_id))
+            # Wake the thread only if it now has to fire earlier
+            if self._heap[0] == (deadline, spot_id):
+                self._cond.notify()
+
+    def cancel(self, spot_id):
+        """Forget the hold of a spot (its heap entry is skipped later)."""
+        with self._cond:
+            self._deadlines.pop(spot_id, None)
+
+    def start(self):
+        """Start the expiry thread (no-op if already running)."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="hold-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the expiry thread; pending holds are kept."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5.0)
+
+    def _due(self):
+        """Wait for the next deadline; return the due spot IDs ([] when stopping)."""
+        with self._cond:
+            while not self._stopping:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - self._clock()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                now = self._clock()
+                due = []
+                while self._heap and self._heap[0][0] <= now and len(due) < RELEASE_BATCH:
+                    deadline, spot_id = heapq.heappop(self._heap)
+                    if self._deadlines.get(spot_id) == deadline:
+                        del self._deadlines[spot_id]
+                        due.append(spot_id)
+                if due:
+                    return due
+            return []
+
+    def _run(self):
+        while True:
+            due = self._due()
+            if not due:
+                return
+            try:
+                self.release(due)
+            except Exception as e:
+                logging.error(f"[HOLDS] Releasing {len(due)} holds failed: {e}")
+                retry = self._clock() + RELEASE_RETRY
+                for spot_id in due:
+                    self.schedule(spot_id, retry)
+
+
+class ChangeFeed:
+    """
+    Sequence-numbered log of recent spot changes.
+
+    Every change is a dict {"seq", "spot_id", "status"}; status None
+    means the spot was removed. Changes may also carry the spot's
+    "zone" and camera "confidence".
+
+    Attributes:
+        capacity (int): Number of changes kept.
+    """
+
+    def __init__(self, capacity=10000, seq=0):
+        """
+        Args:
+            capacity (int): Number of changes kept.
+            seq (int): Sequence number to continue from.
+        """
+        self.capacity = capacity
+        self._changes = deque(maxlen=capacity)
+        self._seq = seq
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        """Sequence number of the latest change (0 before the first)."""
+        return self._seq
+
+    def publish(self, changes, seq=None):
+        """
+        Append changes and wake waiting readers.
+
+        Args:
+            changes (list[dict]): Dicts with 'spot_id' and 'status'.
+            seq (int, optional): Sequence number of the first change,
+                when they are numbered elsewhere (server_cluster.py). If
+                it skips ahead, the buffer is dropped: readers from
+                before the gap are told to reload.
+
+        Returns:
+            int: Sequence number of the last change.
+        """
+        if not changes:
+            return self._seq
+        with self._cond:
+            if seq is not None and seq != self._seq + 1:
+                self._changes.clear()
+                self._seq = seq - 1
+            for change in changes:
+                self._seq += 1
+                self._changes.append({"seq": self._seq, **change})
+            self._cond.notify_all()
+            return self._seq
+
+    def since(self, seq, timeout=0.0):
+        """
+        Changes after sequence number `seq`, waiting up to `timeout`
+        seconds for one if there are none yet.
+
+        Returns:
+            tuple: (latest seq, list of changes, reset). reset is True
+            when changes after `seq` are no longer buffered, or when
+            `seq` is ahead of the feed (the server restarted); the
+            caller must then reload the full spot list.
+        """
+        with self._cond:
+            if timeout > 0 and seq == self._seq:
+                self._cond.wait_for(lambda: self._seq > seq, timeout)
+            first = self._seq - len(self._changes) + 1
+            if seq + 1 < first or seq > self._seq:
+                return self._seq, [], True
+            start = max(seq + 1 - first, 0)
+            return self._seq, list(itertools.islice(self._changes, start, None)), False
+
+
+class SpotReplica:
+    """
+    Copy of a primary server's spots, kept current through its change feed.
+
+    Attributes:
+        host, port: Primary server address.
+        feed (ChangeFeed): Receives every change applied here.
+        ready (threading.Event): Set while the copy is loaded and the
+            primary is reachable; cleared when the connection is lost.
+    """
+
+    def __init__(self, host, port, feed):
+        self.host = host
+        self.port = port
+        self.feed = feed
+        self.ready = threading.Event()
+        self.synced_at = None    # time.monotonic() of the last answer from the primary
+        self._spots = {}         # spot_id -> {"id", "status", "zone", "confidence"}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._channel = None
+        self._thread = None
+
+    def is_fresh(self):
+        """True if the copy is loaded and heard from the primary within MAX_STALENESS."""
+        synced_at = self.synced_at
+        return (self.ready.is_set() and synced_at is not None
+                and time.monotonic() - synced_at <= MAX_STALENESS)
+
+    def spots(self):
+        """All spots, ordered by ID (copies)."""
+        with self._lock:
+            return [dict(self._spots[spot_id]) for spot_id in sorted(self._spots)]
+
+    def start(self):
+        """Start following the primary in a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="spot-replica", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop following (the open long poll is abandoned)."""
+        self._stopping.set()
+        if self._channel is not None:
+            self._channel.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._channel = connect(self.host, self.port, timeout=FOLLOW_WAIT + 10)
+                seq = self._load_snapshot()
+                while not self._stopping.is_set():
+                    response = self._channel.request({"action": "get_spot_changes",
+                                                      "since": seq, "timeout": FOLLOW_WAIT})
+                    if response.get("status") != "success":
+                        raise ConnectionError(response.get("message", "get_spot_changes failed"))
+                    self.synced_at = time.monotonic()
+                    if response.get("reset"):
+                        seq = self._load_snapshot()
+                    else:
+                        self._apply(response["changes"])
+                        seq = response["seq"]
+            except Exception as e:
+                # Stop serving the copy until it is reloaded from the primary
+                self.ready.clear()
+                if not self._stopping.is_set():
+                    logging.error(f"[REPLICA] Lost primary {self.host}:{self.port}: {e}")
+                    self._stopping.wait(FOLLOW_BACKOFF)
+            finally:
+                if self._channel is not None:
+                    self._channel.close()
+
+    def _load_snapshot(self):
+        """Replace the state with the primary's full list; return its feed position."""
+        response = self._channel.request({"action": "get_parking_spots"})
+        if response.get("status") != "success":
+            raise ConnectionError(response.get("message", "get_parking_spots failed"))
+        fresh = {spot["id"]: {"id": spot["id"], "status": spot["status"],
+                              "zone": spot.get("zone"), "confidence": spot.get("confidence")}
+                 for spot in response["spots"]}
+        with self._lock:
+            # Republish only what differs from the state before the reload
+            changes = [{"spot_id": spot_id, "status": None}
+                       for spot_id in self._spots.keys() - fresh.keys()]
+            changes += [{"spot_id": spot_id, "status": spot["status"], "zone": spot["zone"],
+                         "confidence": spot["confidence"]}
+                        for spot_id, spot in fresh.items() if self._spots.get(spot_id) != spot]
+            self._spots = fresh
+            self.feed.publish(changes)
+        self.synced_at = time.monotonic()
+        self.ready.set()
+        return response.get("seq", 0)
+
+    def _apply(self, changes):
+        with self._lock:
+            for change in changes:
+                spot_id = change["spot_id"]
+                if change["status"] is None:
+                    self._spots.pop(spot_id, None)
+                    continue
+                spot = self._spots.setdefault(spot_id, {"id": spot_id, "status": None,
+                                                        "zone": None, "confidence": None})
+                spot["status"] = change["status"]
+                for key in ("zone", "confidence"):
+                    if key in change:
+                        spot[key] = change[key]
+            self.feed.publish([{k: v for k, v in change.items() if k != "seq"}
+                               for change in changes])
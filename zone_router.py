@@ -0,0 +1,395 @@
+"""
+zone_router.py
+
+Routes the web app's backend requests to the ParkingServer of each zone.
+
+Spots belong to a zone (a parking lot or city area). A city-wide
+deployment runs several ParkingServer instances, each holding the spots
+of some zones, plus one server holding the user accounts. The mapping
+is read from a JSON file (PARKSCOUT_ZONES, default zones.json):
+
+    {
+      "accounts": {"host": "10.0.0.1", "port": 65432},
+      "zones": {
+        "north":  {"host": "10.0.0.2", "port": 65432, "position": [32.09, 34.78],
+                   "replicas": [{"port": 65442}, {"port": 65443}]},
+        "harbor": {"host": "10.0.0.3", "port": 65432, "position": [32.10, 34.77]}
+      }
+    }
+
+'position' is optional and only used to order zones by distance for
+"available near X" queries (any planar coordinates will do).
+'replicas' (optional, also for "accounts") lists read replicas of that
+server (`server.py --replica-of`); READ_ACTIONS go to them in turn and
+fall back to the primary when a replica is down or not synced yet.
+Without the file everything goes to the single server the app was
+configured with, as before (PARKSCOUT_REPLICAS="host:port,..." adds
+replicas to it).
+
+Requests for one spot go to the server of its zone. Queries over
+several zones (all spots, available spots near a zone, a user's
+history) are sent to every server involved in parallel, one request per
+server, and the answers are merged; a zone whose server does not answer
+is reported instead of failing the whole query. Each server gets its
+own small pool of connections, so concurrent Flask requests do not wait
+for each other.
+
+Classes:
+    ServerConnection: Pooled framed connections to one ParkingServer.
+    ZoneRouter:       Zone -> server routing and parallel fan-out.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from protocol import connect
+
+ZONES_PATH = os.getenv("PARKSCOUT_ZONES", "zones.json")
+REPLICAS   = os.getenv("PARKSCOUT_REPLICAS", "")
+# Zone of spots created before zones existed (server.DEFAULT_ZONE)
+DEFAULT_ZONE = "default"
+
+POOL_SIZE       = 4      # Idle connections kept per server
+REQUEST_TIMEOUT = 10.0   # Seconds for connecting and for one fan-out
+FANOUT_WORKERS  = 16     # Threads issuing the requests of a fan-out
+REPLICA_RETRY   = 5.0    # Seconds a replica that failed is skipped
+
+# Actions that may be answered by a read replica
+READ_ACTIONS = frozenset({"login", "get_parking_history", "get_parking_spots",
+                          "get_camera_image"})
+
+
+class ServerConnection:
+    """
+    Framed, encrypted connections to one ParkingServer, reused across
+    requests. A connection is used by one request at a time; extra ones
+    are opened when all are busy and at most `pool_size` are kept.
+
+    Attributes:
+        replicas (list[ServerConnection]): Read replicas of this server.
+    """
+
+    def __init__(self, host, port, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.replicas = []
+        self._idle = []
+        self._lock = threading.Lock()
+        self._next_replica = 0
+        self._down_until = 0.0   # replicas: skip until then after a failure
+
+    def request(self, message):
+        """
+        Send one request and return the response.
+
+        Returns:
+            dict: The server's response, or an error dict if the server
+            could not be reached (the connection is then dropped).
+        """
+        try:
+            return self._exchange(message)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def read(self, message):
+        """
+        Send a read-only request to a replica (in turn) if there is one
+        that is up, otherwise to this server.
+
+        Returns:
+            dict: The response, or an error dict as for request().
+        """
+        count = len(self.replicas)
+        if count:
+            with self._lock:
+                start = self._next_replica
+                self._next_replica = (start + 1) % count
+            now = time.monotonic()
+            for i in range(count):
+                replica = self.replicas[(start + i) % count]
+                if replica._down_until > now:
+                    continue
+                try:
+                    response = replica._exchange(message)
+                except Exception:
+                    replica._down_until = now + REPLICA_RETRY
+                    continue
+                if not response.get("replica_unavailable"):
+                    return response
+        return self.request(message)
+
+    def _exchange(self, message):
+        """Send one request on a pooled connection; raises on transport errors."""
+        with self._lock:
+            channel = self._idle.pop() if self._idle else None
+        try:
+            if channel is None:
+                channel = connect(self.host, self.port, timeout=self.timeout)
+            response = channel.request(message)
+        except Exception:
+            if channel is not None:
+                channel.close()
+            raise
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(channel)
+                channel = None
+        if channel is not None:
+            channel.close()
+        return response
+
+    def close(self):
+        """Close all idle connections (also those to the replicas)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for channel in idle:
+            channel.close()
+        for replica in self.replicas:
+            replica.close()
+
+
+class ZoneRouter:
+    """
+    Sends requests to the server of a zone and fans queries over
+    several zones out in parallel.
+
+    Attributes:
+        zones (list[str]): Configured zone names.
+        accounts (ServerConnection): Server holding the user accounts.
+    """
+
+    def __init__(self, zones, accounts=None, positions=None, workers=FANOUT_WORKERS,
+                 replicas=None):
+        """
+        Args:
+            zones (dict): Zone name -> (host, port).
+            accounts (tuple, optional): (host, port) of the account server;
+                default: the server of the first zone.
+            positions (dict, optional): Zone name -> (x, y) coordinates.
+            workers (int): Threads used for fan-out requests.
+            replicas (dict, optional): (host, port) of a server -> list of
+                (host, port) of its read replicas.
+        """
+        if not zones:
+            raise ValueError("At least one zone is required")
+        # Zones on the same server share its connection pool
+        servers = {}
+        self._zones = {name: servers.setdefault(tuple(address), ServerConnection(*address))
+                       for name, address in zones.items()}
+        accounts = tuple(accounts) if accounts else tuple(next(iter(zones.values())))
+        self.accounts = servers.setdefault(accounts, ServerConnection(*accounts))
+        self._servers = list(servers.values())
+        for address, replica_addresses in (replicas or {}).items():
+            server = servers.get(tuple(address))
+            if server is not None:
+                server.replicas = [ServerConnection(*replica) for replica in replica_addresses]
+        self.zones = list(zones)
+        self.positions = dict(positions or {})
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    @classmethod
+    def from_config(cls, path=ZONES_PATH, host="127.0.0.1", port=65432):
+        """
+        Build a router from a zones file (see the module docstring).
+
+        Args:
+            path (str): JSON file with the zone mapping.
+            host, port: The single server used when the file does not exist.
+        """
+        if not os.path.exists(path):
+            replicas = [_parse_address(item, host) for item in REPLICAS.split(",") if item]
+            return cls({DEFAULT_ZONE: (host, port)}, replicas={(host, port): replicas})
+        with open(path) as f:
+            data = json.load(f)
+
+        replicas = {}
+        def address(entry):
+            server = (entry.get("host", host), int(entry.get("port", port)))
+            if entry.get("replicas"):
+                replicas[server] = [(r.get("host", server[0]), int(r["port"]))
+                                    for r in entry["replicas"]]
+            return server
+
+        zones, positions = {}, {}
+        for name, entry in data["zones"].items():
+            zones[name] = address(entry)
+            if entry.get("position") is not None:
+                positions[name] = tuple(entry["position"])
+        accounts = data.get("accounts")
+        if accounts is not None:
+            accounts = address(accounts)
+        return cls(zones, accounts, positions, replicas=replicas)
+
+    # ---------------------------------------------------------------
+    # Single-server requests
+    # ---------------------------------------------------------------
+
+    def server_for(self, zone):
+        """
+        ServerConnection holding `zone`. With a single server, every
+        zone lives there, configured or not.
+
+        Raises:
+            KeyError: For an unknown zone.
+        """
+        if zone in self._zones:
+            return self._zones[zone]
+        if len(self._servers) == 1:
+            return self._servers[0]
+        raise KeyError(zone)
+
+    def request(self, zone, action, data=None):
+        """
+        Send an action to the server of `zone` (error dict for an unknown
+        zone); READ_ACTIONS may be answered by one of its replicas.
+        """
+        try:
+            server = self.server_for(zone)
+        except KeyError:
+            return {"status": "error", "message": f"Unknown zone '{zone}'"}
+        return _send(server, {"action": action, **(data or {})})
+
+    def account_request(self, action, data=None):
+        """Send an action to the account server (register, login, ...)."""
+        return _send(self.accounts, {"action": action, **(data or {})})
+
+    # ---------------------------------------------------------------
+    # Fan-out
+    # ---------------------------------------------------------------
+
+    def _fan_out(self, messages):
+        """
+        Send {server: message} in parallel.
+
+        Returns:
+            dict: server -> response; servers that failed or did not
+            answer within REQUEST_TIMEOUT map to an error dict.
+        """
+        if len(messages) == 1:
+            (server, message), = messages.items()
+            return {server: _send(server, message)}
+        futures = {server: self._executor.submit(_send, server, message)
+                   for server, message in messages.items()}
+        wait(futures.values(), timeout=REQUEST_TIMEOUT)
+        return {server: future.result() if future.done()
+                else {"status": "error", "message": "Timed out"}
+                for server, future in futures.items()}
+
+    def _zones_by_server(self, zones):
+        grouped = {}
+        for zone in zones:
+            grouped.setdefault(self.server_for(zone), []).append(zone)
+        return grouped
+
+    def list_spots(self, zones=None, status=None):
+        """
+        Spots of the given zones (default: all), merged from their servers.
+
+        Args:
+            zones (list[str], optional): Zones to list.
+            status (str, optional): Only spots with this status.
+
+        Returns:
+            dict: get_parking_spots-style response; 'failed_zones' lists
+            the zones whose server did not answer.
+        """
+        if zones is None:
+            # Everything each server has, zones the app does not know included
+            grouped = {server: None for server in self._servers}
+        else:
+            grouped = self._zones_by_server([z for z in zones if z in self._zones]
+                                            if len(self._servers) > 1 else zones)
+        messages = {}
+        for server, server_zones in grouped.items():
+            message = {"action": "get_parking_spots"}
+            if server_zones is not None:
+                message["zone"] = server_zones
+            if status is not None:
+                message["status"] = status
+            messages[server] = message
+
+        spots, failed = [], []
+        for server, response in self._fan_out(messages).items():
+            if response.get("status") == "success":
+                spots.extend(response.get("spots", []))
+            else:
+                failed.extend(grouped[server] or [z for z, s in self._zones.items() if s is server])
+        return {"status": "success", "spots": spots, "failed_zones": failed}
+
+    def nearest_zones(self, origin):
+        """
+        Zones ordered by distance from `origin` (itself first). Zones
+        without a position come last, in configuration order.
+        """
+        here = self.positions.get(origin)
+
+        def distance(zone):
+            if zone == origin:
+                return -1.0
+            there = self.positions.get(zone)
+            if here is None or there is None:
+                return math.inf
+            return math.dist(here, there)
+
+        return sorted(self.zones, key=distance)
+
+    def available_near(self, origin, limit=None):
+        """
+        Available spots, nearest zones first, queried in parallel.
+
+        Args:
+            origin (str): Zone to search around.
+            limit (int, optional): Return at most this many spots.
+
+        Returns:
+            dict: get_parking_spots-style response ordered by zone distance,
+            with 'failed_zones'.
+        """
+        order = self.nearest_zones(origin)
+        rank = {zone: i for i, zone in enumerate(order)}
+        result = self.list_spots(order, status="available")
+        result["spots"].sort(key=lambda s: (rank.get(s.get("zone"), len(rank)), s["id"]))
+        if limit is not None:
+            result["spots"] = result["spots"][:limit]
+        return result
+
+    def gather(self, action, data=None, key=None):
+        """
+        Send an action to every server and concatenate the `key` lists
+        of the successful answers (e.g. a user's history, camera stats).
+
+        Returns:
+            dict: {'status': 'success', key: [...]} or the error of the
+            only server.
+        """
+        message = {"action": action, **(data or {})}
+        responses = self._fan_out({server: message for server in self._servers})
+        items = [item for response in responses.values()
+                 if response.get("status") == "success" for item in response.get(key, [])]
+        if not items and len(responses) == 1:
+            return next(iter(responses.values()))
+        return {"status": "success", key: items}
+
+    def close(self):
+        """Close all pooled connections and the fan-out threads."""
+        for server in self._servers:
+            server.close()
+        self._executor.shutdown(wait=False)
+
+
+def _send(server, message):
+    """Route a message to `server`, or to a replica of it if it only reads."""
+    if message.get("action") in READ_ACTIONS:
+        return server.read(message)
+    return server.request(message)
+
+def _parse_address(text, default_host):
+    """Parse 'HOST:PORT' (or ':PORT' / 'PORT') into (host, port)."""
+    host, _, port = text.strip().rpartition(":")
+    return host or default_host, int(port)